@@ -9,5 +9,7 @@ mkdir -p static
 
 python manage.py collectstatic --no-input
 python manage.py migrate
+# Materialize occurrences of new and migrated events
+python manage.py extend_event_occurrences
 python manage.py ensure_admin
 python manage.py seed_database
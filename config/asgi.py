@@ -21,6 +21,19 @@ django_asgi_app = get_asgi_application()
 
 # Import routing after Django is ready
 from counsel.routing import websocket_urlpatterns
+from counsel.retention import start_scheduler
+from events.sweep import start_scheduler as start_event_sweep
+from ministry.webhooks import start_scheduler as start_paystack_workers
+from sermons.related import start_scheduler as start_related_refresh
+
+# Periodic purge of expired '24h' conversations (only if COUNSEL_PURGE_INTERVAL is set)
+start_scheduler()
+# Periodic closing of finished events (only if EVENT_SWEEP_INTERVAL is set)
+start_event_sweep()
+# Background verification of Paystack webhooks (only if PAYSTACK_WEBHOOK_POLL_INTERVAL is set)
+start_paystack_workers()
+# Related-sermons refreshes off the request path (only if RELATED_REFRESH_INTERVAL is set)
+start_related_refresh()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -258,6 +258,15 @@ if PAYSTACK_SECRET_KEY == 'sk_test_replace_me':
 else:
     print(f"SUCCESS: Loaded Paystack Key starting with {PAYSTACK_SECRET_KEY[:8]}...")
 
+# Paystack API calls (ministry.paystack); tests point the base at ministry.paystack_stub
+PAYSTACK_API_BASE = os.environ.get('PAYSTACK_API_BASE', 'https://api.paystack.co')
+PAYSTACK_TIMEOUT = int(os.environ.get('PAYSTACK_TIMEOUT', 10))  # Seconds per request
+
+# Webhook verification (ministry.webhooks, run by `manage.py process_paystack_events`)
+PAYSTACK_WEBHOOK_WORKERS = int(os.environ.get('PAYSTACK_WEBHOOK_WORKERS', 4))  # Threads
+# Run the workers inside the ASGI process, polling every N seconds (0 = off)
+PAYSTACK_WEBHOOK_POLL_INTERVAL = int(os.environ.get('PAYSTACK_WEBHOOK_POLL_INTERVAL', 0))
+
 
 
 
@@ -292,3 +301,64 @@ else:
         },
     }
     print("INFO: Using InMemory channel layer (no REDIS_URL set)")
+
+# Cache: shared through Redis when available so invalidations reach every worker
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Anonymous full-page cache (core.page_cache); needs the shared (Redis) cache, entries are also invalidated on model changes
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 3600))  # Seconds, 0 disables
+
+# Responsive image derivatives (core.images): widths in pixels, and background threads per process
+IMAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.environ.get('IMAGE_DERIVATIVE_WIDTHS', '160,320,640,960,1280').split(',')]
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', 2))
+
+# Sermon audio transcoding (sermons.audio_jobs, run by `manage.py process_audio_jobs`)
+AUDIO_TRANSCODE_WORKERS = int(os.environ.get('AUDIO_TRANSCODE_WORKERS', 2))  # Pool processes
+AUDIO_TRANSCODE_TIMEOUT = int(os.environ.get('AUDIO_TRANSCODE_TIMEOUT', 1800))  # Seconds per ffmpeg run
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+# Event occurrences (events.occurrences) are materialized this many months ahead;
+# run `manage.py extend_event_occurrences` daily to roll the horizon forward
+EVENT_OCCURRENCE_MONTHS = int(os.environ.get('EVENT_OCCURRENCE_MONTHS', 6))
+
+# Close finished events inside the ASGI process every N seconds (0 = off;
+# use `manage.py close_finished_events` from cron instead)
+EVENT_SWEEP_INTERVAL = int(os.environ.get('EVENT_SWEEP_INTERVAL', 0))
+
+# Related sermons (sermons.related) are refreshed on a background thread in the ASGI
+# process, as changes commit and at least every N seconds (0 = refresh at commit)
+RELATED_REFRESH_INTERVAL = int(os.environ.get('RELATED_REFRESH_INTERVAL', 60))
+
+# Sitemap and podcast feeds (sermons.feeds), rebuilt into this directory when sermons change
+FEED_CACHE_DIR = os.environ.get('FEED_CACHE_DIR', BASE_DIR / 'feed_cache')
+PODCAST_TITLE = os.environ.get('PODCAST_TITLE', 'The Truth Gate Sermons')
+PODCAST_AUTHOR = os.environ.get('PODCAST_AUTHOR', 'The Truth Gate')
+PODCAST_DESCRIPTION = os.environ.get('PODCAST_DESCRIPTION', 'Sermons and teaching from The Truth Gate.')
+
+# Counsellor presence: sockets count as online this long after their last heartbeat
+COUNSEL_PRESENCE_TTL = int(os.environ.get('COUNSEL_PRESENCE_TTL', 60))  # Seconds
+
+# Run the expired-conversation purge inside the ASGI process every N seconds (0 = off;
+# use `manage.py purge_expired_conversations` from cron instead)
+COUNSEL_PURGE_INTERVAL = int(os.environ.get('COUNSEL_PURGE_INTERVAL', 0))
+
+# Counsel chat write-behind persistence (see counsel/write_behind.py)
+# Messages are broadcast before they are committed and flushed in batches.
+COUNSEL_WRITE_BEHIND = os.environ.get('COUNSEL_WRITE_BEHIND', 'False') == 'True'
+COUNSEL_FLUSH_BATCH_SIZE = int(os.environ.get('COUNSEL_FLUSH_BATCH_SIZE', 100))
+COUNSEL_FLUSH_INTERVAL = float(os.environ.get('COUNSEL_FLUSH_INTERVAL', 0.2))  # Seconds
+# Required with write-behind: unique among processes sharing a database (0-31).
+# Write-behind itself needs a single ASGI process (see counsel/write_behind.py).
+COUNSEL_WORKER_ID = int(os.environ['COUNSEL_WORKER_ID']) if os.environ.get('COUNSEL_WORKER_ID') else None
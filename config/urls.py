@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from ministry import views as ministry_views
+from sermons import views as sermon_views
 
 urlpatterns = [
     path('gatekeeper/', admin.site.urls),
@@ -26,6 +27,8 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
 
 
+    path('sitemap.xml', sermon_views.sitemap, name='sitemap'),
+    path('sitemap-<int:number>.xml', sermon_views.sitemap_part, name='sitemap_part'),
     path('sermons/', include('sermons.urls')),
     path('events/', include('events.urls')),
     
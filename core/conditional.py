@@ -0,0 +1,49 @@
+"""
+Conditional GET (ETag / Last-Modified) for public pages.
+
+Validators are built from cheap aggregates rather than rendered output:
+MAX(updated_at) and COUNT(*) over the rows a page lists, or the updated_at
+of the object it shows. They also cover the page-cache version tags
+(core.page_cache) of SiteSettings and any related model without a
+timestamp, plus the full path, so filters and page numbers get their own
+validators. A matching request gets a 304 before the view loads any objects
+or renders a template.
+
+Only anonymous requests without pending flash messages are validated; pages
+for signed-in users carry per-user badges that these validators don't see.
+"""
+
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+
+from .page_cache import tag_versions
+
+
+def allows_conditional(request):
+    """Whether `request` may be answered with a 304."""
+    return not request.user.is_authenticated and len(get_messages(request)) == 0
+
+
+def aggregate_state(queryset, field='updated_at'):
+    """Return (latest `field`, row count) for a queryset in one query."""
+    state = queryset.order_by().aggregate(latest=Max(field), count=Count('pk'))
+    return state['latest'], state['count']
+
+
+def request_memo(request, key, func):
+    """Compute func() once per request, shared by the ETag and Last-Modified hooks."""
+    memo = request.__dict__.setdefault('_conditional_memo', {})
+    if key not in memo:
+        memo[key] = func()
+    return memo[key]
+
+
+def page_etag(request, *parts, models=()):
+    """Hash the request path, the version tags of `models` and SiteSettings, and `parts`."""
+    from dashboard.models import SiteSettings
+
+    versions = tag_versions((SiteSettings,) + tuple(models))
+    raw = '|'.join(str(part) for part in (request.get_full_path(), *versions, *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -0,0 +1,167 @@
+"""
+Responsive image derivatives for uploaded photos (speakers, series, events).
+
+Each source image is resized with Pillow to the IMAGE_DERIVATIVE_WIDTHS no
+wider than itself and saved as WebP and JPEG under MEDIA_ROOT/derivatives/,
+named by the SHA-256 of the source. Identical uploads therefore share files.
+The manifest listing them is cached under the source's path, size and
+mtime, so rendering costs a stat() and one cache lookup, a replaced upload
+never serves stale renditions, and the source is only read (hashed) where
+the derivatives are generated.
+
+- `{% responsive_image %}` (core.templatetags.images) emits a <picture>
+  with WebP and JPEG srcsets once the derivatives exist, and the original
+  image until then. Only images a page renders get derivatives: the first
+  render schedules them on a small per-process thread pool
+  (IMAGE_DERIVATIVE_WORKERS), where Pillow releases the GIL while resizing
+  and encoding. When they land, the owning model's cached pages are
+  invalidated so the next render picks them up.
+- `manage.py generate_image_derivatives` backfills every existing image
+  using a process pool.
+
+Storages without local paths are served their originals.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIR = 'derivatives'
+FORMATS = (
+    # (format, extension, Pillow save options)
+    ('webp', '.webp', {'quality': 75, 'method': 4}),
+    ('jpeg', '.jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+_scheduled = set()
+
+
+def local_path(field_file):
+    """Return the file's filesystem path, or None for remote storages."""
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return None
+
+
+def content_hash(path):
+    """SHA-256 of a file."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _manifest_key(path):
+    # A replaced file changes size or mtime, and so its key
+    stat = os.stat(path)
+    return f'images:manifest:{hashlib.md5(path.encode()).hexdigest()}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def _relative_dir(digest):
+    return f'{DERIVATIVE_DIR}/{digest[:2]}'
+
+
+def render_derivatives(source, media_root, digest, widths):
+    """
+    Write the derivatives of one source image and return its manifest:
+    {'width', 'height', 'renditions': {format: [(width, relative name), ...]}}.
+    Existing files are reused. Runs in pool threads and processes, so it
+    only touches the filesystem.
+    """
+    from PIL import Image, ImageOps
+
+    relative_dir = _relative_dir(digest)
+    os.makedirs(os.path.join(media_root, relative_dir), exist_ok=True)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        source_width, source_height = image.size
+        targets = sorted({min(width, source_width) for width in widths})
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        renditions = {fmt: [] for fmt, _, _ in FORMATS}
+        for width in targets:
+            height = max(round(source_height * width / source_width), 1)
+            resized = None
+            for fmt, extension, options in FORMATS:
+                name = f'{relative_dir}/{digest[:32]}-{width}{extension}'
+                path = os.path.join(media_root, name)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = image.resize((width, height), Image.LANCZOS) if width != source_width else image
+                    output = resized.convert('RGB') if fmt == 'jpeg' and resized.mode == 'RGBA' else resized
+                    # Write then rename, so readers never see a partial file
+                    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                    output.save(temp_path, fmt.upper(), **options)
+                    os.replace(temp_path, path)
+                renditions[fmt].append((width, name))
+    return {'width': source_width, 'height': source_height, 'renditions': renditions}
+
+
+def store_manifest(path, manifest):
+    """Record the derivatives of the source image at `path`."""
+    cache.set(_manifest_key(path), manifest, None)
+
+
+def get_manifest(field_file):
+    """
+    Return the derivative manifest for an image, or None if the derivatives
+    are not ready (in which case they are scheduled).
+    """
+    if not field_file:
+        return None
+    path = local_path(field_file)
+    if path is None:
+        return None
+    try:
+        manifest = cache.get(_manifest_key(path))
+    except FileNotFoundError:
+        return None
+    if manifest is None:
+        schedule(field_file)
+    return manifest
+
+
+def _generate(path, model):
+    try:
+        digest = content_hash(path)
+        manifest = render_derivatives(path, str(settings.MEDIA_ROOT), digest, settings.IMAGE_DERIVATIVE_WIDTHS)
+        store_manifest(path, manifest)
+        if model is not None:
+            from core.page_cache import invalidate
+            invalidate(model)
+    except Exception:
+        logger.exception('Could not generate derivatives for %s', path)
+    finally:
+        with _pool_lock:
+            _scheduled.discard(path)
+
+
+def schedule(field_file):
+    """Generate an image's derivatives in the background (once at a time per file)."""
+    global _pool
+    path = local_path(field_file) if field_file else None
+    if path is None or not os.path.exists(path):
+        return
+    with _pool_lock:
+        if path in _scheduled:
+            return
+        _scheduled.add(path)
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS, thread_name_prefix='image-derivatives'
+            )
+    instance = getattr(field_file, 'instance', None)
+    _pool.submit(_generate, path, type(instance) if instance is not None else None)
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.images import content_hash, local_path, render_derivatives, store_manifest
+from events.models import Event
+from sermons.models import Series, Speaker
+
+IMAGE_FIELDS = (
+    (Speaker, 'photo'),
+    (Series, 'image'),
+    (Event, 'image'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Generates responsive WebP/JPEG derivatives for every speaker, series and event image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Pool processes')
+        parser.add_argument(
+            '--listing-width', type=int, default=640,
+            help='Width used to report the bytes a listing page would transfer'
+        )
+
+    def handle(self, *args, **options):
+        sources = {}
+        for model, field_name in IMAGE_FIELDS:
+            for instance in model.objects.exclude(**{field_name: ''}).exclude(**{field_name: None}).only(field_name):
+                path = local_path(getattr(instance, field_name))
+                if path and os.path.exists(path):
+                    sources.setdefault(content_hash(path), []).append(path)
+
+        media_root = str(settings.MEDIA_ROOT)
+        widths = settings.IMAGE_DERIVATIVE_WIDTHS
+        original_bytes = derivative_bytes = 0
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1), mp_context=get_context('spawn')) as pool:
+            futures = {
+                digest: pool.submit(render_derivatives, paths[0], media_root, digest, widths)
+                for digest, paths in sources.items()
+            }
+            for digest, future in futures.items():
+                paths = sources[digest]
+                try:
+                    manifest = future.result()
+                except Exception as e:
+                    self.stderr.write(f'{paths[0]}: {e}')
+                    continue
+                for path in paths:
+                    store_manifest(path, manifest)
+                original_bytes += os.path.getsize(paths[0])
+                # What a browser picks for that width: the smallest WebP at least as wide
+                webp = manifest['renditions']['webp']
+                _, name = next((r for r in webp if r[0] >= options['listing_width']), webp[-1])
+                derivative_bytes += os.path.getsize(os.path.join(media_root, name))
+
+        self.stdout.write(self.style.SUCCESS(f'Generated derivatives for {len(sources)} image(s).'))
+        if original_bytes:
+            self.stdout.write(
+                f"Originals {original_bytes / 1024:.0f} KiB; WebP at {options['listing_width']}px "
+                f"{derivative_bytes / 1024:.0f} KiB ({derivative_bytes / original_bytes:.0%})."
+            )
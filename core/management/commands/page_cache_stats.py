@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.page_cache import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counts for the anonymous page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        counts = stats()
+        self.stdout.write(
+            f"Hits: {counts['hits']}  Misses: {counts['misses']}  "
+            f"Hit ratio: {counts['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.page_cache import invalidate
+from core.rich_text import BATCH_SIZE, backfill
+from events.models import Event
+from sermons.models import Sermon
+
+
+class Command(BaseCommand):
+    help = 'Renders stored HTML for sermon notes and event descriptions that are missing or out of date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per bulk update')
+        parser.add_argument('--force', action='store_true', help='Re-render every row, even if unchanged')
+
+    def handle(self, *args, **options):
+        targets = (
+            (Sermon, 'notes', 'reading_time'),
+            (Event, 'description', None),
+        )
+        for model, field, reading_time_field in targets:
+            scanned, updated = backfill(
+                model.objects.all(), field,
+                reading_time_field=reading_time_field,
+                batch_size=max(options['batch_size'], 1),
+                force=options['force'],
+            )
+            if updated:
+                # bulk_update sends no signals
+                invalidate(model)
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {updated} of {scanned} rendered')
+        self.stdout.write(self.style.SUCCESS('Done.'))
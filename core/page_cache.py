@@ -0,0 +1,199 @@
+"""
+Full-page cache for public pages viewed anonymously.
+
+Views opt in with the `public_page_cache(*models)` decorator, listing the
+models their output depends on (SiteSettings is implied, since every page
+renders `site_config`). Each model has a version tag in the shared cache,
+and cached pages are keyed by the URL plus the current version of each of
+their tags (and whatever the view's `vary` function returns). Saving or
+deleting an instance of a model replaces its tag version, so only the pages
+that depend on that model stop matching; stale entries simply expire.
+
+Invalidation only reaches every worker through a shared cache (Redis). With
+a per-process cache (LocMem, the default without REDIS_URL) pages are not
+cached at all, and tag versions expire after LOCAL_TAG_TIMEOUT, which bounds
+how long another worker's ETags can miss a change.
+
+A page is served from or stored in the cache only for anonymous GET/HEAD
+requests without pending flash messages. The CSRF token rendered into a
+page is replaced with a placeholder before storing, and each hit fills in
+a token for the current visitor (which also sets their CSRF cookie).
+
+Hits and misses are counted in the cache; see `stats()` or
+`manage.py page_cache_stats`. Responses carry an X-Page-Cache header.
+"""
+
+import hashlib
+import re
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+HITS_KEY = 'page_cache:hits'
+MISSES_KEY = 'page_cache:misses'
+
+# Seconds a tag version lives when the cache is not shared between workers
+LOCAL_TAG_TIMEOUT = 60
+
+_registered = set()
+
+
+def cache_is_shared():
+    """Whether every worker process sees the default cache (i.e. it is not LocMem or Dummy)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _tag_timeout():
+    return None if cache_is_shared() else LOCAL_TAG_TIMEOUT
+
+
+def _tag_key(model):
+    return f'page_cache:tag:{model._meta.label_lower}'
+
+
+def invalidate(model):
+    """Drop every cached page that depends on `model`."""
+    cache.set(_tag_key(model), uuid.uuid4().hex, _tag_timeout())
+
+
+def _invalidate_sender(sender, **kwargs):
+    invalidate(sender._meta.concrete_model)
+
+
+def _m2m_receiver(dependent):
+    def receiver(sender, **kwargs):
+        invalidate(dependent)
+    return receiver
+
+
+def _register(model):
+    if model in _registered:
+        return
+    _registered.add(model)
+    uid = f'page_cache:{model._meta.label_lower}'
+    post_save.connect(_invalidate_sender, sender=model, dispatch_uid=uid)
+    post_delete.connect(_invalidate_sender, sender=model, dispatch_uid=uid)
+    for field in model._meta.local_many_to_many:
+        m2m_changed.connect(
+            _m2m_receiver(model),
+            sender=field.remote_field.through,
+            dispatch_uid=f'{uid}:{field.name}',
+            weak=False,
+        )
+
+
+def tag_versions(models):
+    """Return the current version tag of each model, in order."""
+    keys = [_tag_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, _tag_timeout())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _page_key(request, models, vary=None):
+    versions = ':'.join(str(version) for version in tag_versions(models))
+    if vary is not None:
+        versions += f'|{vary(request)}'
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(f'{url}|{versions}'.encode()).hexdigest()
+    return f'page_cache:page:{digest}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Pages showing a flash message are one-off; len() does not consume them
+    return len(get_messages(request)) == 0
+
+
+def _store(key, response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return
+    content = response.content.decode(response.charset)
+    tokens = set(CSRF_INPUT_RE.findall(content))
+    if len(tokens) > 1:
+        return
+    for token in tokens:
+        content = content.replace(token, CSRF_PLACEHOLDER)
+    cache.set(key, (content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+
+
+def public_page_cache(*models, vary=None):
+    """
+    Cache a view's output for anonymous visitors until one of `models`
+    changes. `vary(request)`, if given, is added to the key, for output that
+    also changes with time.
+    """
+    from dashboard.models import SiteSettings
+
+    models = (SiteSettings,) + tuple(models)
+    for model in models:
+        _register(model)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.PAGE_CACHE_TIMEOUT or not cache_is_shared() or not _is_cacheable(request):
+                return view_func(request, *args, **kwargs)
+
+            key = _page_key(request, models, vary)
+            cached = cache.get(key)
+            if cached is not None:
+                _count(HITS_KEY)
+                content, content_type = cached
+                if CSRF_PLACEHOLDER in content:
+                    content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'HIT'
+                return response
+
+            _count(MISSES_KEY)
+            response = view_func(request, *args, **kwargs)
+            _store(key, response)
+            response['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Return hit/miss counts and the hit ratio since the counters were reset."""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,150 @@
+"""
+Pre-rendered rich text for CKEditor fields (sermon notes, event descriptions).
+
+Editors' HTML is rendered once, at save time, into a sibling `<field>_html`
+column: sanitized with bleach to what the CKEditor toolbar can produce,
+with an `id` and anchor link on every heading. Pages then emit the stored
+HTML as-is.
+
+`<field>_hash` holds a hash of the source (and RENDER_VERSION), so saving
+an unchanged field skips the work. Bump RENDER_VERSION when the rules
+below change and run `manage.py prerender_rich_text` to re-render
+existing rows.
+"""
+
+import hashlib
+import html
+import math
+import re
+
+import bleach
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import slugify
+
+RENDER_VERSION = 1
+BATCH_SIZE = 500
+WORDS_PER_MINUTE = 200
+
+# What the CKEditor 'default' toolbar produces
+ALLOWED_TAGS = [
+    'p', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b', 'em', 'i',
+    'a', 'ul', 'ol', 'li', 'blockquote',
+]
+ALLOWED_ATTRIBUTES = {'a': ['href', 'title']}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto', 'tel']
+
+# bleach strips disallowed tags but keeps their text; these lose both
+DROP_BLOCKS_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+HEADING_RE = re.compile(r'<h([1-6])>(.*?)</h\1>', re.DOTALL)
+WORD_RE = re.compile(r'\w+')
+BLOCK_END_RE = re.compile(r'</(?:p|h[1-6]|li|blockquote)>|<br\s*/?>', re.IGNORECASE)
+
+_cleaner = bleach.Cleaner(
+    tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, protocols=ALLOWED_PROTOCOLS, strip=True
+)
+
+
+def source_hash(source):
+    return hashlib.sha256(f'{RENDER_VERSION}:{source}'.encode()).hexdigest()
+
+
+def _add_heading_anchors(cleaned):
+    used = set()
+
+    def anchor(match):
+        level, inner = match.groups()
+        base = slugify(html.unescape(strip_tags(inner)))[:60] or 'section'
+        slug, counter = base, 2
+        while slug in used:
+            slug, counter = f'{base}-{counter}', counter + 1
+        used.add(slug)
+        return f'<h{level} id="{slug}">{inner} <a class="heading-anchor" href="#{slug}" aria-label="Link to this section">#</a></h{level}>'
+
+    return HEADING_RE.sub(anchor, cleaned)
+
+
+def reading_time(text):
+    """Whole minutes to read `text` (plain text), at least 1 if there is any."""
+    words = len(WORD_RE.findall(text))
+    return math.ceil(words / WORDS_PER_MINUTE) if words else 0
+
+
+def plain_text(rendered, limit=None):
+    """Plain text of rendered HTML, one line per block, cut to `limit` characters."""
+    text = html.unescape(strip_tags(BLOCK_END_RE.sub('\n', rendered or '')))
+    text = '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+    if limit and len(text) > limit:
+        text = text[:limit - 1].rstrip() + '…'
+    return text
+
+
+def render(source):
+    """Return (safe HTML, reading minutes) for an editor's HTML."""
+    cleaned = _cleaner.clean(DROP_BLOCKS_RE.sub('', source or ''))
+    return _add_heading_anchors(cleaned), reading_time(html.unescape(strip_tags(cleaned)))
+
+
+def prerender(instance, field, reading_time_field=None, update_fields=None):
+    """
+    Refresh `<field>_html`, `<field>_hash` (and `reading_time_field`) on an
+    unsaved instance if `field` changed. Call from save(); returns the
+    update_fields to save with.
+    """
+    if update_fields is not None and field not in update_fields:
+        return update_fields
+    digest = source_hash(getattr(instance, field) or '')
+    if digest == getattr(instance, f'{field}_hash'):
+        return update_fields
+    rendered, minutes = render(getattr(instance, field))
+    setattr(instance, f'{field}_html', rendered)
+    setattr(instance, f'{field}_hash', digest)
+    changed = {f'{field}_html', f'{field}_hash'}
+    if reading_time_field:
+        setattr(instance, reading_time_field, minutes)
+        changed.add(reading_time_field)
+    if update_fields is not None:
+        update_fields = set(update_fields) | changed
+    return update_fields
+
+
+def backfill(queryset, field, reading_time_field=None, batch_size=BATCH_SIZE, force=False):
+    """
+    Render `field` for every row of `queryset` whose stored hash is stale, in
+    batches of `batch_size` with bulk_update. Returns (rows scanned, rows updated).
+    Rows that change get a new updated_at, so conditional GETs see the new HTML.
+    """
+    model = queryset.model
+    fields = ['pk', field, f'{field}_hash']
+    update_fields = [f'{field}_html', f'{field}_hash']
+    if reading_time_field:
+        update_fields.append(reading_time_field)
+    has_updated_at = any(f.name == 'updated_at' for f in model._meta.fields)
+    if has_updated_at:
+        update_fields.append('updated_at')
+
+    scanned = updated = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:batch_size])
+        if not batch:
+            break
+        changed = []
+        now = timezone.now()
+        for instance in batch:
+            digest = source_hash(getattr(instance, field) or '')
+            if force or digest != getattr(instance, f'{field}_hash'):
+                rendered, minutes = render(getattr(instance, field))
+                setattr(instance, f'{field}_html', rendered)
+                setattr(instance, f'{field}_hash', digest)
+                if reading_time_field:
+                    setattr(instance, reading_time_field, minutes)
+                if has_updated_at:
+                    instance.updated_at = now
+                changed.append(instance)
+        if changed:
+            model.objects.bulk_update(changed, update_fields)
+        scanned += len(batch)
+        updated += len(changed)
+        last_pk = batch[-1].pk
+    return scanned, updated
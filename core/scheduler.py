@@ -0,0 +1,48 @@
+"""
+Periodic background tasks inside the ASGI process.
+
+Housekeeping jobs (the counsel purge, the event sweep, the Paystack webhook
+workers, ...) each have a management command for cron. Setting the job's
+interval instead runs it on a daemon thread here, so a single-process
+deployment needs no cron:
+
+- `start_periodic()` calls the task every `interval` seconds, or sooner
+  when its `wake` event is set (e.g. after a commit that queued work).
+- Each run gets fresh database connections, which are closed again
+  afterwards, so an idle thread holds none.
+- A failing run is logged and the next one goes ahead as scheduled.
+"""
+
+import logging
+import threading
+
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+
+def _loop(name, interval, task, wake):
+    while True:
+        wake.wait(interval)
+        wake.clear()
+        close_old_connections()
+        try:
+            task()
+        except Exception:
+            logger.exception("Scheduled task %s failed", name)
+        finally:
+            connections.close_all()
+
+
+def start_periodic(name, interval, task, wake=None):
+    """
+    Run `task()` every `interval` seconds on a daemon thread named `name`,
+    or as soon as the `wake` event is set. Does nothing when the interval is 0.
+    """
+    if not interval:
+        return None
+    thread = threading.Thread(
+        target=_loop, args=(name, interval, task, wake or threading.Event()), name=name, daemon=True
+    )
+    thread.start()
+    return thread
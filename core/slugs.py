@@ -0,0 +1,131 @@
+"""
+Unique slug allocation.
+
+A slug is the slugified source text ("sunday-service"), or that plus the
+next free numeric suffix ("sunday-service-4") when it is taken. The taken
+slugs are read with one query (the base, or a "base-" prefix match),
+however many collisions there are; other extensions of the base, such as
+"base-notes", are ignored.
+
+- Models mix in UniqueSlugMixin (and UniqueSlugQuerySet, for
+  bulk_create): save() fills in a blank slug, and if a concurrent save
+  takes it first the IntegrityError is caught and the next one is tried
+  (other integrity errors are raised as they are).
+- `assign_slugs()` fills a whole batch with one query per distinct base,
+  so importing 1,000 "Sunday Service" events costs one query, not 1,000.
+"""
+
+import re
+from collections import defaultdict
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+MAX_ATTEMPTS = 5
+
+
+def base_slug(model, text, field='slug'):
+    """Slugified `text`, cut to the field's length; the model name if nothing is left."""
+    max_length = model._meta.get_field(field).max_length
+    return slugify(text or '')[:max_length].strip('-') or model._meta.model_name
+
+
+def taken_suffixes(model, base, field='slug', exclude_pk=None, reserved=()):
+    """Suffixes in use for `base`, or in `reserved`: 0 for the bare base, n for "base-n" (one query)."""
+    queryset = model._default_manager.filter(
+        Q(**{field: base}) | Q(**{f'{field}__startswith': f'{base}-'})
+    )
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    pattern = re.compile(rf'^{re.escape(base)}(?:-(\d+))?$')
+    suffixes = set()
+    for slug in [*queryset.order_by().values_list(field, flat=True), *reserved]:
+        match = pattern.match(slug)
+        if match:
+            suffixes.add(int(match.group(1) or 0))
+    return suffixes
+
+
+def _with_suffix(base, suffix, max_length):
+    if not suffix:
+        return base
+    ending = f'-{suffix}'
+    return base[:max_length - len(ending)].rstrip('-') + ending
+
+
+def _next_free(model, base, field, count=1, exclude_pk=None, reserved=()):
+    """`count` free slugs for `base`, in order, fitting the field."""
+    max_length = model._meta.get_field(field).max_length
+    while True:
+        taken = taken_suffixes(model, base, field, exclude_pk, reserved)
+        # After the highest suffix in use, so earlier imports keep their order
+        start = max(taken) + 1 if taken else 0
+        slugs = [_with_suffix(base, start + index, max_length) for index in range(count)]
+        if all(slug.startswith(base) for slug in slugs):
+            return slugs
+        # The suffix cut into the base: allocate under the shortened base instead
+        base = base[:max_length - len(f'-{start + count}')].rstrip('-')
+
+
+def unique_slug(model, text, field='slug', exclude_pk=None):
+    """A free slug for `text` on `model`."""
+    return _next_free(model, base_slug(model, text, field), field, exclude_pk=exclude_pk)[0]
+
+
+def assign_slugs(instances, source, field='slug'):
+    """Give every instance without a slug a distinct free one (one query per distinct base)."""
+    groups = defaultdict(list)
+    # Explicit slugs elsewhere in the batch count as taken too
+    reserved = set()
+    for instance in instances:
+        if getattr(instance, field):
+            reserved.add(getattr(instance, field))
+        else:
+            groups[base_slug(type(instance), getattr(instance, source), field)].append(instance)
+    for base, group in groups.items():
+        slugs = _next_free(type(group[0]), base, field, count=len(group), reserved=reserved)
+        for instance, slug in zip(group, slugs):
+            setattr(instance, field, slug)
+    return instances
+
+
+class UniqueSlugMixin:
+    """Fill a blank `slug` from `slug_source` on save, retrying if a concurrent save takes it."""
+
+    slug_source = 'title'
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+        for attempt in range(MAX_ATTEMPTS):
+            self.slug = unique_slug(type(self), getattr(self, self.slug_source), exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = type(self)._default_manager.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not taken or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                self.slug = ''
+
+
+class UniqueSlugQuerySet(models.QuerySet):
+    """bulk_create() fills blank slugs first (see assign_slugs), retrying on a collision."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        source = self.model.slug_source
+        blank = [obj for obj in objs if not obj.slug]
+        for attempt in range(MAX_ATTEMPTS):
+            assign_slugs(objs, source)
+            try:
+                with transaction.atomic(using=self.db):
+                    return super().bulk_create(objs, *args, **kwargs)
+            except IntegrityError:
+                # Retry only if a concurrent save took one of the new slugs
+                taken = blank and self.filter(slug__in=[obj.slug for obj in blank]).exists()
+                if not taken or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                for obj in blank:
+                    obj.slug = ''
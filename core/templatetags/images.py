@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from core.images import get_manifest
+
+register = template.Library()
+
+
+def _attributes(attrs):
+    return format_html_join('', ' {}="{}"', ((name.replace('_', '-'), value) for name, value in attrs.items()))
+
+
+def _srcset(renditions):
+    return ', '.join(f'{settings.MEDIA_URL}{name} {width}w' for width, name in renditions)
+
+
+@register.simple_tag
+def responsive_image(field_file, sizes='100vw', alt='', **attrs):
+    """
+    Render an uploaded image as a <picture> with WebP and JPEG srcsets at the
+    IMAGE_DERIVATIVE_WIDTHS, letting the browser pick the width that `sizes`
+    calls for. Until the derivatives exist the original is used.
+
+    Usage: {% responsive_image event.image sizes="(max-width: 720px) 100vw, 720px" alt=event.title class="cover" %}
+    """
+    if not field_file:
+        return ''
+    manifest = get_manifest(field_file)
+    if manifest is None:
+        return format_html(
+            '<img src="{}" alt="{}" loading="lazy" decoding="async"{}>',
+            field_file.url, alt, _attributes(attrs)
+        )
+    renditions = manifest['renditions']
+    fallback = renditions['jpeg'][-1][1]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async"{}>'
+        '</picture>',
+        _srcset(renditions['webp']), sizes,
+        settings.MEDIA_URL, fallback, _srcset(renditions['jpeg']), sizes,
+        manifest['width'], manifest['height'], alt, _attributes(attrs)
+    )
@@ -1,3 +1,74 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from events.models import Event
+
+from . import slugs
+
+
+def new_event(title, slug=''):
+    start = timezone.make_aware(datetime(2026, 1, 4, 10))
+    return Event(title=title, slug=slug, start_time=start, end_time=start + timedelta(hours=2))
+
+
+class SlugAllocatorTests(TestCase):
+    def test_suffixes_count_from_the_highest_in_use(self):
+        for slug in ('sunday-service', 'sunday-service-4', 'sunday-service-notes', 'sunday-services'):
+            new_event('Other', slug=slug).save()
+        self.assertEqual(slugs.taken_suffixes(Event, 'sunday-service'), {0, 4})
+        self.assertEqual(slugs.unique_slug(Event, 'Sunday Service'), 'sunday-service-5')
+
+    def test_like_wildcards_in_the_base_are_literal(self):
+        new_event('Other', slug='sunday_service-2').save()
+        new_event('Other', slug='sundayxservice-3').save()
+        self.assertEqual(slugs.taken_suffixes(Event, 'sunday_service'), {2})
+
+    def test_save_fills_blank_slugs(self):
+        first, second = new_event('Sunday Service'), new_event('Sunday Service')
+        first.save()
+        second.save()
+        self.assertEqual((first.slug, second.slug), ('sunday-service', 'sunday-service-1'))
+
+    def test_suffix_fits_the_field(self):
+        event = new_event('x' * 60)
+        event.save()
+        again = new_event('x' * 60)
+        again.save()
+        max_length = Event._meta.get_field('slug').max_length
+        # "-1" would cut into the base, so the shortened base is allocated instead
+        self.assertEqual((event.slug, again.slug), ('x' * max_length, 'x' * (max_length - 2)))
+
+    def test_bulk_create_uses_one_query_per_base(self):
+        events = [new_event('Sunday Service') for _ in range(20)] + [new_event('Vigil', slug='sunday-service-30')]
+        with CaptureQueriesContext(connection) as queries:
+            slugs.assign_slugs(events, 'title')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(events[0].slug, 'sunday-service-31')
+        self.assertEqual(len({event.slug for event in events}), len(events))
+
+    def test_bulk_create_retries_when_a_slug_is_taken_concurrently(self):
+        new_event('Sunday Service').save()
+        real = slugs.taken_suffixes
+        calls = []
+
+        def stale_once(*args, **kwargs):
+            # The first read misses the row a concurrent save just committed
+            calls.append(args)
+            return set() if len(calls) == 1 else real(*args, **kwargs)
+
+        with mock.patch.object(slugs, 'taken_suffixes', side_effect=stale_once):
+            created = Event.objects.bulk_create([new_event('Sunday Service')])
+        self.assertEqual(created[0].slug, 'sunday-service-1')
+        self.assertEqual(len(calls), 2)
 
-# Create your tests here.
+    def test_bulk_create_does_not_retry_other_integrity_errors(self):
+        new_event('Vigil', slug='vigil').save()
+        with mock.patch.object(slugs, 'assign_slugs', wraps=slugs.assign_slugs) as assign:
+            with self.assertRaises(IntegrityError):
+                Event.objects.bulk_create([new_event('Sunday Service'), new_event('Vigil', slug='vigil')])
+        self.assertEqual(assign.call_count, 1)
@@ -1,11 +1,14 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.conf import settings
 from django.http import Http404, HttpResponse
+from django.views.decorators.http import condition
 from .models import Category
 from sermons.models import Sermon, Topic
 from ministry.models import Testimony
 
 from dashboard.models import SiteSettings
+from .conditional import aggregate_state, allows_conditional, page_etag
+from .page_cache import public_page_cache
 
 def authorize_device(request, token):
     if token == settings.DEVICE_AUTH_TOKEN:
@@ -25,13 +28,25 @@ def authorize_device(request, token):
         # Invalid token, return 404 to hide endpoint
         raise Http404()
 
+def home_etag(request):
+    if not allows_conditional(request):
+        return None
+    return page_etag(
+        request,
+        *aggregate_state(Sermon.objects.all()),
+        *aggregate_state(Testimony.objects.filter(is_approved=True)),
+        models=(Topic,)
+    )
+
+@condition(etag_func=home_etag)
+@public_page_cache(Topic, Testimony, Sermon)
 def home(request):
     # Use Topics as Categories for the filter tabs
     categories = Topic.objects.all()
     # Fetch latest 3 approved testimonies
     testimonies = Testimony.objects.filter(is_approved=True).order_by('-created_at')[:3]
     # Fetch recent sermons (V2)
-    recent_sermons = Sermon.objects.all().order_by('-date_preached')[:10]
+    recent_sermons = Sermon.objects.for_listing().order_by('-date_preached')[:10]
     # Fetch Site Settings for Live Banner
     site_config = SiteSettings.load()
     
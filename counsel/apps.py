@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CounselConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'counsel'
+
+    def ready(self):
+        from . import signals, write_behind
+
+        if write_behind.is_enabled():
+            # Fail at startup rather than on the first chat message
+            write_behind.configured_worker_id()
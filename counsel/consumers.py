@@ -3,10 +3,14 @@ WebSocket consumer for counselling chat.
 """
 
 import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
 
+from . import presence, write_behind
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """
@@ -14,6 +18,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
     Handles message sending/receiving between users and counsellors.
     """
     
+    # Set once a staff socket has heartbeated, so disconnect() knows to leave
+    in_presence = False
+    
     async def connect(self):
         """Handle WebSocket connection."""
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
@@ -25,9 +32,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        # Verify user has access to this conversation
-        has_access = await self.check_conversation_access(user)
-        if not has_access:
+        # Load owner/counsellor/active state once; kept fresh by conversation_access events
+        self.conversation_state = await self.load_conversation_state()
+        if not self.user_has_access(user):
             await self.close()
             return
         
@@ -38,6 +45,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        if user.is_staff:
+            await sync_to_async(presence.heartbeat)(user.id, self.channel_name)
+            self.in_presence = True
+        
+        # Reconnecting clients pass the last state they saw in the query string
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'last_message_id' in params:
+            await self.send_sync(
+                params['last_message_id'][0],
+                params.get('last_change_id', [None])[0]
+            )
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
@@ -46,6 +65,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        
+        # Sockets refused in connect() never joined presence
+        if self.in_presence:
+            user = self.scope.get('user')
+            await sync_to_async(presence.leave)(user.id, self.channel_name)
     
     async def receive(self, text_data):
         """Handle incoming WebSocket messages."""
@@ -55,13 +79,34 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         try:
             data = json.loads(text_data)
+            
+            if data.get('type') == 'heartbeat':
+                if user.is_staff:
+                    await sync_to_async(presence.heartbeat)(user.id, self.channel_name)
+                return
+            
+            if not self.conversation_state:
+                return
+
+            # Catching up stays possible after the conversation is closed
+            if data.get('type') == 'sync':
+                await self.send_sync(data.get('last_message_id'), data.get('last_change_id'))
+                return
+
+            if not self.conversation_state['is_active']:
+                return
+
             message_content = data.get('message', '').strip()
             
             if not message_content:
                 return
             
-            # Save message to database
-            message = await self.save_message(user, message_content)
+            # Save message to database (or queue it in write-behind mode)
+            if write_behind.is_enabled():
+                message = write_behind.get_writer().enqueue(self.conversation_id, user.id, message_content)
+            else:
+                state = self.conversation_state
+                message = await self.save_message(user, message_content, state['user_id'], state['counsellor_id'])
             
             # Broadcast message to room group
             await self.channel_layer.group_send(
@@ -96,6 +141,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message_id': event['message_id'],
             'content': event['content'],
             'edited_at': event['edited_at'],
+            'change_id': event.get('change_id'),
         }))
 
     async def chat_message_delete(self, event):
@@ -103,31 +149,170 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'message_deleted',
             'message_id': event['message_id'],
+            'change_id': event.get('change_id'),
         }))
     
+    async def conversation_access(self, event):
+        """Refresh cached access state after the conversation is closed or reassigned."""
+        was_active = bool(self.conversation_state and self.conversation_state['is_active'])
+        if event.get('deleted'):
+            self.conversation_state = None
+        else:
+            self.conversation_state = {
+                'user_id': event['user_id'],
+                'counsellor_id': event['counsellor_id'],
+                'is_active': event['is_active'],
+            }
+        
+        if not self.user_has_access(self.scope.get('user')):
+            await self.close()
+            return
+        
+        if was_active and not event['is_active']:
+            await self.send(text_data=json.dumps({'type': 'conversation_closed'}))
+    
+    def user_has_access(self, user):
+        """Check the cached state: user owns the conversation OR is staff (counsellor)."""
+        state = self.conversation_state
+        if state is None:
+            return False
+        return state['user_id'] == user.id or user.is_staff
+    
+    async def send_sync(self, last_message_id, last_change_id=None):
+        """Stream only the messages, edits and deletes the client missed."""
+        try:
+            last_message_id = int(last_message_id)
+            last_change_id = int(last_change_id) if last_change_id not in (None, '') else None
+        except (TypeError, ValueError):
+            return
+        
+        if write_behind.is_enabled():
+            # Queued messages must be in the database before the delta query;
+            # flush() also waits for a flush already under way
+            await write_behind.get_writer().flush()
+        
+        for frame in await self.get_sync_frames(last_message_id, last_change_id):
+            await self.send(text_data=json.dumps(frame))
+    
     @database_sync_to_async
-    def check_conversation_access(self, user):
-        """Check if user has access to this conversation."""
+    def load_conversation_state(self):
+        """Fetch the fields access decisions depend on, or None if missing."""
         from .models import Conversation
         
-        try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            # User owns the conversation OR is staff (counsellor)
-            return conversation.user == user or user.is_staff
-        except Conversation.DoesNotExist:
-            return False
+        return Conversation.objects.filter(id=self.conversation_id).values(
+            'user_id', 'counsellor_id', 'is_active'
+        ).first()
+    
+    @database_sync_to_async
+    def get_sync_frames(self, last_message_id, last_change_id):
+        """Build the catch-up frames for a reconnecting client."""
+        from .history import get_delta
+        
+        messages, changes, truncated = get_delta(self.conversation_id, last_message_id, last_change_id)
+        if truncated:
+            # Too far behind to replay; the client reloads the latest page instead
+            return [{'type': 'sync_reset'}]
+        
+        frames = [{
+            'type': 'message',
+            'message': msg.content,
+            'sender_id': msg.sender_id,
+            'sender_username': msg.sender.username,
+            'timestamp': msg.timestamp.isoformat(),
+            'message_id': msg.id,
+        } for msg in messages]
+        
+        for message_id, (action, change_id, msg) in changes.items():
+            if action == 'deleted':
+                frames.append({
+                    'type': 'message_deleted',
+                    'message_id': message_id,
+                    'change_id': change_id,
+                })
+            else:
+                frames.append({
+                    'type': 'message_edited',
+                    'message_id': message_id,
+                    'content': msg.content,
+                    'edited_at': msg.edited_at.isoformat() if msg.edited_at else None,
+                    'change_id': change_id,
+                })
+        
+        frames.append({
+            'type': 'sync_complete',
+            'last_message_id': messages[-1].id if messages else last_message_id,
+            'last_change_id': max((c[1] for c in changes.values()), default=last_change_id),
+        })
+        return frames
     
     @database_sync_to_async
-    def save_message(self, user, content):
-        """Save message to database."""
+    def save_message(self, user, content, owner_id, counsellor_id):
+        """Save message to database and count it as unread for the other party."""
+        from .counters import adjust_unread
         from .models import Conversation, Message
         
-        conversation = Conversation.objects.get(id=self.conversation_id)
         message = Message.objects.create(
-            conversation=conversation,
+            conversation_id=self.conversation_id,
             sender=user,
             content=content
         )
-        # Update conversation timestamp
-        conversation.save()  # Triggers auto_now on updated_at
+        # Bump only updated_at/expires_at; a full save() would also re-send every column
+        Conversation.touch(self.conversation_id, message.timestamp)
+        adjust_unread(owner_id, counsellor_id, user.id, 1)
         return message
+
+
+class PresenceConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for counsellor presence.
+    Staff sockets heartbeat to stay online; every socket is told when
+    counsellor availability changes.
+    """
+    
+    async def connect(self):
+        """Handle WebSocket connection."""
+        await self.channel_layer.group_add(
+            presence.PRESENCE_GROUP,
+            self.channel_name
+        )
+        await self.accept()
+        presence.ensure_sweeper()
+        
+        user = self.scope.get('user')
+        if user and user.is_authenticated and user.is_staff:
+            await sync_to_async(presence.heartbeat)(user.id, self.channel_name)
+        
+        online = await sync_to_async(presence.is_online)()
+        await self.send(text_data=json.dumps({'type': 'presence', 'online': online}))
+    
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection."""
+        await self.channel_layer.group_discard(
+            presence.PRESENCE_GROUP,
+            self.channel_name
+        )
+        
+        user = self.scope.get('user')
+        if user and user.is_authenticated and user.is_staff:
+            await sync_to_async(presence.leave)(user.id, self.channel_name)
+    
+    async def receive(self, text_data):
+        """Handle heartbeats from counsellor sockets."""
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated or not user.is_staff:
+            return
+        
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            return
+        
+        if data.get('type') == 'heartbeat':
+            await sync_to_async(presence.heartbeat)(user.id, self.channel_name)
+    
+    async def presence_update(self, event):
+        """Send presence change to WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'online': event['online'],
+        }))
@@ -1,56 +1,29 @@
-from django.db.models import Q
-from .models import Conversation, Message
+from django.utils.functional import SimpleLazyObject
+
+from .counters import get_counter
+
 
 def counsel_notifications(request):
     """
     Context processor to provide notification counts for counsel sessions.
+
+    Counts come from the user's CounselCounter row. Each value is a callable,
+    so the row is only fetched (once) if a template actually renders a badge.
     """
     if not request.user.is_authenticated:
         return {}
 
-    counts = {
-        'counsel_badge_count': 0,
-        'user_unread_count': 0,
-        'has_active_session': False
-    }
-
     user = request.user
+    counter = SimpleLazyObject(lambda: get_counter(user))
 
-    # Logic for Admin/Staff (Counsellors)
-    if user.is_staff:
-        # 1. Unread messages in conversations where this user is the counsellor
-        # OR unassigned conversations (if we want admins to see them)
-        
-        # Unread messages in assigned conversations
-        unread_assigned = Message.objects.filter(
-            conversation__counsellor=user,
-            is_read=False,
-            is_deleted=False
-        ).exclude(sender=user).count()
-        
-        # Active sessions that are unassigned (waiting for a counsellor)
-        unassigned_sessions = Conversation.objects.filter(
-            counsellor__isnull=True,
-            is_active=True,
-            user_deleted=False
-        ).count()
-        
-        counts['counsel_badge_count'] = unread_assigned + unassigned_sessions
-
-    # Logic for Regular Users (and Staff acting as users)
-    # Check for active session
-    active_session = Conversation.objects.filter(
-        user=user,
-        is_active=True,
-        user_deleted=False
-    ).first()
+    def counsel_badge_count():
+        # Unread messages in assigned conversations + sessions waiting for a counsellor
+        if not user.is_staff:
+            return 0
+        return counter.counsellor_unread_count + counter.waiting_count
 
-    if active_session:
-        counts['has_active_session'] = True
-        # Count unread messages from counsellor (sender != user)
-        counts['user_unread_count'] = active_session.messages.filter(
-            is_read=False,
-            is_deleted=False
-        ).exclude(sender=user).count()
-
-    return counts
+    return {
+        'counsel_badge_count': counsel_badge_count,
+        'user_unread_count': lambda: counter.unread_count,
+        'has_active_session': lambda: counter.has_active_session,
+    }
@@ -0,0 +1,108 @@
+"""
+Materialized counsel notification counters (see CounselCounter).
+
+Frequent events adjust counters with a single UPDATE each:
+- new messages (ChatConsumer.save_message and write-behind flushes)
+- messages marked read (widget_messages) or deleted (delete_message)
+
+Rarer events (session started, assigned, closed, removed or purged) go
+through the Conversation signals, which recompute the affected users.
+A user without a counter row gets one computed on first lookup.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.db.models.functions import Greatest
+
+from .models import CounselCounter, Conversation, Message
+
+
+def _waiting_sessions():
+    return Conversation.objects.filter(
+        counsellor__isnull=True,
+        is_active=True,
+        user_deleted=False
+    ).count()
+
+
+def _at_least_zero(expression):
+    return Greatest(expression, 0, output_field=PositiveIntegerField())
+
+
+def recompute_for_user(user):
+    """Rebuild one user's counters from the conversation and message tables."""
+    values = {
+        'unread_count': 0,
+        'has_active_session': False,
+        'counsellor_unread_count': 0,
+        'waiting_count': 0,
+    }
+
+    active_session = Conversation.objects.filter(
+        user=user,
+        is_active=True,
+        user_deleted=False
+    ).first()
+    if active_session:
+        values['has_active_session'] = True
+        values['unread_count'] = active_session.messages.filter(
+            is_read=False,
+            is_deleted=False
+        ).exclude(sender=user).count()
+
+    if user.is_staff:
+        values['counsellor_unread_count'] = Message.objects.filter(
+            conversation__counsellor=user,
+            is_read=False,
+            is_deleted=False
+        ).exclude(sender=user).count()
+        values['waiting_count'] = _waiting_sessions()
+
+    counter, _ = CounselCounter.objects.update_or_create(user=user, defaults=values)
+    return counter
+
+
+def get_counter(user):
+    """Return the user's counters, computing them if no row exists yet."""
+    counter = CounselCounter.objects.filter(user=user).first()
+    if counter is None:
+        counter = recompute_for_user(user)
+    return counter
+
+
+def refresh_users(user_ids):
+    """Recompute counters for the given users (ids may include None)."""
+    for user in User.objects.filter(id__in=[user_id for user_id in user_ids if user_id]):
+        recompute_for_user(user)
+
+
+def refresh_waiting_count():
+    """Store the current number of waiting sessions on every staff counter."""
+    CounselCounter.objects.filter(user__is_staff=True).update(waiting_count=_waiting_sessions())
+
+
+def adjust_unread(owner_id, counsellor_id, sender_id, delta):
+    """
+    Add `delta` unread messages from `sender_id` to the conversation owner's
+    and counsellor's counters, in one UPDATE.
+    """
+    recipients = {owner_id, counsellor_id} - {sender_id, None}
+    if not recipients:
+        return
+    CounselCounter.objects.filter(user_id__in=recipients).update(
+        unread_count=Case(
+            When(user_id=owner_id, then=_at_least_zero(F('unread_count') + delta)),
+            default=F('unread_count'),
+        ),
+        counsellor_unread_count=Case(
+            When(user_id=counsellor_id, then=_at_least_zero(F('counsellor_unread_count') + delta)),
+            default=F('counsellor_unread_count'),
+        ),
+    )
+
+
+def record_read(user_id, count):
+    """Take `count` messages the user has just read off their unread count."""
+    CounselCounter.objects.filter(user_id=user_id).update(
+        unread_count=_at_least_zero(F('unread_count') - count)
+    )
@@ -0,0 +1,124 @@
+"""
+Keyset pagination and reconnect sync over a conversation's message history.
+
+Messages are ordered by (timestamp, id). A cursor points at the oldest
+message a client already has, so "load older" never skips or repeats rows
+when new messages arrive in the meantime.
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Q
+
+from .models import Message, MessageChange
+
+# Number of messages embedded in the initial chat render and returned per page
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+# Reconnects missing more than this many messages reload the page instead
+SYNC_MAX_MESSAGES = 200
+
+CURSOR_RE = re.compile(r'(\d+)-(\d+)', re.ASCII)
+
+
+def encode_cursor(message):
+    """Build an opaque cursor string from a message's (timestamp, id)."""
+    ts = message.timestamp
+    micros = int(ts.replace(microsecond=0).timestamp()) * 1_000_000 + ts.microsecond
+    return f"{micros}-{message.id}"
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) for a cursor, or None if it is malformed."""
+    match = CURSOR_RE.fullmatch(cursor) if isinstance(cursor, str) else None
+    if match is None:
+        return None
+    seconds, remainder = divmod(int(match.group(1)), 1_000_000)
+    try:
+        timestamp = datetime.fromtimestamp(seconds, tz=dt_timezone.utc).replace(microsecond=remainder)
+    except (OverflowError, OSError, ValueError):
+        # Out of the datetime range
+        return None
+    return timestamp, int(match.group(2))
+
+
+def get_message_page(conversation, before=None, limit=MESSAGE_PAGE_SIZE):
+    """
+    Return (messages, has_more) for the newest `limit` visible messages
+    older than the `before` cursor. Messages are returned oldest first.
+    """
+    queryset = Message.objects.filter(
+        conversation=conversation,
+        is_deleted=False
+    ).select_related('sender')
+
+    if before is not None:
+        timestamp, message_id = before
+        queryset = queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id)
+        )
+
+    # Fetch one extra row to know whether an older page exists
+    page = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    return page, has_more
+
+
+def serialize_message(msg):
+    """Format a message for JSON responses."""
+    return {
+        'id': msg.id,
+        'content': msg.content,
+        'sender_id': msg.sender_id,
+        'sender_name': msg.sender.get_full_name() or msg.sender.username,
+        'timestamp': msg.timestamp.isoformat(),
+        'edited_at': msg.edited_at.isoformat() if msg.edited_at else None,
+    }
+
+
+def latest_change_id(conversation):
+    """Return the id of the newest edit/delete logged for a conversation (0 if none)."""
+    return MessageChange.objects.filter(
+        conversation=conversation
+    ).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def get_delta(conversation_id, last_message_id, last_change_id=None, limit=SYNC_MAX_MESSAGES):
+    """
+    Collect what a client missed since `last_message_id` / `last_change_id`.
+
+    Returns (messages, changes, truncated). `changes` maps message id to
+    (action, change_id, message), collapsed so only the latest change per
+    message is replayed. When `last_change_id` is unknown, changes logged
+    since the last message the client saw are replayed instead.
+    """
+    messages = list(
+        Message.objects.filter(
+            conversation_id=conversation_id,
+            id__gt=last_message_id,
+            is_deleted=False
+        ).select_related('sender').order_by('timestamp', 'id')[:limit + 1]
+    )
+    if len(messages) > limit:
+        return [], {}, True
+
+    changes_qs = MessageChange.objects.filter(conversation_id=conversation_id)
+    if last_change_id is not None:
+        changes_qs = changes_qs.filter(id__gt=last_change_id)
+    else:
+        since = Message.objects.filter(id=last_message_id).values_list('timestamp', flat=True).first()
+        if since is not None:
+            changes_qs = changes_qs.filter(created_at__gte=since)
+
+    changes = {}
+    for change in changes_qs.select_related('message').order_by('id'):
+        previous = changes.get(change.message_id)
+        # A delete is final; later edits of the same message cannot undo it
+        action = 'deleted' if previous and previous[0] == 'deleted' else change.action
+        changes[change.message_id] = (action, change.id, change.message)
+
+    return messages, changes, False
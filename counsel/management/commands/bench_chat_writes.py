@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from counsel.consumers import ChatConsumer
+from counsel.models import Conversation
+from counsel.write_behind import MessageWriter, configured_worker_id
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks chat message persistence (direct vs write-behind) in messages/second'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages to write per mode')
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        User = get_user_model()
+        user = User.objects.create(username=f'bench-chat-{int(time.time())}')
+        conversation = Conversation.objects.create(user=user)
+
+        try:
+            direct = asyncio.run(self.run_direct(conversation, user, count))
+            batched = asyncio.run(self.run_write_behind(conversation.id, user, count))
+        finally:
+            # Cascades to the benchmark conversation and its messages
+            user.delete()
+
+        self.stdout.write(f'Database: {settings.DATABASES["default"]["ENGINE"]}')
+        self.stdout.write(f'Direct (INSERT + UPDATE per message): {direct:,.0f} messages/second')
+        self.stdout.write(self.style.SUCCESS(
+            f'Write-behind (batch {settings.COUNSEL_FLUSH_BATCH_SIZE}, '
+            f'{settings.COUNSEL_FLUSH_INTERVAL}s window): {batched:,.0f} messages/second'
+        ))
+
+    async def run_direct(self, conversation, user, count):
+        consumer = ChatConsumer()
+        consumer.conversation_id = conversation.id
+        start = time.perf_counter()
+        for i in range(count):
+            await consumer.save_message(
+                user, f'Benchmark message {i}', conversation.user_id, conversation.counsellor_id
+            )
+        return count / (time.perf_counter() - start)
+
+    async def run_write_behind(self, conversation_id, user, count):
+        writer = MessageWriter(
+            batch_size=settings.COUNSEL_FLUSH_BATCH_SIZE,
+            interval=settings.COUNSEL_FLUSH_INTERVAL,
+            worker_id=configured_worker_id(),
+        )
+        start = time.perf_counter()
+        for i in range(count):
+            writer.enqueue(conversation_id, user.id, f'Benchmark message {i}')
+            # A live consumer yields to the event loop while broadcasting
+            await asyncio.sleep(0)
+        # Only count messages once they are durable
+        await writer.flush()
+        elapsed = time.perf_counter() - start
+        writer.task.cancel()
+        return count / elapsed
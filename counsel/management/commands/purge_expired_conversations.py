@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from counsel.retention import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes '24h' retention conversations (and their messages) that have expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows deleted between pauses')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        purged = purge_expired(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {purged['conversations']} conversations and {purged['messages']} messages."
+        ))
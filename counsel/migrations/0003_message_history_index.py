@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counsel', '0002_message_edited_at_message_is_deleted'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'is_deleted', 'timestamp'], name='counsel_msg_history_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:58
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    """Existing '24h' conversations expire 24 hours after their last activity."""
+    Conversation = apps.get_model('counsel', 'Conversation')
+    for conversation in Conversation.objects.filter(retention_mode='24h').only('id', 'updated_at'):
+        Conversation.objects.filter(id=conversation.id).update(
+            expires_at=conversation.updated_at + timedelta(hours=24)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counsel', '0005_message_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,12 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Case, F, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+# '24h' conversations are purged this long after their last activity
+RETENTION_PERIOD = timedelta(hours=24)
 
 
 class Conversation(models.Model):
@@ -31,10 +38,39 @@ class Conversation(models.Model):
     )
     user_deleted = models.BooleanField(default=False)  # User-side soft delete
     is_active = models.BooleanField(default=True)
+    # When the purge job may delete this conversation; NULL for 'permanent'
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     
     class Meta:
         ordering = ['-updated_at']
     
+    def save(self, *args, **kwargs):
+        # Only message activity (touch) extends retention; closing, assigning,
+        # soft deletes and admin edits leave expires_at alone
+        if self.retention_mode != '24h':
+            self.expires_at = None
+        elif self._state.adding or self.expires_at is None:
+            # New, or just switched to '24h'
+            self.expires_at = timezone.now() + RETENTION_PERIOD
+        elif kwargs.get('update_fields') is None:
+            # Don't write back an expires_at loaded before later activity
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'expires_at'
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def touch(cls, conversation_id, timestamp):
+        """Record activity with a single UPDATE, pushing back expiry for '24h' conversations."""
+        cls.objects.filter(id=conversation_id).update(
+            updated_at=timestamp,
+            expires_at=Case(
+                When(retention_mode='24h', then=Value(timestamp + RETENTION_PERIOD)),
+                default=F('expires_at'),
+            ),
+        )
+    
     def __str__(self):
         return f"Conversation {self.id}: {self.user.username}"
 
@@ -53,13 +89,75 @@ class Message(models.Model):
         related_name='sent_messages'
     )
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind mode assigns the timestamp before the INSERT
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     is_read = models.BooleanField(default=False)
     is_deleted = models.BooleanField(default=False)  # Soft delete
     edited_at = models.DateTimeField(null=True, blank=True)  # Track edits
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Serves the keyset-paginated history query (see counsel.history)
+            models.Index(fields=['conversation', 'is_deleted', 'timestamp'], name='counsel_msg_history_idx'),
+        ]
     
     def __str__(self):
         return f"Message {self.id} from {self.sender.username}"
+
+
+class MessageChange(models.Model):
+    """
+    Append-only log of edits and deletes, so reconnecting clients can
+    replay only what changed since the last change they saw.
+    """
+    
+    ACTION_CHOICES = [
+        ('edited', 'Edited'),
+        ('deleted', 'Deleted'),
+    ]
+    
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='message_changes'
+    )
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='changes'
+    )
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['conversation', 'id'], name='counsel_change_sync_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Message {self.message_id} {self.action}"
+
+
+class CounselCounter(models.Model):
+    """
+    Per-user notification counts, kept up to date incrementally so the
+    counsel_notifications context processor needs a single lookup.
+    Rebuilt from scratch by counsel.counters.recompute_for_user.
+    """
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='counsel_counter'
+    )
+    # Unread messages from others in the user's active session
+    unread_count = models.PositiveIntegerField(default=0)
+    has_active_session = models.BooleanField(default=False)
+    # Staff only: unread messages in conversations they counsel, and waiting sessions
+    counsellor_unread_count = models.PositiveIntegerField(default=0)
+    waiting_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Counsel counters for {self.user_id}"
@@ -0,0 +1,174 @@
+"""
+Counsellor presence tracking.
+
+Every open counsellor socket (ChatConsumer or the dashboard PresenceConsumer)
+is an entry in the presence store that expires COUNSEL_PRESENCE_TTL seconds
+after its last heartbeat. A counsellor with several tabs open therefore stays
+online until the last socket closes or stops heartbeating.
+
+Without REDIS_URL the store lives in process memory, which is correct for a
+single Daphne process. With REDIS_URL it is a Redis sorted set scored by
+expiry time, shared by all processes.
+
+Whenever the "any counsellor online" answer flips, the new state is pushed
+to the `counsel_presence` group so widgets don't have to poll. The store
+remembers the last state pushed, so each flip is announced once even with
+several processes. Sockets that die without leave() (a crash, a half-open
+connection) just stop heartbeating; a sweep task on each process's event
+loop (`ensure_sweeper`, started by PresenceConsumer) notices when the last
+entry has expired and announces "offline". It runs on the event loop rather
+than a background thread because the in-memory channel layer only delivers
+sends made from the server's own loop.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_GROUP = 'counsel_presence'
+
+
+class MemoryPresenceStore:
+    """Per-process store: {member: expires_at}."""
+
+    def __init__(self):
+        self.entries = {}
+        self.online = None
+        self.lock = threading.Lock()
+
+    def _prune(self, now):
+        expired = [member for member, expires_at in self.entries.items() if expires_at <= now]
+        for member in expired:
+            del self.entries[member]
+
+    def touch(self, member, ttl):
+        now = time.time()
+        with self.lock:
+            self._prune(now)
+            self.entries[member] = now + ttl
+
+    def remove(self, member):
+        with self.lock:
+            self.entries.pop(member, None)
+
+    def count(self):
+        with self.lock:
+            self._prune(time.time())
+            return len(self.entries)
+
+    def swap_online(self, online):
+        """Record the state last announced; returns the previous one (None if never announced)."""
+        with self.lock:
+            previous, self.online = self.online, online
+            return previous
+
+
+class RedisPresenceStore:
+    """Shared store: a sorted set of members scored by expiry timestamp."""
+
+    key = 'counsel:presence'
+    state_key = 'counsel:presence:online'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def touch(self, member, ttl):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.key, '-inf', now)
+        pipe.zadd(self.key, {member: now + ttl})
+        pipe.execute()
+
+    def remove(self, member):
+        self.client.zrem(self.key, member)
+
+    def count(self):
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.key, '-inf', time.time())
+        pipe.zcard(self.key)
+        return pipe.execute()[1]
+
+    def swap_online(self, online):
+        previous = self.client.getset(self.state_key, '1' if online else '0')
+        return None if previous is None else previous == b'1'
+
+
+_store = None
+
+
+def get_store():
+    """Return the configured presence store, creating it on first use."""
+    global _store
+    if _store is None:
+        if settings.REDIS_URL:
+            _store = RedisPresenceStore(settings.REDIS_URL)
+        else:
+            _store = MemoryPresenceStore()
+    return _store
+
+
+def _broadcast(online):
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        PRESENCE_GROUP,
+        {'type': 'presence_update', 'online': online}
+    )
+
+
+def heartbeat(user_id, channel_name):
+    """Mark one counsellor socket as alive for another TTL period."""
+    store = get_store()
+    store.touch(f'{user_id}:{channel_name}', settings.COUNSEL_PRESENCE_TTL)
+    if store.swap_online(True) is not True:
+        _broadcast(True)
+
+
+def _announce_if_offline(store):
+    if store.count() == 0 and store.swap_online(False) is True:
+        _broadcast(False)
+
+
+def leave(user_id, channel_name):
+    """Forget a counsellor socket that has disconnected."""
+    store = get_store()
+    store.remove(f'{user_id}:{channel_name}')
+    _announce_if_offline(store)
+
+
+def sweep():
+    """Announce "offline" once the last entry has expired without a leave()."""
+    _announce_if_offline(get_store())
+
+
+def is_online():
+    """Whether any counsellor socket has heartbeated within the TTL."""
+    return get_store().count() > 0
+
+
+_sweeper = None
+
+
+async def _sweep_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_to_async(sweep)()
+        except Exception:
+            logger.exception("Presence sweep failed")
+
+
+def ensure_sweeper():
+    """Start this process's sweep task on the running event loop, once."""
+    global _sweeper
+    loop = asyncio.get_running_loop()
+    if _sweeper is None or _sweeper.done() or _sweeper.get_loop() is not loop:
+        # Expiry is noticed within 1.5 TTLs of the last heartbeat
+        _sweeper = loop.create_task(_sweep_loop(max(settings.COUNSEL_PRESENCE_TTL / 2, 1)))
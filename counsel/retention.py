@@ -0,0 +1,97 @@
+"""
+Purging of expired '24h' conversations.
+
+Expired conversations are found through the index on Conversation.expires_at
+and deleted one at a time, each with its messages and change log in its own
+short transaction. The transaction locks the conversation and re-checks its
+expiry first, so a conversation that sees activity during the purge is kept
+whole. The purge pauses after every `batch_size` deleted rows and every
+batch of conversations, so it never holds SQLite's write lock for long and
+chat writes can interleave.
+
+Run it from cron with `manage.py purge_expired_conversations`, or set
+COUNSEL_PURGE_INTERVAL to run it periodically inside the ASGI process.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from core.scheduler import start_periodic
+from .models import Conversation, Message, MessageChange
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_BATCH_SIZE = 50
+
+
+def _purge_conversation(conversation_id, now):
+    """Delete one conversation with its messages if it is still expired. Returns rows deleted per model."""
+    with transaction.atomic():
+        # Locked and re-checked in the transaction that deletes, so activity
+        # that gets in first keeps the conversation and all of its messages
+        # (on SQLite the concurrent writer wins and this raises OperationalError)
+        still_expired = (
+            Conversation.objects.select_for_update()
+            .filter(id=conversation_id, expires_at__lte=now)
+            .values_list('id', flat=True).first()
+        )
+        if still_expired is None:
+            return {}
+        _, counts = Conversation.objects.filter(id=conversation_id).delete()
+    return counts
+
+
+def purge_expired(batch_size=500, pause=0.05, now=None):
+    """Delete conversations whose expires_at has passed. Returns rows purged per model."""
+    now = now or timezone.now()
+    purged = {'conversations': 0, 'messages': 0}
+    skipped = set()
+    since_pause = 0
+
+    while True:
+        conversation_ids = list(
+            Conversation.objects.filter(expires_at__lte=now)
+            .exclude(id__in=skipped)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:CONVERSATION_BATCH_SIZE]
+        )
+        if not conversation_ids:
+            break
+
+        for conversation_id in conversation_ids:
+            try:
+                counts = _purge_conversation(conversation_id, now)
+            except OperationalError as e:
+                # Busy with new activity; the next run looks at it again
+                logger.warning("Skipped purging conversation %s: %s", conversation_id, e)
+                skipped.add(conversation_id)
+                continue
+            purged['conversations'] += counts.get('counsel.Conversation', 0)
+            purged['messages'] += counts.get('counsel.Message', 0)
+            since_pause += sum(counts.values())
+            if since_pause >= batch_size:
+                time.sleep(pause)
+                since_pause = 0
+        time.sleep(pause)
+
+    return purged
+
+
+def _purge_and_log():
+    purged = purge_expired()
+    if purged['conversations']:
+        logger.info(
+            "Purged %s expired conversations and %s messages", purged['conversations'], purged['messages']
+        )
+
+
+def start_scheduler():
+    """
+    Run purge_expired every COUNSEL_PURGE_INTERVAL seconds on a daemon
+    thread (core.scheduler). Does nothing when the interval is 0.
+    """
+    return start_periodic('counsel-purge', getattr(settings, 'COUNSEL_PURGE_INTERVAL', 0), _purge_and_log)
@@ -6,5 +6,6 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
+    re_path(r'ws/counsel/presence/$', consumers.PresenceConsumer.as_asgi()),
     re_path(r'ws/counsel/(?P<conversation_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
 ]
@@ -0,0 +1,47 @@
+"""
+Signal handlers that keep open chat sockets in step with conversation changes.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .counters import refresh_users, refresh_waiting_count
+from .models import Conversation
+
+
+def _broadcast_access(conversation_id, event):
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f'counsel_{conversation_id}',
+        {'type': 'conversation_access', **event}
+    )
+
+
+def _refresh_counters(user_id, counsellor_id):
+    # Session started, assigned, closed or removed: recompute rather than adjust
+    refresh_users([user_id, counsellor_id])
+    refresh_waiting_count()
+
+
+@receiver(post_save, sender=Conversation)
+def conversation_saved(sender, instance, **kwargs):
+    """Invalidate the access state cached by ChatConsumer (close, reassignment) and counters."""
+    event = {
+        'user_id': instance.user_id,
+        'counsellor_id': instance.counsellor_id,
+        'is_active': instance.is_active,
+    }
+    transaction.on_commit(lambda: _broadcast_access(instance.id, event))
+    transaction.on_commit(lambda: _refresh_counters(event['user_id'], event['counsellor_id']))
+
+
+@receiver(post_delete, sender=Conversation)
+def conversation_deleted(sender, instance, **kwargs):
+    """Disconnect sockets still attached to a deleted conversation."""
+    conversation_id = instance.id
+    user_ids = (instance.user_id, instance.counsellor_id)
+    transaction.on_commit(lambda: _broadcast_access(conversation_id, {'deleted': True}))
+    transaction.on_commit(lambda: _refresh_counters(*user_ids))
@@ -1,3 +1,194 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import retention
+from .counters import adjust_unread, get_counter, record_read, recompute_for_user
+from .history import decode_cursor, encode_cursor, get_message_page
+from .models import CounselCounter, Conversation, Message, MessageChange
+
+
+class HistoryCursorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('member', password='pw')
+        self.conversation = Conversation.objects.create(user=self.user)
+
+    def add_message(self, timestamp, content='Hello'):
+        return Message.objects.create(
+            conversation=self.conversation, sender=self.user, content=content, timestamp=timestamp
+        )
+
+    def test_round_trip_keeps_microseconds(self):
+        message = self.add_message(datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc))
+        self.assertEqual(decode_cursor(encode_cursor(message)), (message.timestamp, message.id))
+
+    def test_malformed_cursors(self):
+        for cursor in (None, '', 'abc', '12', '12-', '-5-3', '1-2-3', ' 12-3', '1_000-5', '١٢-٣', '9' * 30 + '-1'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+    def test_pages_follow_the_cursor_without_gaps(self):
+        start = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        # Two messages share a timestamp: the id breaks the tie
+        messages = [self.add_message(start + timedelta(seconds=i // 2)) for i in range(7)]
+        page, has_more = get_message_page(self.conversation, limit=3)
+        self.assertEqual((page, has_more), (messages[4:], True))
+
+        seen = list(page)
+        while has_more:
+            page, has_more = get_message_page(self.conversation, before=decode_cursor(encode_cursor(page[0])), limit=3)
+            seen[:0] = page
+        self.assertEqual(seen, messages)
+
+    def test_deleted_messages_are_skipped(self):
+        start = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        first, second = self.add_message(start), self.add_message(start + timedelta(seconds=1))
+        second.is_deleted = True
+        second.save()
+        self.assertEqual(get_message_page(self.conversation), ([first], False))
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.counsellor = User.objects.create_user('counsellor', password='pw', is_staff=True)
+        self.other_staff = User.objects.create_user('other', password='pw', is_staff=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversation = Conversation.objects.create(user=self.member, counsellor=self.counsellor)
+
+    def counts(self, user):
+        counter = CounselCounter.objects.get(user=user)
+        return counter.unread_count, counter.counsellor_unread_count
+
+    def send(self, sender, count=1):
+        for _ in range(count):
+            Message.objects.create(conversation=self.conversation, sender=sender, content='Hello')
+        adjust_unread(self.member.id, self.counsellor.id, sender.id, count)
+
+    def assert_matches_recompute(self):
+        adjusted = {user: self.counts(user) for user in (self.member, self.counsellor)}
+        for user in adjusted:
+            recompute_for_user(user)
+        self.assertEqual(adjusted, {user: self.counts(user) for user in adjusted})
+
+    def test_messages_count_for_the_other_party_only(self):
+        self.send(self.member, 2)
+        self.send(self.counsellor, 3)
+        self.assertEqual(self.counts(self.member), (3, 0))
+        self.assertEqual(self.counts(self.counsellor), (0, 2))
+        self.assert_matches_recompute()
+
+    def test_unassigned_conversation_counts_for_the_owner(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversation.counsellor = None
+            self.conversation.save()
+        adjust_unread(self.member.id, None, self.counsellor.id, 1)
+        self.assertEqual(self.counts(self.member), (1, 0))
+        self.assertEqual(self.counts(self.counsellor), (0, 0))
+
+    def test_counts_never_go_below_zero(self):
+        self.send(self.counsellor)
+        adjust_unread(self.member.id, self.counsellor.id, self.counsellor.id, -5)
+        record_read(self.member.id, 5)
+        self.assertEqual(self.counts(self.member), (0, 0))
+
+    def test_reading_takes_messages_off(self):
+        self.send(self.counsellor, 4)
+        Message.objects.filter(pk__in=Message.objects.order_by('pk').values('pk')[:3]).update(is_read=True)
+        record_read(self.member.id, 3)
+        self.assertEqual(self.counts(self.member), (1, 0))
+        self.assert_matches_recompute()
+
+    def test_waiting_sessions_are_recomputed_on_commit(self):
+        self.assertEqual(get_counter(self.other_staff).waiting_count, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Conversation.objects.create(user=User.objects.create_user('new', password='pw'))
+        self.assertEqual(get_counter(self.other_staff).waiting_count, 1)
+
+
+class BenchChatWritesTests(TransactionTestCase):
+    # The benchmark writes from worker threads, so its rows must be committed
+    @override_settings(COUNSEL_WORKER_ID=0)
+    def test_command_runs_both_modes(self):
+        out = StringIO()
+        call_command('bench_chat_writes', messages=5, stdout=out)
+        self.assertIn('Direct', out.getvalue())
+        self.assertIn('Write-behind', out.getvalue())
+        # The benchmark user and everything under it are cleaned up
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class RetentionPurgeTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.counsellor = User.objects.create_user('counsellor', password='pw', is_staff=True)
+        self.now = timezone.now()
+        # time.sleep between batches, recorded rather than slept
+        self.sleep = self.enterContext(mock.patch.object(retention.time, 'sleep'))
+
+    def conversation(self, expired=True, messages=2, retention_mode='24h'):
+        with self.captureOnCommitCallbacks(execute=True):
+            conversation = Conversation.objects.create(
+                user=self.member, counsellor=self.counsellor, retention_mode=retention_mode
+            )
+        for _ in range(messages):
+            Message.objects.create(conversation=conversation, sender=self.counsellor, content='Hello')
+        if expired:
+            Conversation.objects.filter(pk=conversation.pk).update(expires_at=self.now - timedelta(minutes=1))
+        return conversation
+
+    def purge(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return retention.purge_expired(now=self.now, pause=0, **kwargs)
+
+    def counts(self):
+        counter = CounselCounter.objects.get(user=self.member)
+        return counter.unread_count, counter.counsellor_unread_count, counter.has_active_session
+
+    def test_expired_conversations_go_with_everything_under_them(self):
+        expired = self.conversation()
+        message = expired.messages.first()
+        MessageChange.objects.create(conversation=expired, message=message, action='edited')
+        recompute_for_user(self.member)
+        self.assertEqual(get_counter(self.member).unread_count, 2)
+
+        self.assertEqual(self.purge(), {'conversations': 1, 'messages': 2})
+        self.assertFalse(Conversation.objects.exists())
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(MessageChange.objects.exists())
+        self.assertEqual(self.counts(), (0, 0, False))
+
+    def test_unexpired_and_permanent_conversations_are_kept(self):
+        kept = [self.conversation(expired=False), self.conversation(expired=False, retention_mode='permanent')]
+        self.assertEqual(self.purge(), {'conversations': 0, 'messages': 0})
+        self.assertCountEqual(Conversation.objects.all(), kept)
+        self.assertEqual(Message.objects.count(), 4)
+
+    def test_activity_before_the_delete_keeps_the_conversation(self):
+        conversation = self.conversation()
+        # New activity lands between the candidate query and the locked re-check
+        Conversation.touch(conversation.pk, self.now)
+        self.assertEqual(retention._purge_conversation(conversation.pk, self.now), {})
+        self.assertEqual(self.purge(), {'conversations': 0, 'messages': 0})
+        self.assertEqual(Message.objects.filter(conversation=conversation).count(), 2)
+
+    def test_pauses_after_each_batch(self):
+        for _ in range(3):
+            self.conversation()
+        # Each conversation is 3 rows: a pause after every conversation, and after the query batch
+        self.assertEqual(self.purge(batch_size=3), {'conversations': 3, 'messages': 6})
+        self.assertEqual(self.sleep.call_count, 4)
+
+    def test_conversations_are_fetched_in_batches(self):
+        for _ in range(3):
+            self.conversation()
+        with mock.patch.object(retention, 'CONVERSATION_BATCH_SIZE', 2):
+            self.assertEqual(self.purge(batch_size=1000), {'conversations': 3, 'messages': 6})
+        # One pause after each batch of two, and none for the empty query that ends the purge
+        self.assertEqual(self.sleep.call_count, 2)
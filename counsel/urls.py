@@ -9,6 +9,7 @@ urlpatterns = [
     path('chat/<int:conversation_id>/', views.chat_room, name='chat'),
     path('delete/<int:conversation_id>/', views.delete_conversation, name='delete'),
     path('api/status/', views.get_online_status, name='online_status'),
+    path('api/conversation/<int:conversation_id>/messages/', views.message_history, name='message_history'),
     path('api/widget-messages/', views.widget_messages, name='widget_messages'),
     path('api/message/<int:message_id>/edit/', views.edit_message, name='edit_message'),
     path('api/message/<int:message_id>/delete/', views.delete_message, name='delete_message'),
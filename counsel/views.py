@@ -6,7 +6,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
-from .models import Conversation, Message
+from .models import Conversation, Message, MessageChange
+from .counters import adjust_unread, record_read
+from .history import (
+    MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGE_SIZE,
+    decode_cursor, encode_cursor, get_message_page, latest_change_id, serialize_message,
+)
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
@@ -68,16 +73,51 @@ def chat_room(request, conversation_id):
         conversation.counsellor = user
         conversation.save()
     
-    # Get messages (exclude deleted)
-    chat_messages = conversation.messages.filter(is_deleted=False).order_by('timestamp')
+    # Only the newest page is embedded; older messages load via message_history
+    chat_messages, has_older = get_message_page(conversation)
     
     return render(request, 'counsel/chat_room.html', {
         'conversation': conversation,
         'chat_messages': chat_messages,
+        'has_older': has_older,
+        'history_cursor': encode_cursor(chat_messages[0]) if chat_messages else '',
+        'last_message_id': chat_messages[-1].id if chat_messages else 0,
+        'last_change_id': latest_change_id(conversation),
         'is_counsellor': user.is_staff,
     })
 
 
+@login_required
+def message_history(request, conversation_id):
+    """API endpoint returning older messages, paginated by (timestamp, id) cursor."""
+    conversation = get_object_or_404(Conversation, id=conversation_id)
+    user = request.user
+    
+    if not (conversation.user == user or user.is_staff):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    before = None
+    cursor = request.GET.get('before')
+    if cursor:
+        before = decode_cursor(cursor)
+        if before is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    try:
+        limit = int(request.GET.get('limit', MESSAGE_PAGE_SIZE))
+    except ValueError:
+        limit = MESSAGE_PAGE_SIZE
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+    
+    page, has_more = get_message_page(conversation, before=before, limit=limit)
+    
+    return JsonResponse({
+        'messages': [serialize_message(msg) for msg in page],
+        'has_more': has_more,
+        'next_cursor': encode_cursor(page[0]) if page and has_more else None,
+    })
+
+
 @login_required
 def delete_conversation(request, conversation_id):
     """Soft-delete conversation from user's view."""
@@ -119,6 +159,11 @@ def edit_message(request, message_id):
         message.content = new_content
         message.edited_at = timezone.now()
         message.save()
+        change = MessageChange.objects.create(
+            conversation_id=message.conversation_id,
+            message=message,
+            action='edited'
+        )
         
         # Broadcast edit to room group
         channel_layer = get_channel_layer()
@@ -128,7 +173,8 @@ def edit_message(request, message_id):
                 'type': 'chat_message_edit',
                 'message_id': message.id,
                 'content': message.content,
-                'edited_at': message.edited_at.isoformat()
+                'edited_at': message.edited_at.isoformat(),
+                'change_id': change.id,
             }
         )
         
@@ -154,9 +200,20 @@ def delete_message(request, message_id):
     if message.sender != request.user:
         return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
     
-    conversation_id = message.conversation.id
+    conversation = message.conversation
+    conversation_id = conversation.id
+    was_unread = not message.is_read and not message.is_deleted
     message.is_deleted = True
     message.save()
+    if was_unread:
+        # Deleted messages no longer count as unread; the owner's count only covers the active session
+        owner_id = conversation.user_id if conversation.is_active and not conversation.user_deleted else None
+        adjust_unread(owner_id, conversation.counsellor_id, message.sender_id, -1)
+    change = MessageChange.objects.create(
+        conversation_id=conversation_id,
+        message=message,
+        action='deleted'
+    )
     
     # Broadcast delete to room group
     channel_layer = get_channel_layer()
@@ -165,6 +222,7 @@ def delete_message(request, message_id):
         {
             'type': 'chat_message_delete',
             'message_id': message.id,
+            'change_id': change.id,
         }
     )
     
@@ -175,14 +233,10 @@ def delete_message(request, message_id):
 
 
 def get_online_status(request):
-    """API endpoint to check if any counsellor is online."""
-    from django.contrib.auth.models import User
-    
-    # For now, check if any staff member has been active recently
-    # In production, this would use presence detection
-    online = User.objects.filter(is_staff=True, is_active=True).exists()
+    """API endpoint to check if any counsellor is online (answered from the presence store)."""
+    from . import presence
     
-    return JsonResponse({'online': online})
+    return JsonResponse({'online': presence.is_online()})
 
 
 @login_required
@@ -214,6 +268,7 @@ def widget_messages(request):
         for msg in unread_messages:
             msg.is_read = True
         Message.objects.bulk_update(unread_messages, ['is_read'])
+        record_read(user.id, len(unread_messages))
     
     # Format messages for JSON response
     messages_data = [{
@@ -0,0 +1,280 @@
+"""
+Optional write-behind persistence for counselling chat messages.
+
+When COUNSEL_WRITE_BEHIND is enabled, ChatConsumer gives each message an ID
+and timestamp itself, broadcasts it straight away and queues it on the
+per-process MessageWriter. A background asyncio task inserts queued messages
+with bulk_create once COUNSEL_FLUSH_BATCH_SIZE messages are waiting or
+COUNSEL_FLUSH_INTERVAL seconds have passed, whichever comes first.
+
+Durability:
+- A message is delivered to the room before it is committed. If the process
+  dies abruptly (crash, SIGKILL, OOM) the messages still queued are lost, at
+  most one flush window's worth.
+- On graceful shutdown the queue is flushed when the flush task is cancelled,
+  and again from an atexit hook for anything left over.
+- Transient database errors (e.g. SQLite "database is locked") put the batch
+  back on the queue. If the batch insert fails otherwise, the messages are
+  written one at a time, so one bad row can't take the others with it; rows
+  that still fail are kept queued and retried. Only a message whose
+  conversation has been deleted meanwhile is discarded.
+- Until its batch is flushed a message cannot be edited or deleted (the
+  endpoints answer 404) and does not appear in the history API.
+
+Deployment:
+- Write-behind needs a single ASGI process. The queue lives in the process
+  that took the message, so a client reconnecting to another process would
+  sync without it, and with time-ordered IDs it would not be replayed later.
+- COUNSEL_WORKER_ID must be set explicitly (0-31, unique among processes
+  writing to the database, including `bench_chat_writes` runs); startup
+  fails without it.
+
+IDs are time-ordered (see MessageIdAllocator), so they sort after every
+auto-increment ID issued before the mode was switched on. On PostgreSQL,
+run `manage.py sqlsequencereset counsel` after switching it back off.
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 2026-01-01T00:00:00Z in milliseconds
+ID_EPOCH_MS = 1767225600000
+WORKER_BITS = 5
+SEQUENCE_BITS = 6
+
+
+class MessageIdAllocator:
+    """
+    Allocates IDs as (milliseconds since ID_EPOCH_MS, worker, sequence).
+
+    41 bits of milliseconds + 5 worker bits + 6 sequence bits stay below
+    2**53, so browsers can hold the IDs as plain numbers. Each process needs
+    a distinct COUNSEL_WORKER_ID (0-31) to rule out collisions.
+    """
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id < 1 << WORKER_BITS:
+            raise ValueError(f"Worker ID must be between 0 and {(1 << WORKER_BITS) - 1}, got {worker_id}")
+        self.worker_id = worker_id
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            now_ms = max(int(time.time() * 1000) - ID_EPOCH_MS, self.last_ms)
+            if now_ms == self.last_ms:
+                self.sequence = (self.sequence + 1) % (1 << SEQUENCE_BITS)
+                if self.sequence == 0:
+                    # Sequence exhausted for this millisecond; borrow the next one
+                    now_ms += 1
+            else:
+                self.sequence = 0
+            self.last_ms = now_ms
+            return (
+                (now_ms << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self.sequence
+            )
+
+
+def configured_worker_id():
+    """COUNSEL_WORKER_ID, which must be set explicitly to a value in range."""
+    worker_id = getattr(settings, 'COUNSEL_WORKER_ID', None)
+    if worker_id is None or not 0 <= worker_id < 1 << WORKER_BITS:
+        raise ImproperlyConfigured(
+            f"COUNSEL_WRITE_BEHIND needs COUNSEL_WORKER_ID set to a value from 0 to {(1 << WORKER_BITS) - 1}, "
+            "unique among processes writing chat messages"
+        )
+    return worker_id
+
+
+def write_batch(batch, batch_size):
+    """Insert a batch of messages and record activity on each conversation once."""
+    from .counters import adjust_unread
+    from .models import Conversation, Message
+
+    latest = {}
+    senders = {}
+    for msg in batch:
+        conversation_id = int(msg.conversation_id)
+        if conversation_id not in latest or msg.timestamp > latest[conversation_id]:
+            latest[conversation_id] = msg.timestamp
+        key = (conversation_id, msg.sender_id)
+        senders[key] = senders.get(key, 0) + 1
+
+    with transaction.atomic():
+        Message.objects.bulk_create(batch, batch_size=batch_size)
+        for conversation_id, timestamp in latest.items():
+            Conversation.touch(conversation_id, timestamp)
+
+        participants = {
+            row['id']: row for row in
+            Conversation.objects.filter(id__in=latest).values('id', 'user_id', 'counsellor_id')
+        }
+        for (conversation_id, sender_id), count in senders.items():
+            row = participants.get(conversation_id)
+            if row:
+                adjust_unread(row['user_id'], row['counsellor_id'], sender_id, count)
+
+
+class MessageWriter:
+    """Buffers messages in memory and flushes them from a background task."""
+
+    def __init__(self, batch_size, interval, worker_id):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.allocator = MessageIdAllocator(worker_id)
+        self.pending = []
+        self.task = None
+        self.wakeup = None
+        # Held for the whole of a flush, so flush() also waits for one in progress
+        self.flush_lock = asyncio.Lock()
+
+    def enqueue(self, conversation_id, sender_id, content):
+        """Assign ID and timestamp, queue the message and return it (unsaved)."""
+        from .models import Message
+
+        message = Message(
+            id=self.allocator.next_id(),
+            conversation_id=conversation_id,
+            sender_id=sender_id,
+            content=content,
+            timestamp=timezone.now(),
+        )
+        self.pending.append(message)
+        self._ensure_task()
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+        return message
+
+    def _ensure_task(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            # Server shutting down: persist what is still queued
+            await self.flush()
+            raise
+
+    def _resolve_conflict(self, message):
+        """
+        Handle a message whose INSERT broke a constraint. Returns True if it
+        needs no further writing; otherwise it may have a new ID to retry with.
+        """
+        from .models import Conversation, Message
+
+        stored = Message.objects.filter(pk=message.pk).values('conversation_id', 'sender_id', 'timestamp').first()
+        if stored == {
+            'conversation_id': int(message.conversation_id),
+            'sender_id': message.sender_id,
+            'timestamp': message.timestamp,
+        }:
+            # Written by an earlier attempt whose commit was reported as failed
+            return True
+        if not Conversation.objects.filter(pk=message.conversation_id).exists():
+            logger.error(
+                "Dropped chat message %s: conversation %s no longer exists", message.pk, message.conversation_id
+            )
+            return True
+        if stored is not None:
+            # Another process used the same ID: COUNSEL_WORKER_ID isn't unique
+            new_id = self.allocator.next_id()
+            logger.error("Chat message ID %s already taken, storing it as %s", message.pk, new_id)
+            message.id = new_id
+        return False
+
+    def write_each(self, batch):
+        """
+        Write messages one at a time after a batch insert failed.
+        Returns the messages that could not be written yet, to retry later.
+        """
+        retry = []
+        for message in batch:
+            try:
+                write_batch([message], 1)
+                continue
+            except IntegrityError as e:
+                error = e
+                try:
+                    if self._resolve_conflict(message):
+                        continue
+                except DatabaseError:
+                    pass
+            except Exception as e:
+                error = e
+            logger.warning("Chat message %s not written, will retry: %s", message.pk, error)
+            retry.append(message)
+        return retry
+
+    async def flush(self):
+        """Write every queued message to the database, after any flush already in progress."""
+        async with self.flush_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+            try:
+                await database_sync_to_async(write_batch)(batch, self.batch_size)
+            except OperationalError as e:
+                logger.warning("Chat flush failed, retrying %s messages: %s", len(batch), e)
+                self.pending = batch + self.pending
+            except Exception as e:
+                logger.warning("Chat batch insert failed, writing %s messages one by one: %s", len(batch), e)
+                retry = await database_sync_to_async(self.write_each)(batch)
+                self.pending = retry + self.pending
+
+    def flush_sync(self):
+        """Flush from synchronous code, e.g. at interpreter exit."""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            write_batch(batch, self.batch_size)
+        except Exception as e:
+            logger.warning("Chat flush at exit failed, writing %s messages one by one: %s", len(batch), e)
+            retry = self.write_each(batch)
+            if retry:
+                logger.error("Chat flush at exit lost %s messages", len(retry))
+
+
+_writer = None
+
+
+def get_writer():
+    """Return this process's MessageWriter, creating it on first use."""
+    global _writer
+    if _writer is None:
+        _writer = MessageWriter(
+            batch_size=settings.COUNSEL_FLUSH_BATCH_SIZE,
+            interval=settings.COUNSEL_FLUSH_INTERVAL,
+            worker_id=configured_worker_id(),
+        )
+        atexit.register(_writer.flush_sync)
+    return _writer
+
+
+def is_enabled():
+    """Whether COUNSEL_WRITE_BEHIND is switched on for this process."""
+    return getattr(settings, 'COUNSEL_WRITE_BEHIND', False)
+
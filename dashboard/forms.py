@@ -110,8 +110,19 @@ class EventForm(forms.ModelForm):
     class Meta:
         model = Event
         # Image upload disabled for now (User request Step 1792)
-        fields = ['title', 'start_time', 'end_time', 'location', 'description', 'is_completed'] # Removed 'image', Added 'is_completed'
+        fields = [
+            'title', 'start_time', 'end_time', 'location', 'description', 'is_completed', # Removed 'image', Added 'is_completed'
+            'recurrence_frequency', 'recurrence_interval', 'recurrence_weekdays', 'recurrence_week_of_month',
+            'recurrence_until', 'recurrence_count', 'recurrence_rule',
+        ]
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-input'}),
             'location': forms.TextInput(attrs={'class': 'form-input'}),
+            'recurrence_frequency': forms.Select(attrs={'class': 'form-input'}),
+            'recurrence_interval': forms.NumberInput(attrs={'class': 'form-input', 'min': 1}),
+            'recurrence_weekdays': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'SU'}),
+            'recurrence_week_of_month': forms.Select(attrs={'class': 'form-input'}),
+            'recurrence_until': forms.DateInput(attrs={'class': 'form-input', 'type': 'date'}),
+            'recurrence_count': forms.NumberInput(attrs={'class': 'form-input', 'min': 1}),
+            'recurrence_rule': forms.TextInput(attrs={'class': 'form-input'}),
         }
@@ -1,4 +1,29 @@
-from django.db import models
+import copy
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.page_cache import cache_is_shared
+
+SITE_SETTINGS_VERSION_KEY = 'site_settings:version'
+SITE_SETTINGS_TIMEOUT = 24 * 60 * 60  # Seconds
+# Seconds the process-local copy is trusted when the cache is not shared
+SITE_SETTINGS_LOCAL_TTL = 5
+
+# Process-local copy: (version, SiteSettings instance, monotonic load time)
+_site_settings_local = (None, None, 0)
+
+
+def _new_site_settings_version():
+    # Every worker drops its local copy on the next load()
+    global _site_settings_local
+    _site_settings_local = (None, None, 0)
+    cache.set(SITE_SETTINGS_VERSION_KEY, uuid.uuid4().hex, None)
+
 
 class SiteSettings(models.Model):
     # Singleton pattern
@@ -35,12 +60,46 @@ class SiteSettings(models.Model):
         if not self.pk and SiteSettings.objects.exists():
             # If you try to save a new instance, replace the old one
             return 
-        return super(SiteSettings, self).save(*args, **kwargs)
+        result = super(SiteSettings, self).save(*args, **kwargs)
+        transaction.on_commit(_new_site_settings_version)
+        return result
 
     @classmethod
     def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
+        """
+        Return the singleton. Cached in process memory and the shared cache,
+        both keyed by a version that save() and delete replace, so a warm
+        call costs one cache lookup and no queries. Without a shared cache
+        another worker's save can't reach this process, so the local copy
+        is only kept for SITE_SETTINGS_LOCAL_TTL seconds. Callers get a copy
+        they may modify.
+        """
+        global _site_settings_local
+        local_version, obj, loaded_at = _site_settings_local
+        if not cache_is_shared():
+            if obj is None or time.monotonic() - loaded_at > SITE_SETTINGS_LOCAL_TTL:
+                obj, created = cls.objects.get_or_create(pk=1)
+                _site_settings_local = (None, obj, time.monotonic())
+            return copy.copy(obj)
+
+        version = cache.get(SITE_SETTINGS_VERSION_KEY)
+        if version is None:
+            cache.add(SITE_SETTINGS_VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(SITE_SETTINGS_VERSION_KEY)
+
+        if local_version != version or obj is None:
+            object_key = f'site_settings:{version}'
+            obj = cache.get(object_key)
+            if obj is None:
+                obj, created = cls.objects.get_or_create(pk=1)
+                cache.set(object_key, obj, SITE_SETTINGS_TIMEOUT)
+            _site_settings_local = (version, obj, time.monotonic())
+        return copy.copy(obj)
 
     def __str__(self):
         return "Site Configuration"
+
+
+@receiver(post_delete, sender=SiteSettings)
+def _site_settings_deleted(sender, **kwargs):
+    transaction.on_commit(_new_site_settings_version)
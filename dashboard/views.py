@@ -7,6 +7,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import AuthenticationForm
 
 from sermons.models import Sermon
+from sermons.audio_jobs import enqueue_transcode
+from events.listing import dashboard_events, decode_cursor
 from events.models import Event
 from ministry.models import PrayerRequest, ContactSubmission, Testimony
 from .models import SiteSettings
@@ -53,7 +55,7 @@ def dashboard_home(request):
 
 @staff_required
 def sermon_list(request):
-    sermons = Sermon.objects.all().order_by('-date_preached')
+    sermons = Sermon.objects.for_listing().order_by('-date_preached')
     return render(request, 'dashboard/sermon_list.html', {'sermons': sermons})
 
 @staff_required
@@ -61,7 +63,9 @@ def sermon_create(request):
     if request.method == 'POST':
         form = SermonForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
+            sermon = form.save()
+            if sermon.audio_file:
+                enqueue_transcode(sermon)
             return redirect('dashboard:sermon_list')
     else:
         form = SermonForm()
@@ -73,7 +77,9 @@ def sermon_edit(request, pk):
     if request.method == 'POST':
         form = SermonForm(request.POST, request.FILES, instance=sermon)
         if form.is_valid():
-            form.save()
+            sermon = form.save()
+            if 'audio_file' in form.changed_data:
+                enqueue_transcode(sermon)
             return redirect('dashboard:sermon_list')
     else:
         form = SermonForm(instance=sermon)
@@ -83,8 +89,15 @@ def sermon_edit(request, pk):
 
 @staff_required
 def event_list(request):
-    events = Event.objects.all().order_by('start_time')
-    return render(request, 'dashboard/event_list.html', {'events': events})
+    # Open events soonest first, or completed ones newest first, a page at a time
+    completed = request.GET.get('status') == 'completed'
+    cursor = decode_cursor(request.GET['after']) if request.GET.get('after') else None
+    events, next_cursor = dashboard_events(completed, cursor)
+    return render(request, 'dashboard/event_list.html', {
+        'events': events,
+        'completed': completed,
+        'next_cursor': next_cursor,
+    })
 
 @staff_required
 def event_create(request):
@@ -356,7 +369,8 @@ def counsel_sessions(request):
 @staff_required
 def counsel_chat(request, conversation_id):
     """Dashboard chat view for a specific conversation."""
-    from counsel.models import Conversation, Message
+    from counsel.models import Conversation
+    from counsel.history import encode_cursor, get_message_page, latest_change_id
     
     conversation = get_object_or_404(Conversation, id=conversation_id)
     
@@ -365,12 +379,16 @@ def counsel_chat(request, conversation_id):
         conversation.counsellor = request.user
         conversation.save()
     
-    # Get messages (exclude deleted)
-    chat_messages = conversation.messages.filter(is_deleted=False).order_by('timestamp')
+    # Only the newest page is embedded; older messages load via counsel:message_history
+    chat_messages, has_older = get_message_page(conversation)
     
     return render(request, 'dashboard/counsel_chat.html', {
         'conversation': conversation,
         'chat_messages': chat_messages,
+        'has_older': has_older,
+        'history_cursor': encode_cursor(chat_messages[0]) if chat_messages else '',
+        'last_message_id': chat_messages[-1].id if chat_messages else 0,
+        'last_change_id': latest_change_id(conversation),
     })
 
 
@@ -3,6 +3,7 @@ from .models import Event
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('title', 'start_time', 'location', 'is_recurring')
+    list_display = ('title', 'start_time', 'location', 'is_recurring', 'recurrence_frequency')
+    list_filter = ('recurrence_frequency', 'is_completed')
     search_fields = ('title', 'description')
     prepopulated_fields = {'slug': ('title',)}
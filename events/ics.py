@@ -0,0 +1,160 @@
+"""
+iCalendar (RFC 5545) feeds of events, for calendar subscriptions.
+
+Each event becomes one VEVENT, with an RRULE for recurring ones
+(events.recurrence.to_rrule) so clients expand the repeats themselves.
+Clients count DTSTART as an occurrence, so it is the series' first
+occurrence rather than the stored start, which may fall off the rule.
+A rendered VEVENT is cached under the event's id and updated_at, so only
+events saved since the last poll are rendered again. The whole calendar is
+streamed in chunks from an iterator, fetching each chunk's VEVENTs with one
+cache read.
+
+The views validate with the latest updated_at (events.views), so clients
+polling an unchanged calendar get a 304 after one aggregate query.
+"""
+
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from core.rich_text import plain_text
+from .models import Event
+from .recurrence import first_occurrence, to_rrule
+
+# Bump when the output changes, to re-render every cached VEVENT
+ICS_VERSION = 2
+CHUNK_SIZE = 200
+# Rendered VEVENTs outlive many polls; superseded ones (older updated_at) expire
+VEVENT_CACHE_TIMEOUT = 7 * 24 * 60 * 60  # Seconds
+# Completed events stay in the feed this long after they started
+HISTORY_DAYS = 90
+DESCRIPTION_LENGTH = 2000
+PRODID = '-//The Truth Gate//Events//EN'
+
+FIELDS = (
+    'pk', 'slug', 'title', 'description_html', 'start_time', 'end_time', 'location', 'updated_at',
+    'is_recurring', 'recurrence_frequency', 'recurrence_interval', 'recurrence_weekdays',
+    'recurrence_week_of_month', 'recurrence_until', 'recurrence_count',
+)
+
+
+def feed_events(now=None):
+    """Events in the whole-calendar feed: open ones and recently started completed ones."""
+    now = now or timezone.now()
+    return Event.objects.filter(Q(is_completed=False) | Q(start_time__gte=now - timedelta(days=HISTORY_DAYS)))
+
+
+def escape(text):
+    """Escape a TEXT value (RFC 5545 3.3.11)."""
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Fold a content line to 75 octets, continuing with a leading space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Don't split a UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _date_time(name, value, recurring):
+    # Repeats are expanded in local wall-clock time; give clients the zone to do the same
+    tz = timezone.get_current_timezone()
+    if recurring and getattr(tz, 'key', 'UTC') != 'UTC':
+        return f'{name};TZID={tz.key}:{timezone.localtime(value, tz):%Y%m%dT%H%M%S}'
+    return f'{name}:{_utc(value)}'
+
+
+def vevent(event, base_url):
+    """
+    The VEVENT text (folded, CRLF line ends) of one event, or '' if its
+    series has no occurrences; URLs start with `base_url`.
+    """
+    first = first_occurrence(event)
+    if first is None:
+        return ''
+    rrule = to_rrule(event)
+    description = plain_text(event.description_html, DESCRIPTION_LENGTH)
+    start = timezone.localtime(first.start)
+    url = base_url + reverse('event_month', args=[start.year, start.month])
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@{urlsplit(base_url).hostname}',
+        f'DTSTAMP:{_utc(event.updated_at)}',
+        f'LAST-MODIFIED:{_utc(event.updated_at)}',
+        _date_time('DTSTART', first.start, bool(rrule)),
+        _date_time('DTEND', first.end, bool(rrule)),
+    ]
+    if rrule:
+        lines.append(f'RRULE:{rrule}')
+    lines.append(f'SUMMARY:{escape(event.title)}')
+    if description:
+        lines.append(f'DESCRIPTION:{escape(description)}')
+    if event.location:
+        lines.append(f'LOCATION:{escape(event.location)}')
+    lines.extend([f'URL:{url}', 'END:VEVENT'])
+    return ''.join(fold(line) for line in lines)
+
+
+def _cache_key(event, base_url):
+    digest = hashlib.md5(base_url.encode()).hexdigest()[:8]
+    return f'events:ics:{ICS_VERSION}:{digest}:{event.pk}:{event.updated_at.timestamp()}'
+
+
+def _vevents(events, base_url):
+    """VEVENTs for a chunk of events: one cache read, and renders only for changed events."""
+    keys = {event.pk: _cache_key(event, base_url) for event in events}
+    cached = cache.get_many(keys.values())
+    missing = {}
+    for event in events:
+        text = cached.get(keys[event.pk])
+        if text is None:
+            text = missing[keys[event.pk]] = vevent(event, base_url)
+        yield text
+    if missing:
+        cache.set_many(missing, VEVENT_CACHE_TIMEOUT)
+
+
+def calendar_lines(events, base_url, name):
+    """Yield the calendar's text in pieces: header, a chunk of VEVENTs at a time, footer."""
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+    ))
+    chunk = []
+    for event in events.only(*FIELDS).order_by('start_time', 'pk').iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(event)
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(_vevents(chunk, base_url))
+            chunk = []
+    if chunk:
+        yield ''.join(_vevents(chunk, base_url))
+    yield 'END:VCALENDAR\r\n'
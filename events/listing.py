@@ -0,0 +1,101 @@
+"""
+Time-windowed event listings with keyset pagination.
+
+Pages are ordered by (start_time, id) and continue from a cursor naming
+the last row shown, so each page is one index range scan however far the
+visitor browses, and rows added meanwhile are never skipped or repeated.
+
+- Public pages list EventOccurrence rows (events.occurrences): upcoming
+  (ends after now, soonest first), the past archive (newest first), and a
+  calendar week or month.
+- The dashboard lists Event rows split by `is_completed`, which the
+  (is_completed, start_time) index serves directly.
+"""
+
+import calendar
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Q, Value
+from django.utils import timezone
+
+from .models import Event, EventOccurrence
+
+PAGE_SIZE = 10
+
+
+def encode_cursor(row):
+    """Opaque cursor for a row's (start_time, id)."""
+    ts = row.start_time
+    micros = int(ts.replace(microsecond=0).timestamp()) * 1_000_000 + ts.microsecond
+    return f"{micros}-{row.pk}"
+
+
+def decode_cursor(cursor):
+    """Return (start_time, id) for a cursor, or None if it is malformed."""
+    try:
+        micros, pk = cursor.split('-', 1)
+        micros, pk = int(micros), int(pk)
+    except (AttributeError, ValueError):
+        return None
+    seconds, remainder = divmod(micros, 1_000_000)
+    try:
+        start_time = datetime.fromtimestamp(seconds, tz=dt_timezone.utc).replace(microsecond=remainder)
+    except (OverflowError, OSError, ValueError):
+        return None
+    return start_time, pk
+
+
+def keyset_page(queryset, cursor=None, descending=False, limit=PAGE_SIZE):
+    """
+    Return (rows, next cursor or None) for the `limit` rows of `queryset`
+    after `cursor` in (start_time, id) order, or before it when descending.
+    """
+    if cursor is not None:
+        start_time, pk = cursor
+        if descending:
+            queryset = queryset.filter(Q(start_time__lt=start_time) | Q(start_time=start_time, pk__lt=pk))
+        else:
+            queryset = queryset.filter(Q(start_time__gt=start_time) | Q(start_time=start_time, pk__gt=pk))
+    order = ('-start_time', '-pk') if descending else ('start_time', 'pk')
+    # One extra row tells whether there is a next page
+    rows = list(queryset.order_by(*order)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]) if has_more else None
+
+
+def _open_occurrences():
+    return EventOccurrence.objects.filter(event__is_completed=False).select_related('event')
+
+
+def upcoming(cursor=None, now=None):
+    """Occurrences of open events that haven't ended, soonest first."""
+    now = now or timezone.now()
+    return keyset_page(_open_occurrences().filter(end_time__gt=now), cursor)
+
+
+def past(cursor=None, now=None):
+    """Occurrences that have ended, newest first (completed events included)."""
+    now = now or timezone.now()
+    rows = EventOccurrence.objects.filter(end_time__lte=now).select_related('event')
+    return keyset_page(rows, cursor, descending=True)
+
+
+def week_bounds(day):
+    """[Monday 00:00, next Monday 00:00) around `day`, in the current time zone."""
+    monday = day - timedelta(days=day.weekday())
+    start = timezone.make_aware(datetime.combine(monday, time()))
+    return start, timezone.make_aware(datetime.combine(monday + timedelta(days=7), time()))
+
+
+def month_bounds(year, month):
+    """[first of the month, first of the next) in the current time zone."""
+    last_day = calendar.monthrange(year, month)[1]
+    start = timezone.make_aware(datetime.combine(date(year, month, 1), time()))
+    return start, timezone.make_aware(datetime.combine(date(year, month, last_day) + timedelta(days=1), time()))
+
+
+def dashboard_events(completed, cursor=None):
+    """Staff list of open events (soonest first) or completed ones (newest first)."""
+    # Value() compares with `= %s`; SQLite can't use the index for `NOT is_completed`
+    return keyset_page(Event.objects.filter(is_completed=Value(completed)), cursor, descending=completed)
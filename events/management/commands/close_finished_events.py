@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from events.sweep import close_finished
+
+
+class Command(BaseCommand):
+    help = 'Marks events whose last occurrence has ended as completed'
+
+    def handle(self, *args, **options):
+        closed = close_finished()
+        self.stdout.write(self.style.SUCCESS(f'Closed {closed} finished events.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from events.occurrences import extend, horizon
+
+
+class Command(BaseCommand):
+    help = 'Materializes recurring event occurrences up to EVENT_OCCURRENCE_MONTHS ahead (run daily)'
+
+    def handle(self, *args, **options):
+        until = horizon()
+        written = extend(until)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} event occurrences up to {until:%Y-%m-%d}.'))
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:24
+
+import hashlib
+import html
+import math
+import re
+
+import bleach
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import slugify
+
+# Frozen copy of core.rich_text (RENDER_VERSION 1) as of this migration; later
+# changes to that module must not change what it does.
+RENDER_VERSION = 1
+BATCH_SIZE = 500
+WORDS_PER_MINUTE = 200
+DROP_BLOCKS_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+HEADING_RE = re.compile(r'<h([1-6])>(.*?)</h\1>', re.DOTALL)
+WORD_RE = re.compile(r'\w+')
+
+cleaner = bleach.Cleaner(
+    tags=[
+        'p', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b', 'em', 'i',
+        'a', 'ul', 'ol', 'li', 'blockquote',
+    ],
+    attributes={'a': ['href', 'title']},
+    protocols=['http', 'https', 'mailto', 'tel'],
+    strip=True,
+)
+
+
+def add_heading_anchors(cleaned):
+    used = set()
+
+    def anchor(match):
+        level, inner = match.groups()
+        base = slugify(html.unescape(strip_tags(inner)))[:60] or 'section'
+        slug, counter = base, 2
+        while slug in used:
+            slug, counter = f'{base}-{counter}', counter + 1
+        used.add(slug)
+        return f'<h{level} id="{slug}">{inner} <a class="heading-anchor" href="#{slug}" aria-label="Link to this section">#</a></h{level}>'
+
+    return HEADING_RE.sub(anchor, cleaned)
+
+
+def render(source):
+    cleaned = cleaner.clean(DROP_BLOCKS_RE.sub('', source or ''))
+    words = len(WORD_RE.findall(html.unescape(strip_tags(cleaned))))
+    return add_heading_anchors(cleaned), math.ceil(words / WORDS_PER_MINUTE) if words else 0
+
+
+def backfill(model, field, reading_time_field=None):
+    update_fields = [f'{field}_html', f'{field}_hash', 'updated_at']
+    if reading_time_field:
+        update_fields.append(reading_time_field)
+    last_pk = 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', field)[:BATCH_SIZE])
+        if not batch:
+            break
+        now = timezone.now()
+        for instance in batch:
+            source = getattr(instance, field) or ''
+            rendered, minutes = render(source)
+            setattr(instance, f'{field}_html', rendered)
+            setattr(instance, f'{field}_hash', hashlib.sha256(f'{RENDER_VERSION}:{source}'.encode()).hexdigest())
+            if reading_time_field:
+                setattr(instance, reading_time_field, minutes)
+            # Conditional GETs see the new HTML
+            instance.updated_at = now
+        model.objects.bulk_update(batch, update_fields)
+        last_pk = batch[-1].pk
+
+
+def render_descriptions(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    backfill(Event, 'description')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='description_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_descriptions, migrations.RunPython.noop),
+    ]
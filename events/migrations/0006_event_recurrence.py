@@ -0,0 +1,120 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of events.recurrence.parse_rule_text as of this migration
+WEEKDAY_NAMES = {
+    'monday': 'MO', 'tuesday': 'TU', 'wednesday': 'WE', 'thursday': 'TH',
+    'friday': 'FR', 'saturday': 'SA', 'sunday': 'SU',
+}
+ORDINAL_WEEKS = {'first': 1, '1st': 1, 'second': 2, '2nd': 2, 'third': 3, '3rd': 3, 'fourth': 4, '4th': 4, 'last': -1}
+
+
+def parse_rule_text(text):
+    words = re.findall(r'[a-z0-9]+', (text or '').lower())
+    if not words:
+        return None
+    weekdays = [WEEKDAY_NAMES[word.rstrip('s')] for word in words if word.rstrip('s') in WEEKDAY_NAMES]
+    interval = 2 if {'other', 'fortnightly', 'biweekly', 'alternate'} & set(words) else 1
+    ordinal = next((ORDINAL_WEEKS[word] for word in words if word in ORDINAL_WEEKS), None)
+    fields = {'recurrence_interval': interval, 'recurrence_weekdays': ','.join(dict.fromkeys(weekdays))}
+
+    if {'monthly', 'month'} & set(words):
+        fields['recurrence_frequency'] = 'monthly'
+        if ordinal and weekdays:
+            fields.update(recurrence_week_of_month=ordinal, recurrence_weekdays=weekdays[0])
+        else:
+            fields['recurrence_weekdays'] = ''
+    elif {'daily', 'day', 'nightly'} & set(words) and not weekdays:
+        fields['recurrence_frequency'] = 'daily'
+    elif weekdays or {'weekly', 'week', 'fortnightly', 'biweekly'} & set(words):
+        fields['recurrence_frequency'] = 'weekly'
+    else:
+        return None
+    return fields
+
+
+def structure_rules(apps, schema_editor):
+    """
+    Read the free-text rules of recurring events. Occurrences are left to
+    `manage.py extend_event_occurrences`, which materializes every event
+    whose occurrences_until is still empty.
+    """
+    Event = apps.get_model('events', 'Event')
+    for event in Event.objects.filter(is_recurring=True):
+        fields = parse_rule_text(event.recurrence_rule) or {}
+        # Plain update: keep updated_at as it was
+        Event.objects.filter(pk=event.pk).update(is_recurring=bool(fields.get('recurrence_frequency')), **fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_prerendered_rich_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='occurrences_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Number of occurrences (instead of an end date)', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_frequency',
+            field=models.CharField(blank=True, choices=[('', 'Does not repeat'), ('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_interval',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Repeat every N days/weeks/months'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_until',
+            field=models.DateField(blank=True, help_text='Last date the event repeats on', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_week_of_month',
+            field=models.SmallIntegerField(blank=True, choices=[(1, 'First'), (2, 'Second'), (3, 'Third'), (4, 'Fourth'), (-1, 'Last')], help_text='Monthly: repeat on e.g. the first Sunday instead of the same date', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_weekdays',
+            field=models.CharField(blank=True, help_text="Weekly: days such as 'SU' or 'MO,WE,FR' (default: the start day). Monthly: the weekday for 'week of month'.", max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='is_recurring',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='recurrence_rule',
+            field=models.CharField(blank=True, help_text="Label shown to visitors, e.g. 'Weekly on Sundays'. Leave blank to describe the schedule below.", max_length=100),
+        ),
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='events.event')),
+            ],
+            options={
+                'ordering': ['start_time'],
+                'indexes': [models.Index(fields=['start_time'], name='events_occurrence_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'start_time'), name='events_occurrence_unique')],
+            },
+        ),
+        migrations.RunPython(structure_rules, migrations.RunPython.noop),
+    ]
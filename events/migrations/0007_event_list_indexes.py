@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_recurrence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='is_completed',
+            field=models.BooleanField(default=False, help_text="Set automatically after the event's last occurrence. Mark as completed to hide it from public view sooner."),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_completed', 'start_time'], name='events_event_open_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['end_time'], name='events_occurrence_end_idx'),
+        ),
+    ]
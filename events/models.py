@@ -1,47 +1,140 @@
+from datetime import timezone as dt_timezone
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.utils.text import slugify
 from django_ckeditor_5.fields import CKEditor5Field
+from core import rich_text
+from core.slugs import UniqueSlugMixin, UniqueSlugQuerySet
 from core.validators import validate_image_size
+from . import recurrence
+
+# Characters of the description put in "Add to Google Calendar" links
+CALENDAR_DETAILS_LENGTH = 500
 
-class Event(models.Model):
+class Event(UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     description = CKEditor5Field(blank=True, config_name='default')
+    # Sanitized description rendered on save (core.rich_text)
+    description_html = models.TextField(blank=True, editable=False)
+    description_hash = models.CharField(max_length=64, blank=True, editable=False)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     location = models.CharField(max_length=200, default="Main Sanctuary")
     image = models.ImageField(upload_to='events/', blank=True, null=True, validators=[validate_image_size])
     
-    is_recurring = models.BooleanField(default=False)
-    recurrence_rule = models.CharField(max_length=100, blank=True, help_text="e.g. 'Weekly on Sundays'")
+    FREQUENCY_CHOICES = (
+        ('', 'Does not repeat'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    )
+
+    WEEK_OF_MONTH_CHOICES = (
+        (1, 'First'),
+        (2, 'Second'),
+        (3, 'Third'),
+        (4, 'Fourth'),
+        (-1, 'Last'),
+    )
 
-    is_completed = models.BooleanField(default=False, help_text="Mark as completed to hide from public view.")
+    # Kept in sync with recurrence_frequency on save
+    is_recurring = models.BooleanField(default=False, editable=False)
+    recurrence_rule = models.CharField(max_length=100, blank=True, help_text="Label shown to visitors, e.g. 'Weekly on Sundays'. Leave blank to describe the schedule below.")
+    # Schedule (events.recurrence): an RRULE subset expanded into EventOccurrence rows
+    recurrence_frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, blank=True, default='')
+    recurrence_interval = models.PositiveSmallIntegerField(default=1, help_text="Repeat every N days/weeks/months")
+    recurrence_weekdays = models.CharField(max_length=20, blank=True, help_text="Weekly: days such as 'SU' or 'MO,WE,FR' (default: the start day). Monthly: the weekday for 'week of month'.")
+    recurrence_week_of_month = models.SmallIntegerField(choices=WEEK_OF_MONTH_CHOICES, null=True, blank=True, help_text="Monthly: repeat on e.g. the first Sunday instead of the same date")
+    recurrence_until = models.DateField(null=True, blank=True, help_text="Last date the event repeats on")
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True, help_text="Number of occurrences (instead of an end date)")
+    # How far ahead EventOccurrence rows exist (events.occurrences)
+    occurrences_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Set by the sweep (events.sweep) once the last occurrence has ended
+    is_completed = models.BooleanField(default=False, help_text="Set automatically after the event's last occurrence. Mark as completed to hide it from public view sooner.")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UniqueSlugQuerySet.as_manager()
 
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            # Open/completed lists by date, and the sweep's candidates
+            models.Index(fields=['is_completed', 'start_time'], name='events_event_open_start_idx'),
+        ]
 
     @property
     def google_calendar_url(self):
         """Generates a Google Calendar add event link."""
-        title = self.title.replace(' ', '+')
-        start = self.start_time.strftime('%Y%m%dT%H%M%SZ')
-        end = self.end_time.strftime('%Y%m%dT%H%M%SZ')
-        details = (self.description or "").replace(' ', '+')
-        location = self.location.replace(' ', '+')
-        return f"https://www.google.com/calendar/render?action=TEMPLATE&text={title}&dates={start}/{end}&details={details}&location={location}&sf=true&output=xml"
+        return self.calendar_url(self.start_time, self.end_time)
+
+    def calendar_url(self, start_time, end_time):
+        """Google Calendar add event link for one occurrence."""
+        start = start_time.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        end = end_time.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        query = urlencode({
+            'action': 'TEMPLATE',
+            'text': self.title,
+            'dates': f'{start}/{end}',
+            # Plain text from the stored HTML, short enough for a URL
+            'details': rich_text.plain_text(self.description_html, CALENDAR_DETAILS_LENGTH),
+            'location': self.location,
+            'sf': 'true',
+            'output': 'xml',
+        })
+        return f"https://www.google.com/calendar/render?{query}"
     
+    @property
+    def recurrence_label(self):
+        return self.recurrence_rule or recurrence.describe(self)
+
+    def clean(self):
+        errors = {}
+        if self.start_time and self.end_time and self.end_time < self.start_time:
+            errors['end_time'] = "The event can't end before it starts."
+        codes = [code.strip().upper() for code in self.recurrence_weekdays.split(',') if code.strip()]
+        if any(code not in recurrence.WEEKDAYS for code in codes):
+            errors['recurrence_weekdays'] = f"Use two-letter days separated by commas: {', '.join(recurrence.WEEKDAYS)}."
+        if self.recurrence_week_of_month and self.recurrence_frequency != 'monthly':
+            errors['recurrence_week_of_month'] = "Only monthly events repeat on a week of the month."
+        if self.recurrence_until and self.recurrence_count:
+            errors['recurrence_count'] = "Set an end date or a number of occurrences, not both."
+        if errors:
+            raise ValidationError(errors)
+        self.recurrence_weekdays = ','.join(codes)
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while Event.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+        self.is_recurring = bool(self.recurrence_frequency)
+        kwargs['update_fields'] = rich_text.prerender(self, 'description', update_fields=kwargs.get('update_fields'))
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
+
+class EventOccurrence(models.Model):
+    # Materialized by events.occurrences, up to Event.occurrences_until
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='occurrences')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['start_time'], name='events_occurrence_start_idx'),
+            # Upcoming: rows ending after now are bounded by the horizon
+            models.Index(fields=['end_time'], name='events_occurrence_end_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'start_time'], name='events_occurrence_unique'),
+        ]
+
+    @property
+    def google_calendar_url(self):
+        return self.event.calendar_url(self.start_time, self.end_time)
+
+    def __str__(self):
+        return f"{self.event} @ {self.start_time:%Y-%m-%d %H:%M}"
@@ -0,0 +1,110 @@
+"""
+Materialized event occurrences.
+
+Every event has EventOccurrence rows (one for a single event, one per
+repeat for a recurring one) from its start up to a rolling horizon of
+EVENT_OCCURRENCE_MONTHS ahead, so "what is on between A and B" is one
+range query on the start_time index joined to the event.
+
+- Saving an event replaces its rows after commit (`schedule_refresh`).
+- `manage.py extend_event_occurrences`, run daily, appends each recurring
+  event's rows from its `occurrences_until` to the new horizon, so only
+  new dates are written.
+- `between()` serves windows past the horizon by expanding the rules
+  lazily (events.recurrence) instead of reading the table.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.page_cache import invalidate
+from .models import Event, EventOccurrence
+from .recurrence import occurrences
+
+BATCH_SIZE = 1000
+
+
+def horizon(now=None):
+    """End of the materialized range."""
+    return (now or timezone.now()) + timedelta(days=31 * settings.EVENT_OCCURRENCE_MONTHS)
+
+
+def _write(event, window_start, window_end):
+    rows = [
+        EventOccurrence(event=event, start_time=occurrence.start, end_time=occurrence.end)
+        for occurrence in occurrences(event, window_start, window_end)
+    ]
+    # Rows straddling window_start already exist
+    EventOccurrence.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(rows)
+
+
+def refresh(event_ids):
+    """Rebuild the rows of these events up to the horizon. Returns the rows written."""
+    until = horizon()
+    written = 0
+    for event in Event.objects.filter(pk__in=event_ids):
+        with transaction.atomic():
+            EventOccurrence.objects.filter(event=event).delete()
+            written += _write(event, None, until)
+            # update() leaves updated_at alone: the event itself didn't change
+            Event.objects.filter(pk=event.pk).update(occurrences_until=until)
+    invalidate(EventOccurrence)
+    return written
+
+
+def extend(until=None):
+    """Append recurring events' rows up to `until` (default: the horizon). Returns the rows written."""
+    until = until or horizon()
+    written = 0
+    stale = Event.objects.filter(is_recurring=True, occurrences_until__lt=until)
+    for event in stale.iterator(chunk_size=BATCH_SIZE):
+        with transaction.atomic():
+            written += _write(event, event.occurrences_until, until)
+            Event.objects.filter(pk=event.pk).update(occurrences_until=until)
+    # Events never materialized (e.g. created before the table existed)
+    missing = list(Event.objects.filter(occurrences_until__isnull=True).values_list('pk', flat=True))
+    if missing:
+        written += refresh(missing)
+    if written:
+        invalidate(EventOccurrence)
+    return written
+
+
+def schedule_refresh(event_ids):
+    """Refresh these events once the current transaction commits."""
+    event_ids = [pk for pk in event_ids if pk]
+    if event_ids:
+        # Each callback carries its own ids, so a rolled-back transaction refreshes nothing
+        transaction.on_commit(lambda: refresh(event_ids))
+
+
+def between(start, end, queryset=None):
+    """
+    EventOccurrences overlapping [start, end), by start time, with their
+    events loaded. Within the horizon this is one query; past it, rows for
+    recurring events are expanded lazily and are unsaved.
+    """
+    if queryset is None:
+        queryset = Event.objects.filter(is_completed=False)
+    rows = (
+        EventOccurrence.objects
+        .filter(start_time__lt=end, end_time__gt=start, event__in=queryset)
+        .select_related('event')
+        .order_by('start_time', 'event_id')
+    )
+    # The daily extend keeps at least the next EVENT_OCCURRENCE_MONTHS - 1 covered
+    if end <= horizon() - timedelta(days=31):
+        return list(rows)
+
+    found = list(rows)
+    seen = {(row.event_id, row.start_time) for row in found}
+    for event in queryset.filter(is_recurring=True):
+        for occurrence in occurrences(event, max(start, event.occurrences_until or start), end):
+            if (event.pk, occurrence.start) not in seen:
+                found.append(EventOccurrence(event=event, start_time=occurrence.start, end_time=occurrence.end))
+    found.sort(key=lambda row: (row.start_time, row.event_id))
+    return found
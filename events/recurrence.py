@@ -0,0 +1,230 @@
+"""
+Recurrence rules for events, and lazy expansion into occurrences.
+
+A rule is a small subset of RFC 5545 RRULE, stored in the Event's
+`recurrence_*` fields:
+
+- frequency: daily, weekly or monthly, every `interval` days/weeks/months;
+- weekly rules repeat on `weekdays` ("SU", "MO,WE"), default the start's day;
+- monthly rules repeat on the start's day of the month, or with
+  `week_of_month` on the nth (1-4, or -1 for last) weekday of the month;
+- the series ends after `count` occurrences, on `until`, or never.
+
+Dates are expanded in the current time zone's wall-clock time, so a
+10:00 service stays at 10:00 across DST changes. `occurrences()` is a
+generator that jumps straight to the window asked for (unless the rule has
+a count, which must be counted from the start).
+"""
+
+import calendar
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.utils import timezone
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_NAMES = {
+    'monday': 'MO', 'tuesday': 'TU', 'wednesday': 'WE', 'thursday': 'TH',
+    'friday': 'FR', 'saturday': 'SA', 'sunday': 'SU',
+}
+ORDINAL_WEEKS = {'first': 1, '1st': 1, 'second': 2, '2nd': 2, 'third': 3, '3rd': 3, 'fourth': 4, '4th': 4, 'last': -1}
+
+Rule = namedtuple('Rule', 'frequency interval weekdays week_of_month until count')
+Occurrence = namedtuple('Occurrence', 'start end')
+
+
+def parse_weekdays(text):
+    """Weekday indexes (Monday = 0) in "MO,WE" style text, sorted; unknown codes are skipped."""
+    codes = {code.strip().upper()[:2] for code in (text or '').split(',')}
+    return sorted(WEEKDAYS.index(code) for code in codes if code in WEEKDAYS)
+
+
+def event_rule(event):
+    """The Rule of an event, or None if it does not repeat."""
+    if not event.recurrence_frequency:
+        return None
+    return Rule(
+        frequency=event.recurrence_frequency,
+        interval=max(event.recurrence_interval or 1, 1),
+        weekdays=parse_weekdays(event.recurrence_weekdays),
+        week_of_month=event.recurrence_week_of_month,
+        until=event.recurrence_until,
+        count=event.recurrence_count,
+    )
+
+
+def _add_months(year, month, months):
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def _nth_weekday(year, month, weekday, nth):
+    """Day of the month of its nth (or last, for -1) `weekday`, or None."""
+    weeks = calendar.monthcalendar(year, month)
+    days = [week[weekday] for week in weeks if week[weekday]]
+    if nth == -1:
+        return days[-1]
+    return days[nth - 1] if nth <= len(days) else None
+
+
+def _dates(rule, first, skip_to=None):
+    """
+    Dates of a rule starting on `first`, ascending and unbounded. With
+    `skip_to`, whole periods ending before that date are jumped over.
+    """
+    if rule.frequency == 'daily':
+        k = 0
+        if skip_to and skip_to > first:
+            k = (skip_to - first).days // rule.interval
+        while True:
+            yield first + timedelta(days=k * rule.interval)
+            k += 1
+
+    elif rule.frequency == 'weekly':
+        weekdays = rule.weekdays or [first.weekday()]
+        week_start = first - timedelta(days=first.weekday())
+        k = 0
+        if skip_to and skip_to > first:
+            k = (skip_to - week_start).days // (7 * rule.interval)
+        while True:
+            start = week_start + timedelta(weeks=k * rule.interval)
+            for weekday in weekdays:
+                day = start + timedelta(days=weekday)
+                if day >= first:
+                    yield day
+            k += 1
+
+    elif rule.frequency == 'monthly':
+        k = 0
+        if skip_to and skip_to > first:
+            k = ((skip_to.year - first.year) * 12 + skip_to.month - first.month) // rule.interval
+        weekday = rule.weekdays[0] if rule.weekdays else first.weekday()
+        while True:
+            year, month = _add_months(first.year, first.month, k * rule.interval)
+            if rule.week_of_month:
+                day = _nth_weekday(year, month, weekday, rule.week_of_month)
+            else:
+                day = first.day if first.day <= calendar.monthrange(year, month)[1] else None
+            if day and date(year, month, day) >= first:
+                yield date(year, month, day)
+            k += 1
+
+    else:
+        raise ValueError(f'Unknown recurrence frequency: {rule.frequency!r}')
+
+
+def occurrences(event, window_start=None, window_end=None):
+    """
+    Yield the Occurrences of `event` that overlap [window_start, window_end),
+    in order. Either bound may be None; a repeating event without an end
+    needs a window_end.
+    """
+    duration = event.end_time - event.start_time
+    rule = event_rule(event)
+    if rule is None:
+        if (window_end is None or event.start_time < window_end) and (window_start is None or event.end_time > window_start):
+            yield Occurrence(event.start_time, event.end_time)
+        return
+    if window_end is None and rule.until is None and rule.count is None:
+        raise ValueError('An endless rule needs a window_end')
+
+    tz = timezone.get_current_timezone()
+    local_start = timezone.localtime(event.start_time, tz)
+    wall_time = local_start.time().replace(tzinfo=None)
+    skip_to = None
+    if window_start is not None and rule.count is None:
+        skip_to = (timezone.localtime(window_start, tz) - duration).date() - timedelta(days=1)
+
+    for index, day in enumerate(_dates(rule, local_start.date(), skip_to), start=1):
+        if rule.count is not None and index > rule.count:
+            return
+        if rule.until is not None and day > rule.until:
+            return
+        start = timezone.make_aware(datetime.combine(day, wall_time), tz)
+        if window_end is not None and start >= window_end:
+            return
+        end = start + duration
+        if window_start is None or end > window_start:
+            yield Occurrence(start, end)
+
+
+def first_occurrence(event):
+    """
+    The event's first Occurrence, or None if its series is empty. This is
+    the start unless the start falls off the rule (a Monday start for a
+    Sundays rule), when it is the first date on the rule.
+    """
+    rule = event_rule(event)
+    if rule is None:
+        return Occurrence(event.start_time, event.end_time)
+    # Every rule repeats within a few years of its start, so endless ones can be bounded
+    window_end = event.start_time + timedelta(days=366 * 4 * rule.interval)
+    return next(occurrences(event, window_end=window_end), None)
+
+
+def to_rrule(event):
+    """The event's rule as an RFC 5545 RRULE value (e.g. for iCalendar), or ''."""
+    rule = event_rule(event)
+    if rule is None:
+        return ''
+    parts = [f'FREQ={rule.frequency.upper()}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.frequency == 'weekly' and rule.weekdays:
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[weekday] for weekday in rule.weekdays))
+    elif rule.frequency == 'monthly' and rule.week_of_month:
+        weekday = rule.weekdays[0] if rule.weekdays else timezone.localtime(event.start_time).weekday()
+        parts.append(f'BYDAY={rule.week_of_month}{WEEKDAYS[weekday]}')
+    if rule.count is not None:
+        parts.append(f'COUNT={rule.count}')
+    elif rule.until is not None:
+        parts.append(f'UNTIL={rule.until:%Y%m%d}T235959Z')
+    return ';'.join(parts)
+
+
+def describe(event):
+    """A short English description of the event's rule, e.g. "Every 2 weeks on Sunday"."""
+    rule = event_rule(event)
+    if rule is None:
+        return ''
+    unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}[rule.frequency]
+    text = f'Every {unit}' if rule.interval == 1 else f'Every {rule.interval} {unit}s'
+    if rule.frequency == 'weekly' and rule.weekdays:
+        text += ' on ' + ', '.join(calendar.day_name[weekday] for weekday in rule.weekdays)
+    elif rule.frequency == 'monthly' and rule.week_of_month:
+        weekday = rule.weekdays[0] if rule.weekdays else timezone.localtime(event.start_time).weekday()
+        ordinal = {1: 'first', 2: 'second', 3: 'third', 4: 'fourth', -1: 'last'}[rule.week_of_month]
+        text += f' on the {ordinal} {calendar.day_name[weekday]}'
+    if rule.until is not None:
+        text += f' until {rule.until:%d %b %Y}'
+    return text
+
+
+def parse_rule_text(text):
+    """
+    Best-effort structured fields for a free-text rule such as "Weekly on
+    Sundays", "Every other Friday" or "First Sunday of the month". Returns a
+    dict of `recurrence_*` field values, or None if it can't be read.
+    """
+    words = re.findall(r'[a-z0-9]+', (text or '').lower())
+    if not words:
+        return None
+    weekdays = [WEEKDAY_NAMES[word.rstrip('s')] for word in words if word.rstrip('s') in WEEKDAY_NAMES]
+    interval = 2 if {'other', 'fortnightly', 'biweekly', 'alternate'} & set(words) else 1
+    ordinal = next((ORDINAL_WEEKS[word] for word in words if word in ORDINAL_WEEKS), None)
+    fields = {'recurrence_interval': interval, 'recurrence_weekdays': ','.join(dict.fromkeys(weekdays))}
+
+    if {'monthly', 'month'} & set(words):
+        fields['recurrence_frequency'] = 'monthly'
+        if ordinal and weekdays:
+            fields.update(recurrence_week_of_month=ordinal, recurrence_weekdays=weekdays[0])
+        else:
+            fields['recurrence_weekdays'] = ''
+    elif {'daily', 'day', 'nightly'} & set(words) and not weekdays:
+        fields['recurrence_frequency'] = 'daily'
+    elif weekdays or {'weekly', 'week', 'fortnightly', 'biweekly'} & set(words):
+        fields['recurrence_frequency'] = 'weekly'
+    else:
+        return None
+    return fields
@@ -0,0 +1,22 @@
+"""
+Keep each event's materialized occurrences (events.occurrences) in step
+with its schedule.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Event
+from .occurrences import schedule_refresh
+
+# Event fields the occurrence rows are expanded from
+SCHEDULE_FIELDS = {
+    'start_time', 'end_time', 'recurrence_frequency', 'recurrence_interval', 'recurrence_weekdays',
+    'recurrence_week_of_month', 'recurrence_until', 'recurrence_count',
+}
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or update_fields is None or SCHEDULE_FIELDS & set(update_fields):
+        schedule_refresh([instance.pk])
@@ -0,0 +1,71 @@
+"""
+Auto-closing of finished events.
+
+An event is finished once its last occurrence has ended: at end_time for a
+one-off event, and for a recurring one with an end date or a count, at the
+end of its final occurrence. Endless recurring events never close.
+`close_finished()` marks finished events is_completed, so the open-event
+queries (and the (is_completed, start_time) index range they read) only
+hold events still to come.
+
+Run it from cron with `manage.py close_finished_events`, or set
+EVENT_SWEEP_INTERVAL to run it periodically inside the ASGI process.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db.models import Value
+from django.utils import timezone
+
+from core.page_cache import invalidate
+from core.scheduler import start_periodic
+from .models import Event
+from .recurrence import occurrences
+
+logger = logging.getLogger(__name__)
+
+
+def _last_end(event):
+    last = None
+    for last in occurrences(event):
+        pass
+    return last.end if last else event.end_time
+
+
+def close_finished(now=None):
+    """Mark every finished open event completed. Returns how many were closed."""
+    now = now or timezone.now()
+    # Open events that have started: a short range of the (is_completed, start_time) index
+    # (Value() compares with `= %s`; SQLite can't use the index for `NOT is_completed`)
+    started = Event.objects.filter(is_completed=Value(False), start_time__lt=now)
+
+    finished = set(started.filter(is_recurring=False, end_time__lte=now).values_list('pk', flat=True))
+    bounded = started.filter(is_recurring=True).exclude(recurrence_until__isnull=True, recurrence_count__isnull=True)
+    for event in bounded.iterator():
+        if event.recurrence_until and event.recurrence_until >= now.date():
+            continue
+        if _last_end(event) <= now:
+            finished.add(event.pk)
+
+    if not finished:
+        return 0
+    # Bump updated_at too, so conditional GETs see the change
+    closed = Event.objects.filter(pk__in=finished, is_completed=False).update(is_completed=True, updated_at=now)
+    # update() sends no signals
+    invalidate(Event)
+    return closed
+
+
+def _close_and_log():
+    closed = close_finished()
+    if closed:
+        logger.info("Closed %s finished events", closed)
+
+
+def start_scheduler():
+    """
+    Run close_finished every EVENT_SWEEP_INTERVAL seconds on a daemon
+    thread (core.scheduler). Does nothing when the interval is 0.
+    """
+    return start_periodic('event-sweep', getattr(settings, 'EVENT_SWEEP_INTERVAL', 0), _close_and_log)
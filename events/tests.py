@@ -1,3 +1,155 @@
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from . import ics, occurrences as occurrence_rows
+from .models import Event, EventOccurrence
+from .recurrence import occurrences, parse_rule_text, to_rrule
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+def event(start, **rule):
+    return Event(title='Service', start_time=start, end_time=start + timedelta(hours=2), **rule)
+
+
+def start_dates(event, window_start=None, window_end=None):
+    return [occurrence.start.date() for occurrence in occurrences(event, window_start, window_end)]
+
+
+class RecurrenceTests(TestCase):
+    def test_single_event(self):
+        single = event(aware(2026, 1, 4, 10))
+        self.assertEqual(start_dates(single), [date(2026, 1, 4)])
+        self.assertEqual(start_dates(single, aware(2026, 1, 5), aware(2026, 2, 1)), [])
+
+    def test_weekly_by_day(self):
+        weekly = event(aware(2026, 1, 5, 18), recurrence_frequency='weekly', recurrence_weekdays='MO,WE,FR')
+        self.assertEqual(start_dates(weekly, None, aware(2026, 1, 12)), [
+            date(2026, 1, 5), date(2026, 1, 7), date(2026, 1, 9),
+        ])
+        self.assertEqual(to_rrule(weekly), 'FREQ=WEEKLY;BYDAY=MO,WE,FR')
+
+    def test_weekly_by_day_skips_days_before_the_start(self):
+        # Starts on a Wednesday: that week's Monday is not an occurrence
+        weekly = event(aware(2026, 1, 7, 18), recurrence_frequency='weekly', recurrence_weekdays='MO,WE')
+        self.assertEqual(start_dates(weekly, None, aware(2026, 1, 13)), [date(2026, 1, 7), date(2026, 1, 12)])
+
+    def test_count(self):
+        every_other_day = event(
+            aware(2026, 1, 1, 9), recurrence_frequency='daily', recurrence_interval=2, recurrence_count=3
+        )
+        self.assertEqual(start_dates(every_other_day), [date(2026, 1, 1), date(2026, 1, 3), date(2026, 1, 5)])
+        # The count runs from the start, not from the window
+        self.assertEqual(start_dates(every_other_day, aware(2026, 1, 4)), [date(2026, 1, 5)])
+        self.assertEqual(to_rrule(every_other_day), 'FREQ=DAILY;INTERVAL=2;COUNT=3')
+
+    def test_until_is_inclusive(self):
+        weekly = event(aware(2026, 1, 4, 10), recurrence_frequency='weekly', recurrence_until=date(2026, 1, 18))
+        self.assertEqual(start_dates(weekly), [date(2026, 1, 4), date(2026, 1, 11), date(2026, 1, 18)])
+
+    def test_window_overlap(self):
+        daily = event(aware(2026, 1, 1, 23), recurrence_frequency='daily', recurrence_count=5)
+        # The 2 January occurrence runs past midnight into the window
+        self.assertEqual(start_dates(daily, aware(2026, 1, 3), aware(2026, 1, 4)), [date(2026, 1, 2), date(2026, 1, 3)])
+
+    def test_endless_rule_needs_window_end(self):
+        with self.assertRaises(ValueError):
+            list(occurrences(event(aware(2026, 1, 4, 10), recurrence_frequency='daily')))
+
+    def test_monthly_on_day_31_skips_short_months(self):
+        monthly = event(aware(2026, 1, 31, 10), recurrence_frequency='monthly', recurrence_count=4)
+        self.assertEqual(start_dates(monthly), [
+            date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31), date(2026, 7, 31),
+        ])
+
+    def test_monthly_last_weekday(self):
+        last_sunday = event(
+            aware(2026, 1, 25, 10), recurrence_frequency='monthly',
+            recurrence_week_of_month=-1, recurrence_weekdays='SU', recurrence_count=3,
+        )
+        self.assertEqual(start_dates(last_sunday), [date(2026, 1, 25), date(2026, 2, 22), date(2026, 3, 29)])
+        self.assertEqual(to_rrule(last_sunday), 'FREQ=MONTHLY;BYDAY=-1SU;COUNT=3')
+
+    def test_nth_weekday_before_the_start_is_skipped(self):
+        # 30 January is the fifth Friday; January's fourth was the 23rd
+        fourth_friday = event(
+            aware(2026, 1, 30, 19), recurrence_frequency='monthly',
+            recurrence_week_of_month=4, recurrence_weekdays='FR', recurrence_count=2,
+        )
+        self.assertEqual(start_dates(fourth_friday), [date(2026, 2, 27), date(2026, 3, 27)])
+
+    def test_parse_rule_text(self):
+        self.assertEqual(parse_rule_text('Every other Friday'), {
+            'recurrence_interval': 2, 'recurrence_weekdays': 'FR', 'recurrence_frequency': 'weekly',
+        })
+        self.assertEqual(parse_rule_text('First Sunday of the month'), {
+            'recurrence_interval': 1, 'recurrence_weekdays': 'SU', 'recurrence_frequency': 'monthly',
+            'recurrence_week_of_month': 1,
+        })
+        self.assertIsNone(parse_rule_text('By announcement'))
+
+
+class OccurrenceRefreshTests(TestCase):
+    def test_rolled_back_changes_are_not_refreshed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = Event.objects.create(title='Kept', start_time=aware(2026, 1, 4, 10), end_time=aware(2026, 1, 4, 12))
+        with mock.patch.object(occurrence_rows, 'refresh') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        Event.objects.create(title='Dropped', start_time=aware(2026, 1, 5, 10), end_time=aware(2026, 1, 5, 12))
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                kept.save()
+        refresh.assert_called_once_with([kept.pk])
+
+
+class IcsTests(TestCase):
+    def create(self, start, **rule):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Event.objects.create(title='Service', start_time=start, end_time=start + timedelta(hours=2), **rule)
+
+    def lines(self, event):
+        return ics.vevent(event, 'https://example.com').split('\r\n')
+
+    def assert_starts_at_first_occurrence(self, event):
+        first = EventOccurrence.objects.filter(event=event).first()
+        lines = self.lines(event)
+        self.assertIn(f'DTSTART:{first.start_time:%Y%m%dT%H%M%SZ}', lines)
+        self.assertIn(f'DTEND:{first.end_time:%Y%m%dT%H%M%SZ}', lines)
+        return lines
+
+    def test_start_off_the_rule(self):
+        # A Monday start for a Sundays rule: the series begins the next Sunday
+        weekly = self.create(aware(2026, 10, 19, 10), recurrence_frequency='weekly', recurrence_weekdays='SU')
+        self.assertEqual(
+            [row.start_time.date() for row in EventOccurrence.objects.filter(event=weekly)[:3]],
+            [date(2026, 10, 25), date(2026, 11, 1), date(2026, 11, 8)],
+        )
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=SU', self.assert_starts_at_first_occurrence(weekly))
+
+    def test_count_matches_the_materialized_rows(self):
+        last_sunday = self.create(
+            aware(2026, 10, 19, 10), recurrence_frequency='monthly',
+            recurrence_week_of_month=-1, recurrence_weekdays='SU', recurrence_count=3,
+        )
+        self.assertEqual(EventOccurrence.objects.filter(event=last_sunday).count(), 3)
+        self.assertIn('RRULE:FREQ=MONTHLY;BYDAY=-1SU;COUNT=3', self.assert_starts_at_first_occurrence(last_sunday))
+
+    def test_single_event(self):
+        self.assert_starts_at_first_occurrence(self.create(aware(2026, 10, 19, 10)))
 
-# Create your tests here.
+    def test_empty_series_is_left_out(self):
+        weekly = self.create(
+            aware(2026, 10, 19, 10), recurrence_frequency='weekly', recurrence_weekdays='SU',
+            recurrence_until=date(2026, 10, 24),
+        )
+        self.assertFalse(EventOccurrence.objects.filter(event=weekly).exists())
+        self.assertEqual(ics.vevent(weekly, 'https://example.com'), '')
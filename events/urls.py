@@ -3,4 +3,9 @@ from . import views
 
 urlpatterns = [
     path('', views.EventListView.as_view(), name='event_list'),
+    path('week/', views.EventListView.as_view(window='week'), name='event_week'),
+    path('past/', views.EventListView.as_view(window='past'), name='event_archive'),
+    path('calendar.ics', views.event_calendar, name='event_calendar'),
+    path('<slug:slug>/calendar.ics', views.event_ics, name='event_ics'),
+    path('<int:year>/<int:month>/', views.EventListView.as_view(window='month'), name='event_month'),
 ]
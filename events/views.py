@@ -1,12 +1,140 @@
+from datetime import date
+
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.views.generic import ListView
 from django.utils import timezone
-from .models import Event
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_safe
+from core.conditional import aggregate_state, allows_conditional, page_etag, request_memo
+from core.page_cache import public_page_cache
+from . import ics, listing
+from .models import Event, EventOccurrence
+from .occurrences import between
+
+
+def _hour(request=None):
+    # Keeps validators and cached pages moving as occurrences pass
+    return timezone.now().strftime('%Y%m%d%H')
+
 
+def event_list_etag(request, *args, **kwargs):
+    if not allows_conditional(request):
+        return None
+    return page_etag(
+        request, *aggregate_state(Event.objects.all()), _hour(),
+        models=(Event, EventOccurrence),
+    )
+
+
+@method_decorator(condition(etag_func=event_list_etag), name='dispatch')
+@method_decorator(public_page_cache(Event, EventOccurrence, vary=_hour), name='dispatch')
 class EventListView(ListView):
-    model = Event
+    """
+    Event occurrences in one time window: 'upcoming' and 'past' are keyset
+    paginated (?after= / ?before= cursors), 'week' and 'month' are whole
+    calendar ranges.
+    """
+    model = EventOccurrence
     template_name = 'events/event_list.html'
-    context_object_name = 'events'
+    context_object_name = 'occurrences'
+    window = 'upcoming'
+
+    def _cursor(self, name):
+        value = self.request.GET.get(name)
+        if not value:
+            return None
+        cursor = listing.decode_cursor(value)
+        if cursor is None:
+            raise Http404("Invalid cursor")
+        return cursor
 
     def get_queryset(self):
-        # Show future events first, exclude completed ones
-        return Event.objects.filter(is_completed=False).order_by('-start_time')
+        self.next_cursor = None
+        if self.window == 'upcoming':
+            rows, self.next_cursor = listing.upcoming(self._cursor('after'))
+            return rows
+        if self.window == 'past':
+            rows, self.next_cursor = listing.past(self._cursor('before'))
+            return rows
+        if self.window == 'week':
+            self.bounds = listing.week_bounds(timezone.localdate())
+        else:
+            year, month = self.kwargs['year'], self.kwargs['month']
+            if not (1 <= month <= 12 and 1900 <= year <= 2999):
+                raise Http404("No such month")
+            self.bounds = listing.month_bounds(year, month)
+        # As in the archive, occurrences that have ended are shown even if their event is completed
+        now = timezone.now()
+        return [
+            row for row in between(*self.bounds, queryset=Event.objects.all())
+            if not row.event.is_completed or row.end_time <= now
+        ]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['window'] = self.window
+        context['next_cursor'] = self.next_cursor
+        today = timezone.localdate()
+        context['this_month'] = today
+        if self.window == 'month':
+            month = date(self.kwargs['year'], self.kwargs['month'], 1)
+            context['month'] = month
+            context['previous_month'] = date(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+            context['next_month'] = date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+        return context
+
+
+ICS_MAX_AGE = 15 * 60  # Seconds
+
+
+def _calendar_state(request):
+    return request_memo(request, 'ics', lambda: aggregate_state(ics.feed_events()))
+
+
+def calendar_etag(request):
+    # Calendars carry no per-user content, so every request may be validated;
+    # the date covers completed events dropping out of the feed
+    return page_etag(request, request.get_host(), *_calendar_state(request), timezone.localdate())
+
+
+def calendar_last_modified(request):
+    return _calendar_state(request)[0]
+
+
+def _event_updated_at(request, slug):
+    return request_memo(request, ('ics', slug), lambda: (
+        Event.objects.filter(slug=slug).values_list('updated_at', flat=True).first()
+    ))
+
+
+def event_calendar_etag(request, slug):
+    updated_at = _event_updated_at(request, slug)
+    return page_etag(request, request.get_host(), updated_at) if updated_at else None
+
+
+def event_calendar_last_modified(request, slug):
+    return _event_updated_at(request, slug)
+
+
+def _calendar_response(events, request, name, filename):
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    response = StreamingHttpResponse(ics.calendar_lines(events, base_url, name), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    response['Cache-Control'] = f'public, max-age={ICS_MAX_AGE}'
+    return response
+
+
+@require_safe
+@condition(etag_func=calendar_etag, last_modified_func=calendar_last_modified)
+def event_calendar(request):
+    """The whole calendar as a subscribable iCalendar feed."""
+    return _calendar_response(ics.feed_events(), request, 'The Truth Gate Events', 'events.ics')
+
+
+@require_safe
+@condition(etag_func=event_calendar_etag, last_modified_func=event_calendar_last_modified)
+def event_ics(request, slug):
+    """One event (with its repeats) as an iCalendar file."""
+    event = get_object_or_404(Event.objects.only('pk', 'slug', 'title'), slug=slug)
+    return _calendar_response(Event.objects.filter(pk=event.pk), request, event.title, f'{event.slug}.ics')
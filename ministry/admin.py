@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PrayerRequest, ContactSubmission
+from .models import PrayerRequest, ContactSubmission, PaystackEvent
 
 @admin.register(PrayerRequest)
 class PrayerRequestAdmin(admin.ModelAdmin):
@@ -14,3 +14,10 @@ class ContactSubmissionAdmin(admin.ModelAdmin):
     list_filter = ('is_responded',)
     search_fields = ('subject', 'message', 'name')
     readonly_fields = ('created_at',)
+
+@admin.register(PaystackEvent)
+class PaystackEventAdmin(admin.ModelAdmin):
+    list_display = ('event', 'reference', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'event')
+    search_fields = ('reference',)
+    readonly_fields = ('body_digest', 'payload', 'attempts', 'error', 'created_at', 'started_at', 'finished_at')
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ministry.webhooks import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Verifies stored Paystack webhook deliveries with Paystack and settles their donations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.PAYSTACK_WEBHOOK_WORKERS,
+            help='Worker threads (defaults to PAYSTACK_WEBHOOK_WORKERS)'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit when no event is due')
+        parser.add_argument('--poll', type=float, default=5.0, help='Seconds between queue checks')
+
+    def handle(self, *args, **options):
+        handled = run_worker(
+            workers=max(options['workers'], 1),
+            once=options['once'],
+            poll_interval=options['poll'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Processed {handled} Paystack event(s).'))
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    Testimony = apps.get_model('ministry', 'Testimony')
+    Testimony.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ministry', '0005_prayerrequest_followed_up_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testimony',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class PrayerRequest(models.Model):
     name = models.CharField(max_length=100, help_text="Leave blank for anonymous requests", blank=True)
@@ -31,6 +32,7 @@ class Testimony(models.Model):
     content = models.TextField()
     is_approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Testimony by {self.name or 'Anonymous'} ({'Approved' if self.is_approved else 'Pending'})"
@@ -54,6 +56,37 @@ class Donation(models.Model):
     def __str__(self):
         return f"{self.reference} - {self.email} - {self.amount}"
 
+class PaystackEvent(models.Model):
+    """A signed webhook delivery, stored before it is acknowledged (see ministry.webhooks)."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    event = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    # SHA-256 of the raw body: Paystack redelivers until it gets a 200
+    body_digest = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='ministry_paystack_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.reference} ({self.status})"
+
 from auditlog.registry import auditlog
 auditlog.register(PrayerRequest)
 auditlog.register(ContactSubmission)
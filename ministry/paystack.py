@@ -0,0 +1,63 @@
+"""
+Paystack API calls and webhook signatures.
+
+Every call goes to PAYSTACK_API_BASE (the live API by default; tests point
+it at ministry.paystack_stub) with a PAYSTACK_TIMEOUT, so a slow Paystack
+can't hold a worker indefinitely. Network failures and 5xx/429 responses
+raise PaystackUnavailable, which callers treat as "try again later".
+"""
+
+import hashlib
+import hmac
+from urllib.parse import quote
+
+import requests
+from django.conf import settings
+
+
+class PaystackError(Exception):
+    """Paystack answered, but not with a usable result."""
+
+
+class PaystackUnavailable(PaystackError):
+    """Paystack couldn't be reached or asked us to retry."""
+
+
+def valid_signature(body, signature):
+    """True if `signature` is the HMAC-SHA512 of the raw body under our secret key."""
+    if not signature:
+        return False
+    expected = hmac.new(settings.PAYSTACK_SECRET_KEY.encode('utf-8'), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _request(method, path, **kwargs):
+    headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
+    try:
+        response = requests.request(
+            method, settings.PAYSTACK_API_BASE.rstrip('/') + path,
+            headers=headers, timeout=settings.PAYSTACK_TIMEOUT, **kwargs
+        )
+    except requests.RequestException as e:
+        raise PaystackUnavailable(str(e)) from e
+    if response.status_code >= 500 or response.status_code == 429:
+        raise PaystackUnavailable(f"HTTP {response.status_code}")
+    try:
+        return response.json()
+    except ValueError as e:
+        raise PaystackError(f"Invalid JSON (HTTP {response.status_code})") from e
+
+
+def initialize_transaction(email, amount_kobo, reference, callback_url):
+    """Start a transaction; returns Paystack's response body."""
+    return _request('POST', '/transaction/initialize', json={
+        "email": email,
+        "amount": amount_kobo,
+        "reference": reference,
+        "callback_url": callback_url,
+    })
+
+
+def verify_transaction(reference):
+    """Paystack's record of a transaction ({'status': ..., 'data': {...}})."""
+    return _request('GET', f"/transaction/verify/{quote(reference, safe='')}")
@@ -0,0 +1,134 @@
+"""
+A local stand-in for the Paystack API, for tests and offline development.
+
+StubPaystack serves the two endpoints ministry.paystack calls on a
+loopback port, from an in-memory table of transactions:
+
+    with StubPaystack() as stub, override_settings(PAYSTACK_API_BASE=stub.url):
+        stub.add('ref-1', amount=500000)
+        ...
+
+- GET /transaction/verify/<reference> answers like Paystack: the
+  transaction's data, or status false (HTTP 400) for an unknown reference.
+- POST /transaction/initialize records a transaction and returns an
+  authorization_url on the stub.
+- `stub.fail_next(n, status)` answers the next n requests with an error,
+  and `stub.delay` slows every answer, to exercise retries and timeouts.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        try:
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting (see `delay`)
+            pass
+
+    def _intercepted(self):
+        stub = self.server.stub
+        stub.requests.append((self.command, self.path))
+        if stub.delay:
+            time.sleep(stub.delay)
+        with stub.lock:
+            if stub.failures:
+                stub.failures -= 1
+                self._reply(stub.failure_status, {'status': False, 'message': 'Stub failure'})
+                return True
+        return False
+
+    def do_GET(self):
+        if self._intercepted():
+            return
+        prefix = '/transaction/verify/'
+        if not self.path.startswith(prefix):
+            self._reply(404, {'status': False, 'message': 'Not found'})
+            return
+        transaction = self.server.stub.transactions.get(unquote(self.path[len(prefix):]))
+        if transaction is None:
+            self._reply(400, {'status': False, 'message': 'Transaction reference not found'})
+            return
+        self._reply(200, {'status': True, 'message': 'Verification successful', 'data': transaction})
+
+    def do_POST(self):
+        if self._intercepted():
+            return
+        if self.path != '/transaction/initialize':
+            self._reply(404, {'status': False, 'message': 'Not found'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        data = json.loads(self.rfile.read(length) or b'{}')
+        stub = self.server.stub
+        stub.add(data['reference'], amount=data['amount'], status='abandoned')
+        self._reply(200, {'status': True, 'message': 'Authorization URL created', 'data': {
+            'authorization_url': f"{stub.url}/checkout/{data['reference']}",
+            'access_code': data['reference'],
+            'reference': data['reference'],
+        }})
+
+
+class StubPaystack:
+    """Paystack API stand-in on 127.0.0.1; use as a context manager (see module docstring)."""
+
+    def __init__(self):
+        self.transactions = {}
+        self.requests = []
+        self.failures = 0
+        self.failure_status = 503
+        self.delay = 0
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def add(self, reference, amount, currency='NGN', status='success'):
+        """Record a transaction, `amount` in kobo, as Paystack would return it."""
+        self.transactions[reference] = {
+            'id': len(self.transactions) + 1,
+            'reference': reference,
+            'amount': amount,
+            'currency': currency,
+            'status': status,
+        }
+
+    def fail_next(self, count, status=503):
+        """Answer the next `count` requests with HTTP `status`."""
+        with self.lock:
+            self.failures = count
+            self.failure_status = status
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='paystack-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,183 @@
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import paystack, webhooks
+from .models import Donation, PaystackEvent
+from .paystack_stub import StubPaystack
+
+
+def signed_post(client, payload):
+    body = json.dumps(payload).encode('utf-8')
+    signature = hmac.new(settings.PAYSTACK_SECRET_KEY.encode('utf-8'), body, hashlib.sha512).hexdigest()
+    return client.post(
+        '/connect/webhooks/paystack/', body, content_type='application/json', HTTP_X_PAYSTACK_SIGNATURE=signature
+    )
+
+
+def charge(reference, paystack_id=1):
+    return {'event': 'charge.success', 'data': {'id': paystack_id, 'reference': reference}}
+
+
+class PaystackWebhookTests(TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_HOST='localhost')
+        self.stub = StubPaystack().start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(PAYSTACK_API_BASE=self.stub.url, PAYSTACK_TIMEOUT=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.donation = Donation.objects.create(email='giver@example.com', amount=5000, reference='ref-1')
+
+    def process_due(self):
+        handled = 0
+        while (event := webhooks.claim_next_event()) is not None:
+            webhooks.process_event(event)
+            handled += 1
+        return handled
+
+    def test_webhook_is_stored_without_calling_paystack(self):
+        response = signed_post(self.client, charge('ref-1'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.requests, [])
+        event = PaystackEvent.objects.get()
+        self.assertEqual((event.event, event.reference, event.status), ('charge.success', 'ref-1', 'pending'))
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(
+            '/connect/webhooks/paystack/', b'{}', content_type='application/json',
+            HTTP_X_PAYSTACK_SIGNATURE='0' * 128,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaystackEvent.objects.exists())
+
+    def test_redelivery_is_stored_once(self):
+        signed_post(self.client, charge('ref-1'))
+        signed_post(self.client, charge('ref-1'))
+        self.assertEqual(PaystackEvent.objects.count(), 1)
+
+    def test_worker_settles_donation(self):
+        self.stub.add('ref-1', amount=500000)
+        signed_post(self.client, charge('ref-1', paystack_id=42))
+        self.assertEqual(self.process_due(), 1)
+
+        self.donation.refresh_from_db()
+        self.assertEqual(
+            (self.donation.status, self.donation.verified, self.donation.paystack_ref), ('SUCCESS', True, '42')
+        )
+        self.assertEqual(PaystackEvent.objects.get().status, 'done')
+
+    def test_amount_mismatch_fails_donation(self):
+        self.stub.add('ref-1', amount=100)
+        signed_post(self.client, charge('ref-1'))
+        self.process_due()
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'FAILED')
+
+    def test_currency_mismatch_fails_donation(self):
+        self.stub.add('ref-1', amount=500000, currency='USD')
+        signed_post(self.client, charge('ref-1'))
+        self.process_due()
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'FAILED')
+        self.assertEqual(PaystackEvent.objects.get().error, 'currency mismatch')
+
+    def test_malformed_answer_fails_at_once(self):
+        signed_post(self.client, charge('ref-1'))
+        answer = {'status': True, 'data': {'status': 'success'}}
+        with mock.patch.object(paystack, 'verify_transaction', return_value=answer), self.assertLogs(webhooks.logger, 'WARNING'):
+            self.process_due()
+        event = PaystackEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('failed', 1))
+        self.assertTrue(event.error.startswith('KeyError'))
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'PENDING')
+
+    def test_unusable_answer_is_not_retried(self):
+        signed_post(self.client, charge('ref-1'))
+        error = paystack.PaystackError('Invalid JSON (HTTP 200)')
+        with mock.patch.object(paystack, 'verify_transaction', side_effect=error), self.assertLogs(webhooks.logger, 'WARNING'):
+            self.process_due()
+        event = PaystackEvent.objects.get()
+        self.assertEqual((event.status, event.error), ('failed', 'PaystackError: Invalid JSON (HTTP 200)'))
+
+    def test_unavailable_paystack_is_retried_with_backoff(self):
+        self.stub.add('ref-1', amount=500000)
+        self.stub.fail_next(1)
+        signed_post(self.client, charge('ref-1'))
+        self.process_due()
+
+        event = PaystackEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'PENDING')
+        # Not due yet
+        self.assertEqual(self.process_due(), 0)
+
+        PaystackEvent.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.process_due()
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'SUCCESS')
+
+    def test_event_fails_after_max_attempts(self):
+        self.stub.fail_next(webhooks.MAX_ATTEMPTS)
+        signed_post(self.client, charge('ref-1'))
+        for _ in range(webhooks.MAX_ATTEMPTS):
+            PaystackEvent.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            self.process_due()
+        self.assertEqual(PaystackEvent.objects.get().status, 'failed')
+
+    @override_settings(PAYSTACK_TIMEOUT=1)
+    def test_slow_paystack_times_out(self):
+        self.stub.add('ref-1', amount=500000)
+        self.stub.delay = 1.5
+        signed_post(self.client, charge('ref-1'))
+        self.process_due()
+        self.assertEqual(PaystackEvent.objects.get().status, 'pending')
+
+
+class PaystackWorkerTests(TransactionTestCase):
+    # Events are handled on a pool thread, which only sees committed rows.
+    # One worker: the in-memory test database can't wait for a write lock.
+    def setUp(self):
+        self.client = Client(HTTP_HOST='localhost')
+        self.stub = StubPaystack().start()
+        self.addCleanup(self.stub.stop)
+        self.enterContext(override_settings(PAYSTACK_API_BASE=self.stub.url, PAYSTACK_TIMEOUT=2))
+
+    def donation(self, reference, paid, currency='NGN'):
+        Donation.objects.create(email='giver@example.com', amount=5000, reference=reference)
+        self.stub.add(reference, amount=paid, currency=currency)
+        signed_post(self.client, charge(reference))
+
+    def statuses(self):
+        return dict(Donation.objects.values_list('reference', 'status'))
+
+    def test_workers_settle_each_donation(self):
+        self.donation('ok', 500000)
+        self.donation('short', 100)
+        self.donation('dollars', 500000, currency='USD')
+        with self.assertLogs(webhooks.logger, 'INFO'):
+            self.assertEqual(webhooks.run_worker(workers=1, once=True), 3)
+        self.assertEqual(self.statuses(), {'ok': 'SUCCESS', 'short': 'FAILED', 'dollars': 'FAILED'})
+        self.assertEqual(set(PaystackEvent.objects.values_list('status', flat=True)), {'done'})
+
+    def test_workers_retry_while_paystack_is_down(self):
+        self.donation('ok', 500000)
+        self.stub.fail_next(1)
+        with self.assertLogs(webhooks.logger, 'WARNING'):
+            webhooks.run_worker(workers=1, once=True)
+        self.assertEqual(PaystackEvent.objects.get().status, 'pending')
+        self.assertEqual(self.statuses(), {'ok': 'PENDING'})
+
+        PaystackEvent.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs(webhooks.logger, 'INFO'):
+            webhooks.run_worker(workers=1, once=True)
+        self.assertEqual(self.statuses(), {'ok': 'SUCCESS'})
@@ -2,16 +2,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-from django.conf import settings
+from django.views.decorators.http import condition, require_POST
 from django.contrib import messages
+from core.conditional import aggregate_state, allows_conditional, page_etag, request_memo
+from core.page_cache import public_page_cache
 from .models import Testimony, PrayerRequest, ContactSubmission, Donation
+from . import paystack, webhooks
 import secrets
-import requests
 import json
 import logging
-import hmac
-import hashlib
 
 import bleach
 
@@ -36,10 +35,35 @@ def submit_testimony(request):
     
     return render(request, 'ministry/submit_testimony.html')
 
+def testimony_list_etag(request):
+    if not allows_conditional(request):
+        return None
+    return page_etag(request, *aggregate_state(Testimony.objects.filter(is_approved=True)))
+
+@condition(etag_func=testimony_list_etag)
+@public_page_cache(Testimony)
 def testimony_list(request):
     testimonies = Testimony.objects.filter(is_approved=True).order_by('-created_at')
     return render(request, 'ministry/testimony_list.html', {'testimonies': testimonies})
 
+def _approved_updated_at(request, pk):
+    return request_memo(request, ('testimony', pk), lambda: (
+        Testimony.objects.filter(pk=pk, is_approved=True)
+        .values_list('updated_at', flat=True).first()
+    ))
+
+def testimony_detail_etag(request, pk):
+    if not allows_conditional(request):
+        return None
+    updated_at = _approved_updated_at(request, pk)
+    return page_etag(request, updated_at) if updated_at else None
+
+def testimony_detail_last_modified(request, pk):
+    if not allows_conditional(request):
+        return None
+    return _approved_updated_at(request, pk)
+
+@condition(etag_func=testimony_detail_etag, last_modified_func=testimony_detail_last_modified)
 def testimony_detail(request, pk):
     testimony = get_object_or_404(Testimony, pk=pk, is_approved=True)
     return render(request, 'ministry/testimony_detail.html', {'testimony': testimony})
@@ -113,32 +137,24 @@ def initiate_donation(request):
         )
 
         # Initialize Paystack Transaction
-        headers = {
-            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-            "Content-Type": "application/json",
-        }
-        data = {
-            "email": email,
-            "amount": int(amount_decimal * 100), # Paystack expects Kobo
-            "reference": ref,
-            "callback_url": request.build_absolute_uri('/give/verify/'), # Fallback callback
-        }
-
         try:
-            response = requests.post('https://api.paystack.co/transaction/initialize', headers=headers, json=data)
-            response_data = response.json()
-
-            if response_data['status']:
-                # Save Paystack reference if needed (often same as ours if we sent it)
+            response_data = paystack.initialize_transaction(
+                email,
+                int(amount_decimal * 100), # Paystack expects Kobo
+                ref,
+                request.build_absolute_uri('/give/verify/'), # Fallback callback
+            )
+
+            if response_data.get('status'):
                 # Redirect user to Paystack
                 return redirect(response_data['data']['authorization_url'])
             else:
-                logger.error(f"Paystack Init Failed: {response_data}")
+                logger.error("Paystack Init Failed: %s", response_data)
                 messages.error(request, "Could not initialize payment. Please try again.")
                 return redirect('give')
 
         except Exception as e:
-            logger.error(f"Paystack Error: {e}")
+            logger.error("Paystack Error: %s", e)
             messages.error(request, "Connection error. Please try again later.")
             return redirect('give')
 
@@ -149,87 +165,28 @@ def initiate_donation(request):
 @require_POST
 def paystack_webhook(request):
     """
-    Secure Webhook to verify transactions server-side.
+    Signed Paystack webhook. The delivery is stored and acknowledged at
+    once; ministry.webhooks verifies it with Paystack in the background.
     """
     paystack_signature = request.headers.get('x-paystack-signature')
-    
+
     if not paystack_signature:
         return HttpResponseBadRequest("Missing signature")
 
-    # Verify Signature
     body = request.body
-    # Ensure PAYSTACK_SECRET_KEY is bytes for hmac
-    secret = settings.PAYSTACK_SECRET_KEY.encode('utf-8')
-    computed_sig = hmac.new(secret, body, hashlib.sha512).hexdigest()
-
-    if computed_sig != paystack_signature:
+    if not paystack.valid_signature(body, paystack_signature):
         logger.warning("Paystack Webhook Signature Verification Failed")
         return HttpResponseBadRequest("Invalid signature")
 
-    # Process Event
     try:
         payload = json.loads(body)
-        event = payload.get('event')
-        data = payload.get('data', {})
-
-        if event == 'charge.success':
-            reference = data.get('reference')
-            
-            # Find Donation
-            try:
-                donation = Donation.objects.get(reference=reference)
-            except Donation.DoesNotExist:
-                logger.error(f"Webhook received for unknown reference: {reference}")
-                return HttpResponse(status=200) # Ack to stop retries even if not found
-
-            # 1. Idempotency Check (Prevent duplicate processing)
-            if donation.status == 'SUCCESS':
-                logger.info(f"Duplicate webhook received for already successful donation: {reference}")
-                return HttpResponse(status=200)
-
-            # Double Verify via API (Defense in Depth)
-            headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
-            verify_url = f"https://api.paystack.co/transaction/verify/{reference}"
-            v_response = requests.get(verify_url, headers=headers)
-            v_data = v_response.json()
-
-            if v_data['status'] and v_data['data']['status'] == 'success':
-                 # 2. Strict Amount & Currency Verification
-                 paid_amount_kobo = v_data['data']['amount'] # Paystack returns Kobo (Integer)
-                 paid_currency = v_data['data']['currency']
-                 
-                 # Convert our stored Decimal Naira to Kobo Integer for comparison
-                 expected_amount_kobo = int(donation.amount * 100)
-
-                 if paid_currency != 'NGN':
-                     logger.error(f"Invalid Currency for {reference}: Expected NGN, Got {paid_currency}")
-                     donation.status = 'FAILED'
-                     donation.save()
-                     return HttpResponse(status=200)
-
-                 if paid_amount_kobo != expected_amount_kobo:
-                     logger.critical(f"FRAUD ATTEMPT: Amount Mismatch for {reference}. Expected {expected_amount_kobo}, Paid {paid_amount_kobo}")
-                     donation.status = 'FAILED' # Or 'FRAUD_SUSPECTED'
-                     donation.save()
-                     return HttpResponse(status=200) # Ack Paystack to stop retrying, but don't give value.
-
-                 # All Checks Passed
-                 donation.status = 'SUCCESS'
-                 donation.verified = True
-                 donation.paystack_ref = str(data.get('id')) # Store Paystack ID
-                 donation.save()
-                 logger.info(f"Donation {reference} verified successfully.")
-            else:
-                 logger.warning(f"Donation {reference} verification failed via API check.")
-                 donation.status = 'FAILED'
-                 donation.save()
-        
     except json.JSONDecodeError:
         return HttpResponseBadRequest("Invalid JSON")
-    except Exception as e:
-        logger.error(f"Webhook Processing Error: {e}")
-        return HttpResponse(status=500)
+    if not isinstance(payload, dict):
+        return HttpResponseBadRequest("Invalid JSON")
 
+    # Verified by a worker; Paystack only needs the 200
+    webhooks.record(body, payload)
     return HttpResponse(status=200)
 
 def donation_success(request):
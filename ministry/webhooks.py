@@ -0,0 +1,259 @@
+"""
+Background processing of Paystack webhooks.
+
+The webhook view checks the signature, stores the delivery as a
+PaystackEvent (`record`) and answers 200 at once; Paystack never waits on
+our call back to its verify API. Workers then claim pending events and
+confirm them:
+
+- charge.success: re-fetch the transaction from Paystack
+  (ministry.paystack.verify_transaction) and mark the Donation SUCCESS, or
+  FAILED on a currency or amount mismatch or a failed transaction.
+- other events, unknown references and already-successful donations are
+  marked done without a call.
+
+When Paystack is unreachable the event is retried with exponential backoff
+(`next_attempt_at`), up to MAX_ATTEMPTS, and the donation stays PENDING
+meanwhile. Any other error, such as a malformed answer from Paystack, won't
+go away on a retry, so the event fails at once. Redeliveries of the same
+body are stored once.
+
+Run the workers with `manage.py process_paystack_events`, or set
+PAYSTACK_WEBHOOK_POLL_INTERVAL to run them inside the ASGI process
+(core.scheduler), where new deliveries are picked up as soon as they are
+committed.
+"""
+
+import hashlib
+import logging
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.scheduler import start_periodic
+from . import paystack
+from .models import Donation, PaystackEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+# Seconds before the first retry, doubling with each attempt up to RETRY_CAP
+RETRY_BASE = 30
+RETRY_CAP = 3600
+
+_wake = threading.Event()
+
+
+def record(body, payload):
+    """Store a verified delivery (once per distinct body) and wake in-process workers after commit."""
+    data = payload.get('data') or {}
+    PaystackEvent.objects.bulk_create([PaystackEvent(
+        event=str(payload.get('event', ''))[:50],
+        reference=str(data.get('reference') or '')[:100],
+        body_digest=hashlib.sha256(body).hexdigest(),
+        payload=payload,
+    )], ignore_conflicts=True)
+    transaction.on_commit(_wake.set)
+
+
+def retry_delay(attempts):
+    """Backoff after the `attempts`th failure, with jitter so a burst doesn't retry in lockstep."""
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_CAP)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _run_time_limit():
+    # A verify call plus the database work around it
+    return timedelta(seconds=settings.PAYSTACK_TIMEOUT * 2 + 60)
+
+
+def requeue_stale_events():
+    """Return running events that have outlived the time limit (their worker died) to the queue."""
+    return PaystackEvent.objects.filter(
+        status='running', started_at__lt=timezone.now() - _run_time_limit()
+    ).update(status='pending')
+
+
+def claim_next_event():
+    """Atomically move the next due pending event to running and return it (None if idle)."""
+    while True:
+        event_id = (
+            PaystackEvent.objects.filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at').values_list('id', flat=True).first()
+        )
+        if event_id is None:
+            return None
+        claimed = PaystackEvent.objects.filter(pk=event_id, status='pending').update(
+            status='running', started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return PaystackEvent.objects.get(pk=event_id)
+        # Another worker took it first
+
+
+def _finish(event, status, error=''):
+    PaystackEvent.objects.filter(pk=event.pk, status='running').update(
+        status=status, error=error, finished_at=timezone.now()
+    )
+
+
+def fail_event(event, error):
+    """
+    Record a failure: back on the queue after a backoff while Paystack is
+    unavailable, and failed after MAX_ATTEMPTS or for any other error.
+    """
+    transient = isinstance(error, paystack.PaystackUnavailable)
+    message = f'{type(error).__name__}: {error}'
+    # Anything unexpected gets a traceback
+    logger.warning(
+        'Paystack event %s (%s) failed: %s', event.pk, event.reference, message,
+        exc_info=None if transient else error,
+    )
+    if not transient or event.attempts >= MAX_ATTEMPTS:
+        _finish(event, 'failed', message)
+    else:
+        PaystackEvent.objects.filter(pk=event.pk, status='running').update(
+            status='pending', error=message, next_attempt_at=timezone.now() + retry_delay(event.attempts)
+        )
+
+
+def _set_status(donation, status, **fields):
+    for name, value in fields.items():
+        setattr(donation, name, value)
+    donation.status = status
+    donation.save()
+
+
+def confirm_charge(reference, paystack_id):
+    """
+    Verify a successful charge with Paystack and settle its donation.
+    Returns a note for the event log. Raises PaystackUnavailable when the
+    call should be retried.
+    """
+    status = Donation.objects.filter(reference=reference).values_list('status', flat=True).first()
+    if status is None:
+        logger.error("Webhook received for unknown reference: %s", reference)
+        return 'unknown reference'
+    if status == 'SUCCESS':
+        return 'already verified'
+
+    # Outside the transaction: no row lock is held while Paystack answers
+    v_data = paystack.verify_transaction(reference)
+
+    with transaction.atomic():
+        # Write first, to take the row lock before reading: on SQLite, where
+        # select_for_update() does nothing, a transaction that reads and then
+        # writes can't wait for a concurrent one and fails as "locked"
+        Donation.objects.filter(reference=reference).update(updated_at=timezone.now())
+        donation = Donation.objects.get(reference=reference)
+        # Idempotency: a duplicate delivery may have settled it meanwhile
+        if donation.status == 'SUCCESS':
+            return 'already verified'
+
+        if not (v_data.get('status') and (v_data.get('data') or {}).get('status') == 'success'):
+            logger.warning("Donation %s verification failed via API check.", reference)
+            _set_status(donation, 'FAILED')
+            return 'verification failed'
+
+        # Strict amount & currency verification
+        paid_amount_kobo = v_data['data']['amount']  # Paystack returns Kobo (Integer)
+        paid_currency = v_data['data']['currency']
+        expected_amount_kobo = int(donation.amount * 100)
+
+        if paid_currency != 'NGN':
+            logger.error("Invalid Currency for %s: Expected NGN, Got %s", reference, paid_currency)
+            _set_status(donation, 'FAILED')
+            return 'currency mismatch'
+
+        if paid_amount_kobo != expected_amount_kobo:
+            logger.critical(
+                "FRAUD ATTEMPT: Amount Mismatch for %s. Expected %s, Paid %s",
+                reference, expected_amount_kobo, paid_amount_kobo,
+            )
+            _set_status(donation, 'FAILED')
+            return 'amount mismatch'
+
+        _set_status(donation, 'SUCCESS', verified=True, paystack_ref=str(paystack_id))
+    logger.info("Donation %s verified successfully.", reference)
+    return ''
+
+
+def process_event(event):
+    """Handle one claimed event, recording the outcome on it."""
+    try:
+        if event.event != 'charge.success' or not event.reference:
+            _finish(event, 'done')
+            return
+        data = event.payload.get('data') or {}
+        _finish(event, 'done', confirm_charge(event.reference, data.get('id')))
+    except Exception as e:
+        fail_event(event, e)
+
+
+def _process_in_thread(event):
+    try:
+        process_event(event)
+    finally:
+        # Each pool thread has its own connection
+        connection.close()
+
+
+def run_worker(workers=None, once=False, poll_interval=5.0, log=None):
+    """
+    Process the queue with a pool of `workers` threads, keeping at most that
+    many events in flight. With `once`, return when nothing is due;
+    otherwise poll every `poll_interval` seconds (or sooner, when a delivery
+    is recorded in this process). Returns the number of events handled.
+    """
+    workers = workers or settings.PAYSTACK_WEBHOOK_WORKERS
+    log = log or logger.info
+    requeued = requeue_stale_events()
+    if requeued:
+        log(f'Requeued {requeued} stale event(s)')
+
+    handled = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='paystack-webhook') as pool:
+        while True:
+            _wake.clear()
+            while len(in_flight) < workers:
+                event = claim_next_event()
+                if event is None:
+                    break
+                in_flight.add(pool.submit(_process_in_thread, event))
+
+            if not in_flight:
+                if once:
+                    break
+                # Don't hold a connection open while idle
+                connections.close_all()
+                _wake.wait(poll_interval)
+                continue
+
+            done, in_flight = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+                handled += 1
+    return handled
+
+
+def _process_due():
+    handled = run_worker(once=True)
+    if handled:
+        logger.info("Processed %s Paystack event(s)", handled)
+
+
+def start_scheduler():
+    """
+    Process due webhook events every PAYSTACK_WEBHOOK_POLL_INTERVAL seconds,
+    and as soon as a delivery is committed in this process, on a daemon
+    thread (core.scheduler). Does nothing when the interval is 0.
+    """
+    interval = getattr(settings, 'PAYSTACK_WEBHOOK_POLL_INTERVAL', 0)
+    return start_periodic('paystack-webhooks', interval, _process_due, wake=_wake)
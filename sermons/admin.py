@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Speaker, Series, Topic, Sermon
+from .audio_jobs import enqueue_transcode
+from .models import AudioJob, Speaker, Series, Topic, Sermon
 
 @admin.register(Speaker)
 class SpeakerAdmin(admin.ModelAdmin):
@@ -36,3 +37,14 @@ class SermonAdmin(admin.ModelAdmin):
             'fields': ('description', 'notes')
         }),
     )
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'audio_file' in form.changed_data:
+            enqueue_transcode(obj)
+
+@admin.register(AudioJob)
+class AudioJobAdmin(admin.ModelAdmin):
+    list_display = ('sermon', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('sermon', 'source_name', 'attempts', 'error', 'created_at', 'started_at', 'finished_at')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SermonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sermons'
+
+    def ready(self):
+        from . import signals
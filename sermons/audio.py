@@ -0,0 +1,157 @@
+"""
+Sermon audio delivery with HTTP Range support.
+
+Audio is served by `sermons.views.sermon_audio` rather than the /media/
+static route, so players can seek and resume:
+
+- `Range: bytes=...` requests get 206 Partial Content for that slice (416 if
+  it lies outside the file). `If-Range` falls back to the full file when the
+  copy the client holds has changed.
+- The ETag is derived from the file's SHA-256, which the audio worker
+  (sermons.audio_jobs) stores on the Sermon or AudioRendition, so requests
+  never read the whole file. Until it is stored, the ETag is built from the
+  file's size and mtime. If-None-Match answers 304.
+- Responses wrap the open file, so WSGI servers with a file wrapper (e.g.
+  gunicorn) hand it to sendfile(); under ASGI it is streamed in blocks.
+- `audio_url()` adds the stored hash as `?v=`, so URLs change whenever the
+  file does and can be cached as immutable.
+
+Transcoded renditions (sermons.audio_jobs) are served the same way.
+
+Files on storages without a local path (e.g. a CDN) are redirected to their
+storage URL, which already handles ranges.
+"""
+
+import mimetypes
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+STREAM_BLOCK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # Seconds
+MAX_AGE = 60 * 60  # Seconds, for unversioned URLs
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)', re.ASCII)
+
+
+class RangeFile:
+    """A file positioned at `start` that reads at most `length` bytes."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def local_path(field_file):
+    """Return the file's filesystem path, or None for remote storages."""
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return None
+
+
+def audio_url(sermon, rendition=None):
+    """Versioned URL of a sermon's audio (or one of its renditions); '' if none."""
+    field_file = rendition.file if rendition else sermon.audio_file
+    if not field_file:
+        return ''
+    if rendition:
+        url = reverse('sermon_audio_rendition', args=[sermon.slug, rendition.codec, rendition.bitrate])
+        digest = rendition.file_hash
+    else:
+        url = reverse('sermon_audio', args=[sermon.slug])
+        digest = sermon.audio_hash
+    if digest:
+        url += f'?v={digest[:16]}'
+    return url
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single byte range, None to ignore the
+    header (malformed or multiple ranges), or False if it is unsatisfiable.
+    """
+    match = RANGE_RE.fullmatch(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_audio(request, path, digest=''):
+    """Build the (partial) response for a local audio file whose SHA-256 is `digest` ('' if unknown)."""
+    stat = os.stat(path)
+    size = stat.st_size
+    mtime = stat.st_mtime
+    etag = quote_etag(digest[:32] if digest else f'{size:x}-{stat.st_mtime_ns:x}')
+    content_type = mimetypes.guess_type(path)[0] or 'audio/mpeg'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if digest and request.GET.get('v') == digest[:16]:
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={MAX_AGE}'
+        return response
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in if_none_match):
+        return finish(HttpResponseNotModified())
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header:
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag and parse_http_date_safe(if_range) != int(mtime):
+            range_header = None  # The client's copy is stale; send everything
+        else:
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return finish(response)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    response = FileResponse(RangeFile(open(path, 'rb'), start, length), content_type=content_type)
+    response.block_size = STREAM_BLOCK_SIZE
+    response['Content-Length'] = str(length)
+    response['Content-Disposition'] = 'inline'
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return finish(response)
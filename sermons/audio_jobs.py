@@ -0,0 +1,211 @@
+"""
+Background processing of uploaded sermon audio.
+
+Saving a sermon with new audio in the dashboard queues an AudioJob
+(`enqueue_transcode`) and clears the previous upload's renditions, duration,
+peaks and hash. `manage.py process_audio_jobs` claims pending jobs and runs
+`sermons.transcode.process_audio` for up to AUDIO_TRANSCODE_WORKERS of them
+at a time in a process pool, then stores the results:
+
+- an AudioRendition per (codec, kbps) in transcode.LADDER (needs ffmpeg);
+- Sermon.audio_duration and Sermon.audio_peaks, so pages show durations and
+  waveforms without opening the file;
+- SHA-256 hashes of the upload and each rendition (Sermon.audio_hash,
+  AudioRendition.file_hash), which version the audio URLs and ETags
+  (sermons.audio) without reading the file during a request.
+
+Jobs are claimed with a conditional UPDATE, so several workers can share a
+queue. Results for an upload that has since been replaced are discarded.
+Jobs left running by a worker that died are returned to the queue once they
+have run longer than any job could.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import transcode
+from .audio import local_path
+from .models import AudioJob, AudioRendition, Sermon
+
+logger = logging.getLogger(__name__)
+
+# Failures other than an undecodable file are retried this many times in total
+MAX_ATTEMPTS = 3
+
+
+def enqueue_transcode(sermon):
+    """
+    Queue processing of the sermon's current audio file, superseding any
+    pending job. Returns the job, or None if the sermon has no audio.
+    """
+    with transaction.atomic():
+        AudioJob.objects.filter(sermon=sermon, status='pending').update(
+            status='superseded', finished_at=timezone.now()
+        )
+        # Files are removed by the post_delete signal once this commits
+        for rendition in AudioRendition.objects.filter(sermon=sermon):
+            rendition.delete()
+        if sermon.audio_duration is not None or sermon.audio_peaks or sermon.audio_hash:
+            sermon.audio_duration = None
+            sermon.audio_peaks = []
+            sermon.audio_hash = ''
+            sermon.save(update_fields=['audio_duration', 'audio_peaks', 'audio_hash'])
+        if not sermon.audio_file:
+            return None
+        return AudioJob.objects.create(sermon=sermon, source_name=sermon.audio_file.name)
+
+
+def _job_time_limit():
+    # Analysis plus one encode per rung of the ladder, each bounded by the timeout
+    return timedelta(seconds=settings.AUDIO_TRANSCODE_TIMEOUT * (len(transcode.LADDER) + 1))
+
+
+def requeue_stale_jobs():
+    """Return running jobs that have outlived the time limit to the queue."""
+    return AudioJob.objects.filter(
+        status='running', started_at__lt=timezone.now() - _job_time_limit()
+    ).update(status='pending')
+
+
+def claim_next_job():
+    """Atomically move the oldest pending job to running and return it (None if idle)."""
+    while True:
+        job_id = AudioJob.objects.filter(status='pending').order_by('id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        claimed = AudioJob.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return AudioJob.objects.select_related('sermon').get(pk=job_id)
+        # Another worker took it first
+
+
+def _finish(job, status, error=''):
+    AudioJob.objects.filter(pk=job.pk, status='running').update(
+        status=status, error=error, finished_at=timezone.now()
+    )
+
+
+def fail_job(job, error):
+    """Record a failure; transient errors go back on the queue until MAX_ATTEMPTS."""
+    logger.warning('Audio job %s failed: %s', job.pk, error)
+    if isinstance(error, transcode.TranscodeError) or job.attempts >= MAX_ATTEMPTS:
+        _finish(job, 'failed', str(error))
+    else:
+        AudioJob.objects.filter(pk=job.pk, status='running').update(status='pending', error=str(error))
+
+
+def prepare_source(job, workdir):
+    """Path of the job's source audio, copied into `workdir` for remote storages."""
+    field_file = job.sermon.audio_file
+    if field_file.name != job.source_name:
+        return None
+    path = local_path(field_file)
+    if path is not None:
+        return path
+    path = os.path.join(workdir, 'source' + os.path.splitext(field_file.name)[1])
+    with field_file.open('rb') as source, open(path, 'wb') as copy:
+        shutil.copyfileobj(source, copy)
+    return path
+
+
+def apply_result(job, result):
+    """Store renditions, duration, peaks and hashes, unless the upload has changed meanwhile."""
+    for warning in result['warnings']:
+        logger.warning('Audio job %s: %s', job.pk, warning)
+    with transaction.atomic():
+        sermon = Sermon.objects.select_for_update().filter(pk=job.sermon_id).first()
+        if sermon is None or sermon.audio_file.name != job.source_name:
+            _finish(job, 'superseded')
+            return False
+        for rendition in AudioRendition.objects.filter(sermon=sermon):
+            rendition.delete()
+        for codec, kbps, path, digest in result['renditions']:
+            rendition = AudioRendition(
+                sermon=sermon, codec=codec, bitrate=kbps, size=os.path.getsize(path), file_hash=digest
+            )
+            with open(path, 'rb') as f:
+                rendition.file.save(f'{sermon.slug}-{os.path.basename(path)}', File(f), save=False)
+            rendition.save()
+        sermon.audio_duration = result['duration']
+        sermon.audio_peaks = result['peaks']
+        sermon.audio_hash = result['hash']
+        sermon.save(update_fields=['audio_duration', 'audio_peaks', 'audio_hash', 'updated_at'])
+        _finish(job, 'done')
+    return True
+
+
+def run_worker(workers=None, once=False, poll_interval=5.0, log=None):
+    """
+    Process the queue with a pool of `workers` processes, keeping at most that
+    many jobs in flight. With `once`, return when the queue is empty;
+    otherwise poll for new jobs every `poll_interval` seconds.
+    Returns the number of jobs completed.
+    """
+    workers = workers or settings.AUDIO_TRANSCODE_WORKERS
+    log = log or logger.info
+    requeued = requeue_stale_jobs()
+    if requeued:
+        log(f'Requeued {requeued} stale job(s)')
+
+    completed = 0
+    in_flight = {}
+    # Spawned workers import only the stdlib-only transcode module and hold no
+    # copies of this process's database connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        while True:
+            while len(in_flight) < workers:
+                job = claim_next_job()
+                if job is None:
+                    break
+                workdir = tempfile.mkdtemp(prefix='sermon-audio-')
+                try:
+                    source = prepare_source(job, workdir)
+                except Exception as e:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                    fail_job(job, e)
+                    continue
+                if source is None:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                    _finish(job, 'superseded')
+                    continue
+                future = pool.submit(
+                    transcode.process_audio, source, workdir, transcode.LADDER,
+                    settings.FFMPEG_BINARY, settings.AUDIO_TRANSCODE_TIMEOUT
+                )
+                in_flight[future] = (job, workdir)
+                log(f'Started job {job.pk} ({job.sermon})')
+
+            if not in_flight:
+                if once:
+                    break
+                # Don't hold a connection open while idle
+                connections.close_all()
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, workdir = in_flight.pop(future)
+                try:
+                    if apply_result(job, future.result()):
+                        completed += 1
+                        log(f'Finished job {job.pk}')
+                except Exception as e:
+                    fail_job(job, e)
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+    return completed
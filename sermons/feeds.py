@@ -0,0 +1,290 @@
+"""
+Sitemap and podcast RSS for published sermons, written to files.
+
+Crawlers and podcast apps poll these often, so each feed is generated once
+into FEED_CACHE_DIR and served from disk until it goes stale:
+
+- Generation streams published sermons with `.iterator(chunk_size=...)`
+  into an XMLGenerator over a temporary file, then renames it into place,
+  so memory stays flat however large the archive is and readers never see
+  a partial file.
+- Each feed is stamped with the state it was built from: MAX(updated_at)
+  and COUNT(*) of published sermons (one aggregate query) plus the page
+  cache tags of Series and Speaker. A request whose state matches the
+  stamp is served the file as-is; otherwise the feed is rebuilt first.
+- URLs are absolute, so files are kept per site root (scheme and host).
+- The sitemap is an index of SITEMAP_LIMIT-URL parts, per the protocol.
+
+`manage.py generate_feeds --base-url https://example.org` builds them
+ahead of the first request.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, time
+from xml.sax.saxutils import XMLGenerator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.feedgenerator import rfc2822_date
+
+from core.conditional import aggregate_state
+from core.page_cache import tag_versions
+from .audio import local_path
+from .models import AudioRendition, Series, Sermon, Speaker
+
+# Bump when the output format changes, to rebuild every stored feed
+FEED_VERSION = 1
+CHUNK_SIZE = 500
+SITEMAP_LIMIT = 50000  # URLs per sitemap file (the protocol's maximum)
+LOCK_TIMEOUT = 10 * 60  # Seconds
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+ITUNES_NS = 'http://www.itunes.com/dtds/podcast-1.0.dtd'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+# Public pages listed ahead of the sermons: (url name, change frequency)
+STATIC_PAGES = (
+    ('home', 'daily'),
+    ('sermon_list', 'daily'),
+    ('event_list', 'daily'),
+    ('about', 'monthly'),
+    ('contact', 'monthly'),
+)
+
+_local_lock = threading.Lock()
+
+
+def site_dir(base_url):
+    """Directory holding the feeds for one site root."""
+    return os.path.join(str(settings.FEED_CACHE_DIR), hashlib.md5(base_url.encode()).hexdigest()[:12])
+
+
+def current_state():
+    """Stamp for the feeds' current inputs: one aggregate query and a cache read."""
+    latest, count = aggregate_state(Sermon.objects.published())
+    parts = (FEED_VERSION, latest.isoformat() if latest else '', count, *tag_versions((Series, Speaker)))
+    return '|'.join(str(part) for part in parts)
+
+
+class _Writer:
+    """An XMLGenerator over a temporary file, renamed into place on success."""
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    def __enter__(self):
+        self.file = open(self.temp_path, 'w', encoding='utf-8')
+        self.xml = XMLGenerator(self.file, encoding='utf-8', short_empty_elements=True)
+        self.xml.startDocument()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+
+    def element(self, name, text=None, attrs=None):
+        self.xml.startElement(name, attrs or {})
+        if text is not None:
+            self.xml.characters(str(text))
+        self.xml.endElement(name)
+
+    def start(self, name, attrs=None):
+        self.xml.startElement(name, attrs or {})
+
+    def end(self, name):
+        self.xml.endElement(name)
+
+
+def _sermons():
+    return Sermon.objects.published().order_by('-date_preached', '-pk')
+
+
+def _write_sitemap_part(path, urls):
+    count = 0
+    with _Writer(path) as out:
+        out.start('urlset', {'xmlns': SITEMAP_NS})
+        for loc, lastmod, changefreq in urls:
+            out.start('url')
+            out.element('loc', loc)
+            if lastmod:
+                out.element('lastmod', lastmod)
+            out.element('changefreq', changefreq)
+            out.end('url')
+            count += 1
+            if count >= SITEMAP_LIMIT:
+                break
+        out.end('urlset')
+    return count
+
+
+def write_sitemap(directory, base_url):
+    """Write sitemap.xml (an index) and its sitemap-N.xml parts. Returns the URL count."""
+    def urls():
+        for name, changefreq in STATIC_PAGES:
+            yield base_url + reverse(name), None, changefreq
+        rows = _sermons().values_list('slug', 'updated_at')
+        for slug, updated_at in rows.iterator(chunk_size=CHUNK_SIZE):
+            yield base_url + reverse('sermon_detail', args=[slug]), updated_at.date().isoformat(), 'monthly'
+
+    pending = urls()
+    parts = []
+    total = 0
+    while True:
+        number = len(parts) + 1
+        written = _write_sitemap_part(os.path.join(directory, f'sitemap-{number}.xml'), pending)
+        if not written and parts:
+            os.remove(os.path.join(directory, f'sitemap-{number}.xml'))
+            break
+        parts.append(number)
+        total += written
+        if written < SITEMAP_LIMIT:
+            break
+
+    # Parts left over from a larger archive
+    keep = {f'sitemap-{number}.xml' for number in parts}
+    for name in os.listdir(directory):
+        if name.startswith('sitemap-') and name.endswith('.xml') and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+    now = timezone.now().date().isoformat()
+    with _Writer(os.path.join(directory, 'sitemap.xml')) as out:
+        out.start('sitemapindex', {'xmlns': SITEMAP_NS})
+        for number in parts:
+            out.start('sitemap')
+            out.element('loc', base_url + reverse('sitemap_part', args=[number]))
+            out.element('lastmod', now)
+            out.end('sitemap')
+        out.end('sitemapindex')
+    return total
+
+
+def _enclosure(sermon, base_url):
+    """(url, bytes, mime type) for a sermon's podcast episode; the MP3 rendition if there is one."""
+    rendition = next(iter(sermon.audio_renditions.all()), None)
+    if rendition:
+        url = reverse('sermon_audio_rendition', args=[sermon.slug, rendition.codec, rendition.bitrate])
+        return base_url + url, rendition.size, rendition.mime_type
+    path = local_path(sermon.audio_file)
+    size = os.path.getsize(path) if path and os.path.exists(path) else 0
+    mime_type = 'audio/mp4' if sermon.audio_file.name.lower().endswith(('.m4a', '.aac')) else 'audio/mpeg'
+    return base_url + reverse('sermon_audio', args=[sermon.slug]), size, mime_type
+
+
+def write_podcast(directory, base_url):
+    """Write podcast.xml, one item per published sermon with audio. Returns the item count."""
+    sermons = (
+        _sermons()
+        .exclude(audio_file='').exclude(audio_file__isnull=True)
+        .select_related('speaker', 'series')
+        .prefetch_related(Prefetch(
+            'audio_renditions', queryset=AudioRendition.objects.filter(codec='mp3').order_by('-bitrate')
+        ))
+        .only(
+            'slug', 'title', 'description', 'date_preached', 'audio_file', 'audio_duration',
+            'speaker__name', 'series__title',
+        )
+    )
+    feed_url = base_url + reverse('sermon_podcast')
+    count = 0
+    with _Writer(os.path.join(directory, 'podcast.xml')) as out:
+        out.start('rss', {'version': '2.0', 'xmlns:itunes': ITUNES_NS, 'xmlns:atom': ATOM_NS})
+        out.start('channel')
+        out.element('title', settings.PODCAST_TITLE)
+        out.element('link', base_url + reverse('sermon_list'))
+        out.element('description', settings.PODCAST_DESCRIPTION)
+        out.element('language', settings.LANGUAGE_CODE)
+        out.element('lastBuildDate', rfc2822_date(timezone.now()))
+        out.element('atom:link', attrs={'href': feed_url, 'rel': 'self', 'type': 'application/rss+xml'})
+        out.element('itunes:author', settings.PODCAST_AUTHOR)
+        out.element('itunes:image', attrs={'href': base_url + static('core/img/logo_branding.png')})
+        out.element('itunes:category', attrs={'text': 'Religion & Spirituality'})
+        out.element('itunes:explicit', 'false')
+
+        for sermon in sermons.iterator(chunk_size=CHUNK_SIZE):
+            url, size, mime_type = _enclosure(sermon, base_url)
+            link = base_url + reverse('sermon_detail', args=[sermon.slug])
+            out.start('item')
+            out.element('title', sermon.title)
+            out.element('link', link)
+            out.element('guid', link, {'isPermaLink': 'true'})
+            out.element('description', sermon.description)
+            out.element('pubDate', rfc2822_date(timezone.make_aware(datetime.combine(sermon.date_preached, time()))))
+            out.element('enclosure', attrs={'url': url, 'length': str(size), 'type': mime_type})
+            if sermon.speaker:
+                out.element('itunes:author', sermon.speaker.name)
+            if sermon.series:
+                out.element('itunes:subtitle', sermon.series.title)
+            if sermon.audio_duration is not None:
+                out.element('itunes:duration', str(sermon.audio_duration))
+            out.end('item')
+            count += 1
+
+        out.end('channel')
+        out.end('rss')
+    return count
+
+
+WRITERS = {
+    'sitemap': write_sitemap,
+    'podcast': write_podcast,
+}
+
+
+def _read_stamp(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def build(feed, base_url, state=None):
+    """Regenerate `feed` for `base_url` and stamp it. Returns what the writer returns."""
+    directory = site_dir(base_url)
+    os.makedirs(directory, exist_ok=True)
+    state = state or current_state()
+    result = WRITERS[feed](directory, base_url)
+    stamp_path = os.path.join(directory, f'{feed}.state')
+    with open(f'{stamp_path}.tmp', 'w', encoding='utf-8') as f:
+        f.write(state)
+    os.replace(f'{stamp_path}.tmp', stamp_path)
+    return result
+
+
+def ensure(feed, base_url, state=None):
+    """
+    Return the directory holding an up-to-date `feed` for `base_url`,
+    rebuilding it first if sermons changed since it was written. While
+    another process rebuilds, the previous file is served.
+    """
+    directory = site_dir(base_url)
+    state = state or current_state()
+    if _read_stamp(os.path.join(directory, f'{feed}.state')) == state:
+        return directory
+
+    lock_key = f'sermons:feeds:lock:{feed}:{os.path.basename(directory)}'
+    have_file = os.path.exists(os.path.join(directory, f'{feed}.xml'))
+    token = uuid.uuid4().hex
+    acquired = cache.add(lock_key, token, LOCK_TIMEOUT)
+    if not acquired and have_file:
+        return directory
+    try:
+        with _local_lock:
+            if _read_stamp(os.path.join(directory, f'{feed}.state')) != state:
+                build(feed, base_url, state)
+    finally:
+        # Only our own lock: without one (no file yet) or after it expired, another process may hold it
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    return directory
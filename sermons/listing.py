@@ -0,0 +1,65 @@
+"""
+Query helpers for the public sermon listings.
+"""
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Sermon, Topic
+
+# Sermons shown on each topic card in the grouped ("All") view
+LATEST_PER_TOPIC = 4
+
+
+def latest_by_topic(topics, per_topic=LATEST_PER_TOPIC):
+    """
+    Set `latest_sermons` on each topic to its newest `per_topic` published
+    sermons. One ROW_NUMBER() OVER (PARTITION BY topic) query fetches them
+    all with speaker, series and primary topic joined, however many topics
+    there are.
+    """
+    topics = list(topics)
+    links = (
+        Sermon.topics.through.objects
+        .filter(topic__in=topics, sermon__status='published')
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F('topic_id'),
+            order_by=(F('sermon__date_preached').desc(), F('sermon_id').desc()),
+        ))
+        .filter(position__lte=per_topic)
+        .select_related('sermon__speaker', 'sermon__series', 'sermon__primary_topic')
+        .order_by('topic_id', 'position')
+    )
+
+    latest = {}
+    for link in links:
+        latest.setdefault(link.topic_id, []).append(link.sermon)
+
+    for topic in topics:
+        topic.latest_sermons = latest.get(topic.pk, [])
+    return topics
+
+
+def grouped_topics(per_topic=LATEST_PER_TOPIC):
+    """Every topic with its published sermon count and latest sermons."""
+    topics = Topic.objects.annotate(
+        published_count=Count('sermon', filter=Q(sermon__status='published'))
+    )
+    return latest_by_topic(topics, per_topic)
+
+
+def refresh_primary_topics(sermon_ids):
+    """Point each sermon's primary_topic at its first remaining topic, in one UPDATE."""
+    sermon_ids = [sermon_id for sermon_id in sermon_ids if sermon_id]
+    if not sermon_ids:
+        return
+    first_topic = Sermon.topics.through.objects.filter(
+        sermon_id=OuterRef('pk')
+    ).order_by('id').values('topic_id')[:1]
+    # Topic changes alter what the sermon displays, so they count as an update
+    Sermon.objects.filter(pk__in=sermon_ids).update(
+        primary_topic_id=Subquery(first_topic),
+        updated_at=timezone.now()
+    )
@@ -0,0 +1,102 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from sermons import related
+from sermons.passages import replace_passages
+from sermons.models import RelatedSermon, Series, Sermon, Speaker, Topic
+from sermons.scripture import BOOKS
+
+TOPIC_NAMES = (
+    'grace faith hope love mercy forgiveness prayer worship kingdom covenant '
+    'salvation holiness spirit wisdom obedience joy peace gospel family healing'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the related-sermons index: full rebuild, incremental refresh and detail lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sermons', type=int, default=50000, help='Published sermons to generate')
+        parser.add_argument('--refreshes', type=int, default=20, help='Incremental refreshes to time')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Database: {settings.DATABASES["default"]["ENGINE"]}')
+        rng = random.Random(7)
+        # Everything is created inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            ids = self.create_sermons(rng, options['sermons'])
+            self.stdout.write(f'{len(ids):,} published sermons')
+
+            start = time.perf_counter()
+            features = related.load_features()
+            load_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            indexed = related.rebuild()
+            rebuild_seconds = time.perf_counter() - start
+            self.stdout.write(
+                f'  full rebuild   {rebuild_seconds:8.2f} s for {indexed:,} sermons '
+                f'(feature load {load_seconds:.2f} s, {RelatedSermon.objects.count():,} links)'
+            )
+
+            samples = rng.sample(ids, min(options['refreshes'], len(ids)))
+            start = time.perf_counter()
+            affected = sum(related.refresh([pk]) for pk in samples)
+            refresh_ms = (time.perf_counter() - start) / len(samples) * 1000
+            self.stdout.write(
+                f'  refresh 1      {refresh_ms:8.1f} ms per sermon saved '
+                f'({affected / len(samples):.0f} lists recomputed on average)'
+            )
+
+            sermons = list(Sermon.objects.filter(pk__in=samples))
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for sermon in sermons:
+                    related.related_sermons(sermon)
+                lookup_ms = (time.perf_counter() - start) / len(sermons) * 1000
+            self.stdout.write(
+                f'  detail lookup  {lookup_ms:8.2f} ms, {len(queries) // len(sermons)} query per page'
+            )
+            del features
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('\nDone; benchmark data rolled back.'))
+
+    def create_sermons(self, rng, count):
+        speakers = Speaker.objects.bulk_create([Speaker(name=f'Pastor {i}') for i in range(25)])
+        series = Series.objects.bulk_create([
+            Series(title=f'Series {i}', slug=f'bench-related-series-{i}') for i in range(count // 40 + 1)
+        ])
+        topics = Topic.objects.bulk_create([
+            Topic(name=name.title(), slug=f'bench-related-{name}') for name in TOPIC_NAMES
+        ])
+        books = [name for _, name, _ in BOOKS]
+        through = Sermon.topics.through
+        ids = []
+        for start in range(0, count, 2000):
+            batch = []
+            for i in range(start, min(start + 2000, count)):
+                verse = rng.randint(1, 30)
+                batch.append(Sermon(
+                    title=f'Sermon {i}',
+                    slug=f'bench-related-{i}',
+                    speaker=rng.choice(speakers),
+                    # Series run in consecutive blocks, like real preaching series
+                    series=series[i // 40] if rng.random() < 0.7 else None,
+                    date_preached=date(2000, 1, 1) + timedelta(days=i // 3),
+                    scripture_reference=f'{rng.choice(books)} {rng.randint(1, 12)}:{verse}-{verse + rng.randint(0, 10)}',
+                    description='Benchmark sermon',
+                    status='published',
+                ))
+            batch = Sermon.objects.bulk_create(batch)
+            replace_passages('sermon', batch)
+            through.objects.bulk_create([
+                through(sermon_id=sermon.pk, topic_id=topic.pk)
+                for sermon in batch for topic in rng.sample(topics, rng.randint(1, 3))
+            ])
+            ids.extend(sermon.pk for sermon in batch)
+        return ids
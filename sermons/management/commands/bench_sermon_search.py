@@ -0,0 +1,115 @@
+import itertools
+import random
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from sermons import search
+from sermons.models import Series, Sermon, Speaker, Topic
+
+WORDS = (
+    'grace faith hope love mercy forgiveness prayer worship kingdom covenant '
+    'salvation righteousness holiness spirit wisdom obedience repentance joy '
+    'peace patience kindness gospel church family marriage healing provision '
+    'promise calling purpose identity freedom victory rest trust humility glory'
+).split()
+BOOKS = ('Genesis', 'Psalms', 'Proverbs', 'Isaiah', 'Matthew', 'John', 'Acts', 'Romans', 'Ephesians', 'James')
+# Filler prose: a Zipf-distributed vocabulary, so terms are as selective as in real notes
+FILLER = [f'w{i:x}' for i in range(20000)]
+FILLER_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(FILLER) + 1)))
+THEME_RATE = 0.05
+QUERIES = ('grace', 'faith hope', 'forgiv', 'john 3', 'kingdom covenant promise', 'zzzunmatched')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks sermon search (legacy icontains vs full-text index) in milliseconds per query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Sermon counts to measure at')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+        parser.add_argument('--notes-words', type=int, default=150, help='Words of notes per sermon')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Database: {settings.DATABASES["default"]["ENGINE"]}')
+        rng = random.Random(42)
+        # Everything is created inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            speakers = Speaker.objects.bulk_create([Speaker(name=f'Pastor {i}') for i in range(20)])
+            series = Series.objects.bulk_create([
+                Series(title=f'{rng.choice(WORDS).title()} Series {i}', slug=f'bench-series-{i}') for i in range(50)
+            ])
+            topics = Topic.objects.bulk_create([Topic(name=word.title(), slug=f'bench-{word}') for word in WORDS])
+
+            created = 0
+            for size in sorted(options['sizes']):
+                created = self.create_sermons(rng, created, size, speakers, series, topics, options['notes_words'])
+                start = time.perf_counter()
+                search.rebuild_index()
+                index_seconds = time.perf_counter() - start
+                self.stdout.write(f'\n{size:,} published sermons (index rebuilt in {index_seconds:.1f}s)')
+                for query in QUERIES:
+                    legacy = self.measure(self.legacy_page, query, options['repeat'])
+                    ranked = self.measure(self.search_page, query, options['repeat'])
+                    self.stdout.write(
+                        f'  {query!r:28} icontains {legacy:8.1f} ms   full-text {ranked:7.1f} ms'
+                    )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('\nDone; benchmark data rolled back.'))
+
+    def create_sermons(self, rng, created, size, speakers, series, topics, notes_words):
+        through = Sermon.topics.through
+        while created < size:
+            batch = []
+            for i in range(created, min(created + 2000, size)):
+                batch.append(Sermon(
+                    title=' '.join(rng.choices(WORDS, k=4)).title(),
+                    slug=f'bench-sermon-{i}',
+                    speaker=rng.choice(speakers),
+                    series=rng.choice(series),
+                    date_preached=date(2000, 1, 1) + timedelta(days=i % 9000),
+                    scripture_reference=f'{rng.choice(BOOKS)} {rng.randint(1, 20)}:{rng.randint(1, 30)}',
+                    description=self.prose(rng, 25),
+                    notes=f'<p>{self.prose(rng, notes_words)}</p>',
+                    status='published',
+                ))
+            batch = Sermon.objects.bulk_create(batch)
+            through.objects.bulk_create([
+                through(sermon_id=sermon.pk, topic_id=topic.pk)
+                for sermon in batch for topic in rng.sample(topics, 2)
+            ])
+            created += len(batch)
+        return created
+
+    def prose(self, rng, count):
+        words = rng.choices(FILLER, cum_weights=FILLER_WEIGHTS, k=count)
+        for i in range(count):
+            if rng.random() < THEME_RATE:
+                words[i] = rng.choice(WORDS)
+        return ' '.join(words)
+
+    def legacy_page(self, query):
+        """The pre-index SermonListView search: four icontains ORs, newest first."""
+        queryset = Sermon.objects.filter(status='published').filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(speaker__name__icontains=query) |
+            Q(series__title__icontains=query)
+        ).order_by('-date_preached')
+        return queryset.count(), list(queryset[:12])
+
+    def search_page(self, query):
+        queryset = search.search_sermons(Sermon.objects.filter(status='published'), query)
+        page = list(queryset[:12])
+        search.attach_snippets(page, query)
+        return queryset.count(), page
+
+    def measure(self, func, query, repeat):
+        func(query)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(query)
+        return (time.perf_counter() - start) / repeat * 1000
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from sermons import feeds
+
+
+class Command(BaseCommand):
+    help = 'Regenerates the sitemap and podcast feed files for a site root'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', required=True, help='Scheme and host the feeds are served from, e.g. https://example.org')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        urls = feeds.build('sitemap', base_url)
+        episodes = feeds.build('podcast', base_url)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote a sitemap of {urls} URLs and a podcast of {episodes} episodes to {feeds.site_dir(base_url)}.'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Sermon as Article
+from sermons.models import Sermon
+from sermons.passages import BATCH_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = 'Re-parses every sermon and legacy article scripture reference into the passage index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per batch')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        for owner_field, queryset in (('sermon', Sermon.objects.all()), ('article', Article.objects.all())):
+            rows, passages = backfill(owner_field, queryset, batch_size=batch_size)
+            self.stdout.write(f'{queryset.model._meta.label}: {passages} passages from {rows} rows')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sermons.audio_jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Transcodes queued sermon audio and records durations and waveform peaks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.AUDIO_TRANSCODE_WORKERS,
+            help='Pool processes (defaults to AUDIO_TRANSCODE_WORKERS)'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll', type=float, default=5.0, help='Seconds between queue checks')
+
+    def handle(self, *args, **options):
+        completed = run_worker(
+            workers=max(options['workers'], 1),
+            once=options['once'],
+            poll_interval=options['poll'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Processed {completed} audio job(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sermons.related import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the related-sermons index for every published sermon'
+
+    def handle(self, *args, **options):
+        indexed = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed related sermons for {indexed} sermons.'))
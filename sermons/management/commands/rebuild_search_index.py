@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sermons.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index for published sermons'
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write(self.style.WARNING('This database has no full-text backend; search uses icontains.'))
+            return
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} sermons.'))
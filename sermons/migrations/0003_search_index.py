@@ -0,0 +1,97 @@
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# Frozen copy of the sermons.search schema and document builder as of this
+# migration; later changes to that module must not change what it does.
+TABLE = 'sermons_search'
+BATCH_SIZE = 500
+SQLITE_COLUMNS = ('title', 'scripture', 'speaker', 'series', 'topics', 'description', 'notes')
+POSTGRES_PARTS = (
+    ('A', ('title',)),
+    ('B', ('scripture', 'speaker', 'series', 'topics')),
+    ('C', ('description',)),
+    ('D', ('notes',)),
+)
+
+
+def build_document(sermon):
+    series = sermon.series
+    return {
+        'title': sermon.title,
+        'scripture': sermon.scripture_reference,
+        'speaker': sermon.speaker.name if sermon.speaker else '',
+        'series': f'{series.title} {series.description}' if series else '',
+        'topics': ' '.join(topic.name for topic in sermon.topics.all()),
+        'description': sermon.description,
+        'notes': html.unescape(strip_tags(sermon.notes or '')),
+    }
+
+
+def insert_sqlite(cursor, documents):
+    placeholders = ', '.join(['%s'] * (len(SQLITE_COLUMNS) + 1))
+    cursor.executemany(
+        f"INSERT INTO {TABLE} (rowid, {', '.join(SQLITE_COLUMNS)}) VALUES ({placeholders})",
+        [[sermon_id] + [doc[column] for column in SQLITE_COLUMNS] for sermon_id, doc in documents]
+    )
+
+
+def insert_postgres(cursor, documents):
+    vector = ' || '.join(f"setweight(to_tsvector('english', %s), '{weight}')" for weight, _ in POSTGRES_PARTS)
+    rows = []
+    for sermon_id, doc in documents:
+        texts = [' '.join(doc[field] for field in fields) for _, fields in POSTGRES_PARTS]
+        rows.append([sermon_id] + texts + [f"{doc['description']}\n{doc['notes']}"])
+    cursor.executemany(f'INSERT INTO {TABLE} (sermon_id, document, body) VALUES (%s, {vector}, %s)', rows)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                f"{', '.join(SQLITE_COLUMNS)}, tokenize='porter unicode61 remove_diacritics 2')"
+            )
+            insert = insert_sqlite
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+                f'sermon_id bigint PRIMARY KEY, document tsvector NOT NULL, body text NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING GIN (document)')
+            insert = insert_postgres
+        else:
+            # Other databases search with icontains filters
+            return
+
+        Sermon = apps.get_model('sermons', 'Sermon')
+        published = (
+            Sermon.objects.filter(status='published')
+            .select_related('speaker', 'series').prefetch_related('topics').order_by('pk')
+        )
+        last_pk = 0
+        while True:
+            batch = list(published.filter(pk__gt=last_pk)[:BATCH_SIZE])
+            if not batch:
+                break
+            insert(cursor, [(sermon.pk, build_document(sermon)) for sermon in batch])
+            last_pk = batch[-1].pk
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0002_alter_series_image_alter_sermon_audio_file_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_primary_topic(apps, schema_editor):
+    Sermon = apps.get_model('sermons', 'Sermon')
+    first_topic = Sermon.topics.through.objects.filter(
+        sermon_id=OuterRef('pk')
+    ).order_by('id').values('topic_id')[:1]
+    Sermon.objects.update(primary_topic_id=Subquery(first_topic))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sermon',
+            name='primary_topic',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='primary_sermons', to='sermons.topic'),
+        ),
+        migrations.RunPython(backfill_primary_topic, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0004_sermon_primary_topic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sermon',
+            name='audio_duration',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='sermon',
+            name='audio_peaks',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='AudioJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('superseded', 'Superseded')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audio_jobs', to='sermons.sermon')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='sermons_audiojob_queue_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AudioRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(choices=[('opus', 'Opus'), ('mp3', 'MP3')], max_length=10)),
+                ('bitrate', models.PositiveIntegerField(help_text='kbps')),
+                ('file', models.FileField(upload_to='sermons/audio/renditions/')),
+                ('size', models.PositiveIntegerField(default=0, help_text='Bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audio_renditions', to='sermons.sermon')),
+            ],
+            options={
+                'ordering': ['-codec', 'bitrate'],
+                'constraints': [models.UniqueConstraint(fields=('sermon', 'codec', 'bitrate'), name='sermons_rendition_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0006_prerendered_rich_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedSermon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sermons.sermon')),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='sermons.sermon')),
+            ],
+            options={
+                'ordering': ['sermon', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('sermon', 'rank'), name='sermons_related_rank_unique')],
+            },
+        ),
+    ]
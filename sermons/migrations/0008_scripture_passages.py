@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from sermons.passages import backfill
+
+
+def index_passages(apps, schema_editor):
+    ScripturePassage = apps.get_model('sermons', 'ScripturePassage')
+    backfill('sermon', apps.get_model('sermons', 'Sermon').objects.all(), ScripturePassage)
+    backfill('article', apps.get_model('core', 'Sermon').objects.all(), ScripturePassage)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_newslettersubscriber'),
+        ('sermons', '0007_related_sermons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScripturePassage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.CharField(max_length=20)),
+                ('chapter', models.PositiveSmallIntegerField()),
+                ('verse_start', models.PositiveSmallIntegerField()),
+                ('verse_end', models.PositiveSmallIntegerField()),
+                ('article', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='core.sermon')),
+                ('sermon', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='sermons.sermon')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['book', 'chapter', 'verse_start', 'verse_end'], name='sermons_passage_range_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('article__isnull', True), ('sermon__isnull', False)), models.Q(('article__isnull', False), ('sermon__isnull', True)), _connector='OR'), name='sermons_passage_one_owner')],
+            },
+        ),
+        migrations.RunPython(index_passages, migrations.RunPython.noop),
+    ]
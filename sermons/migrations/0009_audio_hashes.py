@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0008_scripture_passages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiorendition',
+            name='file_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of file', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='sermon',
+            name='audio_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of audio_file', max_length=64),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
-from django.utils.text import slugify
 from django_ckeditor_5.fields import CKEditor5Field
+from core import rich_text
+from core.slugs import UniqueSlugMixin, UniqueSlugQuerySet
 from core.validators import validate_file_size, validate_image_size, validate_audio_extension
+from .audio import audio_url
+from .scripture import format_passage
 
 class Speaker(models.Model):
     name = models.CharField(max_length=100)
@@ -12,19 +15,18 @@ class Speaker(models.Model):
     def __str__(self):
         return self.name
 
-class Topic(models.Model):
+class Topic(UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+    slug_source = 'name'
+
+    objects = UniqueSlugQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
-class Series(models.Model):
+class Series(UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField(blank=True)
@@ -32,18 +34,27 @@ class Series(models.Model):
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
 
+    objects = UniqueSlugQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Series"
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return self.title
 
-class Sermon(models.Model):
+class SermonQuerySet(UniqueSlugQuerySet):
+    def published(self):
+        return self.filter(status='published')
+
+    def for_listing(self):
+        """Join what sermon cards and list rows display (speaker, series, primary topic)."""
+        return self.select_related('speaker', 'series', 'primary_topic')
+
+    def with_topics(self):
+        """Also prefetch every topic, for pages that show more than the primary one."""
+        return self.for_listing().prefetch_related('topics')
+
+class Sermon(UniqueSlugMixin, models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
         ('published', 'Published'),
@@ -62,6 +73,8 @@ class Sermon(models.Model):
     series = models.ForeignKey(Series, on_delete=models.SET_NULL, null=True, blank=True, related_name='sermons')
     speaker = models.ForeignKey(Speaker, on_delete=models.SET_NULL, null=True, blank=True)
     topics = models.ManyToManyField(Topic, blank=True)
+    # First topic added, kept in sync from sermons.signals for card display
+    primary_topic = models.ForeignKey(Topic, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='primary_sermons')
     date_preached = models.DateField()
     
     scripture_reference = models.CharField(max_length=200, help_text="e.g. John 3:16-18")
@@ -70,23 +83,164 @@ class Sermon(models.Model):
     sermon_type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='video')
     video_url = models.URLField(blank=True, help_text="YouTube or Vimeo link")
     audio_file = models.FileField(upload_to='sermons/audio/', blank=True, null=True, help_text="Upload MP3", validators=[validate_file_size, validate_audio_extension])
+    # Filled in by the audio worker (sermons.audio_jobs)
+    audio_duration = models.PositiveIntegerField(null=True, blank=True, editable=False, help_text="Seconds")
+    audio_peaks = models.JSONField(default=list, blank=True, editable=False)
+    audio_hash = models.CharField(max_length=64, blank=True, editable=False, help_text="SHA-256 of audio_file")
     
     # Content (Rich Text)
     description = models.TextField(help_text="Short summary for cards")
     notes = CKEditor5Field(blank=True, help_text="Full sermon notes / transcript", config_name='default')
+    # Sanitized notes rendered on save (core.rich_text)
+    notes_html = models.TextField(blank=True, editable=False)
+    notes_hash = models.CharField(max_length=64, blank=True, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Minutes")
     
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SermonQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date_preached']
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
+        kwargs['update_fields'] = rich_text.prerender(
+            self, 'notes', reading_time_field='reading_time', update_fields=kwargs.get('update_fields')
+        )
         super().save(*args, **kwargs)
 
+    @property
+    def audio_stream_url(self):
+        """Range-capable, versioned URL for the audio player."""
+        return audio_url(self)
+
+    @property
+    def audio_duration_display(self):
+        """Duration as m:ss or h:mm:ss, or '' if not yet measured."""
+        if self.audio_duration is None:
+            return ''
+        hours, remainder = divmod(self.audio_duration, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        if hours:
+            return f"{hours}:{minutes:02d}:{seconds:02d}"
+        return f"{minutes}:{seconds:02d}"
+
     def __str__(self):
         return self.title
+
+class RelatedSermon(models.Model):
+    # Precomputed by sermons.related; rank 1 is the closest match
+    sermon = models.ForeignKey(Sermon, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Sermon, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['sermon', 'rank']
+        constraints = [
+            # Also the index the detail page reads through
+            models.UniqueConstraint(fields=['sermon', 'rank'], name='sermons_related_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.sermon} -> {self.related} (#{self.rank})"
+
+class ScripturePassage(models.Model):
+    # Parsed from a scripture reference by sermons.passages; one owner per row
+    sermon = models.ForeignKey(Sermon, on_delete=models.CASCADE, null=True, blank=True, related_name='passages')
+    article = models.ForeignKey('core.Sermon', on_delete=models.CASCADE, null=True, blank=True, related_name='passages')
+    book = models.CharField(max_length=20)
+    chapter = models.PositiveSmallIntegerField()
+    verse_start = models.PositiveSmallIntegerField()
+    verse_end = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['book', 'chapter', 'verse_start', 'verse_end'], name='sermons_passage_range_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(sermon__isnull=False, article__isnull=True) | models.Q(sermon__isnull=True, article__isnull=False),
+                name='sermons_passage_one_owner',
+            ),
+        ]
+
+    @property
+    def chapter_label(self):
+        return format_passage(self.book, self.chapter)
+
+    def __str__(self):
+        return format_passage(self.book, self.chapter, self.verse_start, self.verse_end)
+
+class AudioRendition(models.Model):
+    CODEC_CHOICES = (
+        ('opus', 'Opus'),
+        ('mp3', 'MP3'),
+    )
+
+    MIME_TYPES = {
+        'opus': 'audio/ogg; codecs=opus',
+        'mp3': 'audio/mpeg',
+    }
+
+    sermon = models.ForeignKey(Sermon, on_delete=models.CASCADE, related_name='audio_renditions')
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES)
+    bitrate = models.PositiveIntegerField(help_text="kbps")
+    file = models.FileField(upload_to='sermons/audio/renditions/')
+    size = models.PositiveIntegerField(default=0, help_text="Bytes")
+    file_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of file")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Players try sources in order: compact Opus first, MP3 as the fallback
+        ordering = ['-codec', 'bitrate']
+        constraints = [
+            models.UniqueConstraint(fields=['sermon', 'codec', 'bitrate'], name='sermons_rendition_unique'),
+        ]
+
+    @property
+    def name(self):
+        return f"{self.codec}-{self.bitrate}"
+
+    @property
+    def mime_type(self):
+        return self.MIME_TYPES[self.codec]
+
+    @property
+    def stream_url(self):
+        return audio_url(self.sermon, rendition=self)
+
+    def __str__(self):
+        return f"{self.sermon} ({self.codec} {self.bitrate}k)"
+
+class AudioJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('superseded', 'Superseded'),
+    )
+
+    sermon = models.ForeignKey(Sermon, on_delete=models.CASCADE, related_name='audio_jobs')
+    # audio_file.name when queued; results for an older upload are discarded
+    source_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='sermons_audiojob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Audio job {self.pk} for {self.sermon} ({self.status})"
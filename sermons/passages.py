@@ -0,0 +1,91 @@
+"""
+Indexed scripture passages, for finding sermons by passage.
+
+The free-text `Sermon.scripture_reference` and the legacy
+`core.models.Sermon.scripture_citation` are parsed (sermons.scripture) into
+ScripturePassage rows of (book, chapter, verse_start, verse_end), replaced
+whenever the text changes (sermons.signals). Migration 0008 and
+`manage.py index_scripture_passages` fill the table for existing rows.
+
+Lookups are interval-overlap queries: a passage touches verses a-b of a
+chapter when verse_start <= b and verse_end >= a. The composite index on
+(book, chapter, verse_start, verse_end) narrows that to one chapter's rows
+and the verse bounds are checked within them; a chapter has at most 176
+verses, so no interval tree is needed on top.
+"""
+
+from .models import ScripturePassage, Sermon
+from .scripture import WHOLE_CHAPTER_END, parse_reference
+
+BATCH_SIZE = 1000
+
+# Owner field on ScripturePassage -> reference field on the owner
+REFERENCE_FIELDS = {
+    'sermon': 'scripture_reference',  # sermons.Sermon
+    'article': 'scripture_citation',  # core.models.Sermon (legacy articles)
+}
+
+
+def passage_rows(owner_field, owner_id, reference, passage_model=ScripturePassage):
+    return [
+        passage_model(**{f'{owner_field}_id': owner_id}, book=passage.book, chapter=passage.chapter,
+                      verse_start=passage.verse_start, verse_end=passage.verse_end)
+        for passage in parse_reference(reference)
+    ]
+
+
+def replace_passages(owner_field, instances, passage_model=ScripturePassage):
+    """Re-parse the references of `instances` (all of one source) and replace their rows."""
+    reference_field = REFERENCE_FIELDS[owner_field]
+    instances = [instance for instance in instances if instance.pk]
+    if not instances:
+        return 0
+    passage_model.objects.filter(**{f'{owner_field}_id__in': [instance.pk for instance in instances]}).delete()
+    rows = []
+    for instance in instances:
+        rows.extend(passage_rows(owner_field, instance.pk, getattr(instance, reference_field), passage_model))
+    passage_model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def backfill(owner_field, queryset, passage_model=ScripturePassage, batch_size=BATCH_SIZE):
+    """Re-index every row of `queryset` in keyset-paginated batches. Returns (rows, passages)."""
+    reference_field = REFERENCE_FIELDS[owner_field]
+    rows = passages = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk').only('pk', reference_field)[:batch_size])
+        if not batch:
+            break
+        passages += replace_passages(owner_field, batch, passage_model)
+        rows += len(batch)
+        last_pk = batch[-1].pk
+    return rows, passages
+
+
+def overlapping(book, chapter, verse_start=None, verse_end=None):
+    """Passage rows touching `book` `chapter` (optionally only verses start-end)."""
+    if verse_start is None:
+        verse_start, verse_end = 1, WHOLE_CHAPTER_END
+    elif verse_end is None:
+        verse_end = verse_start
+    return ScripturePassage.objects.filter(
+        book=book, chapter=chapter, verse_start__lte=verse_end, verse_end__gte=verse_start
+    )
+
+
+def sermons_for_passage(book, chapter, verse_start=None, verse_end=None, queryset=None):
+    """Sermons (published, by default) with a passage overlapping the given one."""
+    if queryset is None:
+        queryset = Sermon.objects.published()
+    matches = overlapping(book, chapter, verse_start, verse_end).filter(sermon__isnull=False)
+    return queryset.filter(pk__in=matches.values('sermon_id'))
+
+
+def articles_for_passage(book, chapter, verse_start=None, verse_end=None):
+    """Legacy core.models.Sermon articles citing an overlapping passage."""
+    from core.models import Sermon as Article
+
+    matches = overlapping(book, chapter, verse_start, verse_end).filter(article__isnull=False)
+    return Article.objects.filter(pk__in=matches.values('article_id'))
+
@@ -0,0 +1,263 @@
+"""
+Precomputed related-sermons index.
+
+Each published sermon keeps its TOP_K most related published sermons in
+the RelatedSermon table, so the detail page reads them with one indexed
+query. Relatedness is scored on:
+
+- shared topics (per topic), the same series and the same speaker;
+- overlapping scripture passages, or failing that a shared chapter
+  (the parsed passages kept by sermons.passages).
+
+Candidates come from posting lists (one per topic, series, speaker and
+chapter) sorted by date. Only the WINDOW sermons nearest in date on each
+side are considered from each list, so a speaker with thousands of sermons
+does not make the build quadratic; closer dates also win ties.
+
+`rebuild()` recomputes everything (`manage.py rebuild_related_sermons`).
+Saving a sermon calls `schedule_refresh()`, which after commit recomputes
+the sermon, the sermons it could now appear for, and the ones that listed
+it before. A refresh loads the features of every published sermon, so in
+the ASGI process it runs on a background thread (core.scheduler, every
+RELATED_REFRESH_INTERVAL seconds and as soon as a change commits), batching
+the changes committed meanwhile. Elsewhere (management commands, tests) it
+runs at commit. Changes still queued when the process stops are only
+picked up by the next rebuild.
+"""
+
+import heapq
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from core.page_cache import invalidate
+from core.scheduler import start_periodic
+from .models import RelatedSermon, ScripturePassage, Sermon
+from .scripture import Passage
+
+TOP_K = 6
+WINDOW = 25
+INSERT_BATCH_SIZE = 5000
+
+WEIGHTS = {
+    'topic': 3.0,
+    'series': 4.0,
+    'speaker': 1.0,
+    'passage': 5.0,
+    'chapter': 2.0,
+}
+
+Features = namedtuple('Features', 'date series speaker topics passages chapters')
+
+logger = logging.getLogger(__name__)
+
+# Committed changes waiting for the background thread, if it is running
+_pending = set()
+_pending_lock = threading.Lock()
+_wake = threading.Event()
+_worker = None
+
+
+def load_features():
+    """Features of every published sermon, keyed by id (three queries)."""
+    topics = defaultdict(set)
+    links = Sermon.topics.through.objects.filter(sermon__status='published').values_list('sermon_id', 'topic_id')
+    for sermon_id, topic_id in links.iterator(chunk_size=INSERT_BATCH_SIZE):
+        topics[sermon_id].add(topic_id)
+
+    sermon_passages = defaultdict(list)
+    rows = ScripturePassage.objects.filter(sermon__status='published').values_list(
+        'sermon_id', 'book', 'chapter', 'verse_start', 'verse_end'
+    )
+    for sermon_id, *passage in rows.iterator(chunk_size=INSERT_BATCH_SIZE):
+        sermon_passages[sermon_id].append(Passage(*passage))
+
+    features = {}
+    rows = Sermon.objects.published().values_list('pk', 'date_preached', 'series_id', 'speaker_id')
+    for pk, date_preached, series_id, speaker_id in rows.iterator(chunk_size=INSERT_BATCH_SIZE):
+        passages = tuple(sermon_passages.get(pk, ()))
+        features[pk] = Features(
+            date=date_preached.toordinal(),
+            series=series_id,
+            speaker=speaker_id,
+            topics=frozenset(topics.get(pk, ())),
+            passages=passages,
+            chapters=frozenset((p.book, p.chapter) for p in passages),
+        )
+    return features
+
+
+def _keys(features):
+    keys = [('topic', topic_id) for topic_id in features.topics]
+    keys.extend(('chapter',) + chapter for chapter in features.chapters)
+    if features.series:
+        keys.append(('series', features.series))
+    if features.speaker:
+        keys.append(('speaker', features.speaker))
+    return keys
+
+
+def build_postings(features):
+    """Map each feature key to its sermons as a date-sorted list of (date, id)."""
+    postings = defaultdict(list)
+    for pk, feature in features.items():
+        for key in _keys(feature):
+            postings[key].append((feature.date, pk))
+    for posting in postings.values():
+        posting.sort()
+    return postings
+
+
+def candidates(pk, features, postings):
+    """Sermons within WINDOW places of `pk` in any of its posting lists."""
+    feature = features[pk]
+    found = set()
+    for key in _keys(feature):
+        posting = postings[key]
+        position = bisect_left(posting, (feature.date, pk))
+        found.update(other for _, other in posting[max(position - WINDOW, 0):position + WINDOW + 1])
+    found.discard(pk)
+    return found
+
+
+def score(first, second):
+    total = WEIGHTS['topic'] * len(first.topics & second.topics)
+    if first.series and first.series == second.series:
+        total += WEIGHTS['series']
+    if first.speaker and first.speaker == second.speaker:
+        total += WEIGHTS['speaker']
+    if first.chapters & second.chapters:
+        overlapping = any(
+            a.book == b.book and a.chapter == b.chapter
+            and a.verse_start <= b.verse_end and b.verse_start <= a.verse_end
+            for a in first.passages for b in second.passages
+        )
+        total += WEIGHTS['passage'] if overlapping else WEIGHTS['chapter']
+    return total
+
+
+def neighbours(pk, features, postings, k=TOP_K):
+    """The `k` best (score, related id) for a sermon, best first."""
+    feature = features[pk]
+    ranked = heapq.nsmallest(k, (
+        (-score(feature, features[other]), abs(features[other].date - feature.date), -other, other)
+        for other in candidates(pk, features, postings)
+    ))
+    return [(-negative_score, other) for negative_score, _, _, other in ranked if negative_score < 0]
+
+
+def _rows(sermon_ids, features, postings):
+    for pk in sermon_ids:
+        for rank, (value, other) in enumerate(neighbours(pk, features, postings), start=1):
+            yield RelatedSermon(sermon_id=pk, related_id=other, rank=rank, score=value)
+
+
+def _write(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            RelatedSermon.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        RelatedSermon.objects.bulk_create(batch)
+
+
+def _invalidate_pages():
+    # bulk_create and queryset deletes send no signals
+    invalidate(RelatedSermon)
+
+
+def rebuild():
+    """Recompute the whole index. Returns the number of sermons indexed."""
+    features = load_features()
+    postings = build_postings(features)
+    with transaction.atomic():
+        RelatedSermon.objects.all().delete()
+        _write(_rows(sorted(features), features, postings))
+    _invalidate_pages()
+    return len(features)
+
+
+def refresh(sermon_ids):
+    """Recompute the sermons in `sermon_ids` and every list they can affect."""
+    sermon_ids = {pk for pk in sermon_ids if pk}
+    if not sermon_ids:
+        return 0
+    features = load_features()
+    postings = build_postings(features)
+    affected = set(sermon_ids)
+    for pk in sermon_ids & features.keys():
+        affected |= candidates(pk, features, postings)
+    affected.update(RelatedSermon.objects.filter(related_id__in=sermon_ids).values_list('sermon_id', flat=True))
+    with transaction.atomic():
+        RelatedSermon.objects.filter(sermon_id__in=affected).delete()
+        _write(_rows(sorted(affected & features.keys()), features, postings))
+    _invalidate_pages()
+    return len(affected)
+
+
+def _flush():
+    with _pending_lock:
+        sermon_ids = set(_pending)
+        _pending.clear()
+    if not sermon_ids:
+        return
+    try:
+        affected = refresh(sermon_ids)
+    except Exception as e:
+        with _pending_lock:
+            _pending.update(sermon_ids)
+        if not isinstance(e, IntegrityError):
+            # Retried on the next run
+            raise
+        # A sermon was deleted while its neighbours were being written; the
+        # deletion queued its own refresh, so try again with both at once
+        logger.info("Related sermons changed during a refresh, retrying")
+        _wake.set()
+        return
+    logger.info("Refreshed related sermons for %s sermon(s)", affected)
+
+
+def _committed(sermon_ids):
+    if _worker is None:
+        refresh(sermon_ids)
+        return
+    with _pending_lock:
+        _pending.update(sermon_ids)
+    _wake.set()
+
+
+def schedule_refresh(sermon_ids):
+    """Refresh these sermons once the current transaction commits (see the module docstring)."""
+    sermon_ids = [pk for pk in sermon_ids if pk]
+    if not sermon_ids:
+        return
+    # Each callback carries its own ids, so a rolled-back transaction queues nothing
+    transaction.on_commit(lambda: _committed(sermon_ids))
+
+
+def start_scheduler():
+    """
+    Refresh related sermons on a daemon thread (core.scheduler) as changes
+    commit, instead of at commit. Does nothing when RELATED_REFRESH_INTERVAL is 0.
+    """
+    global _worker
+    interval = getattr(settings, 'RELATED_REFRESH_INTERVAL', 0)
+    _worker = start_periodic('related-sermons', interval, _flush, wake=_wake)
+    return _worker
+
+
+def related_sermons(sermon):
+    """The precomputed related sermons of `sermon`, best first, in one query."""
+    links = (
+        RelatedSermon.objects
+        .filter(sermon=sermon, related__status='published')
+        .select_related('related__speaker', 'related__series', 'related__primary_topic')
+        .order_by('rank')
+    )
+    return [link.related for link in links]
@@ -0,0 +1,206 @@
+"""
+Parse free-text scripture references ("John 3:16-18", "1 Cor. 13",
+"Romans 8:28; 12:1-2", "Genesis 1:1-2:3") into passages.
+
+A passage is (book slug, chapter, first verse, last verse). A whole chapter
+runs from verse 1 to WHOLE_CHAPTER_END, and a range that crosses chapters
+becomes one passage per chapter. Parts that can't be read are skipped.
+"""
+
+import re
+from collections import namedtuple
+
+Passage = namedtuple('Passage', 'book chapter verse_start verse_end')
+
+# Greater than the longest chapter (Psalm 119, 176 verses)
+WHOLE_CHAPTER_END = 999
+# Passages kept per reference ("Psalms 1-150" is not a sermon text)
+MAX_PASSAGES = 50
+
+# (slug, display name, extra abbreviations). Slugs and names also match.
+BOOKS = (
+    ('genesis', 'Genesis', ('gen', 'ge', 'gn')),
+    ('exodus', 'Exodus', ('exod', 'exo', 'ex')),
+    ('leviticus', 'Leviticus', ('lev', 'le', 'lv')),
+    ('numbers', 'Numbers', ('num', 'nu', 'nm')),
+    ('deuteronomy', 'Deuteronomy', ('deut', 'deu', 'dt')),
+    ('joshua', 'Joshua', ('josh', 'jos')),
+    ('judges', 'Judges', ('judg', 'jdg')),
+    ('ruth', 'Ruth', ('ru', 'rth')),
+    ('1-samuel', '1 Samuel', ('1sam', '1sa')),
+    ('2-samuel', '2 Samuel', ('2sam', '2sa')),
+    ('1-kings', '1 Kings', ('1kgs', '1ki', '1kin')),
+    ('2-kings', '2 Kings', ('2kgs', '2ki', '2kin')),
+    ('1-chronicles', '1 Chronicles', ('1chron', '1chr', '1ch')),
+    ('2-chronicles', '2 Chronicles', ('2chron', '2chr', '2ch')),
+    ('ezra', 'Ezra', ('ezr',)),
+    ('nehemiah', 'Nehemiah', ('neh', 'ne')),
+    ('esther', 'Esther', ('esth', 'est')),
+    ('job', 'Job', ('jb',)),
+    ('psalms', 'Psalms', ('psalm', 'ps', 'psa', 'pss')),
+    ('proverbs', 'Proverbs', ('prov', 'pro', 'prv', 'pr')),
+    ('ecclesiastes', 'Ecclesiastes', ('eccl', 'eccles', 'ecc', 'qoh')),
+    ('song-of-solomon', 'Song of Solomon', ('songofsongs', 'song', 'sos', 'canticles')),
+    ('isaiah', 'Isaiah', ('isa', 'is')),
+    ('jeremiah', 'Jeremiah', ('jer', 'je')),
+    ('lamentations', 'Lamentations', ('lam', 'la')),
+    ('ezekiel', 'Ezekiel', ('ezek', 'eze', 'ezk')),
+    ('daniel', 'Daniel', ('dan', 'da', 'dn')),
+    ('hosea', 'Hosea', ('hos', 'ho')),
+    ('joel', 'Joel', ('jl',)),
+    ('amos', 'Amos', ('am',)),
+    ('obadiah', 'Obadiah', ('obad', 'ob')),
+    ('jonah', 'Jonah', ('jon', 'jnh')),
+    ('micah', 'Micah', ('mic', 'mc')),
+    ('nahum', 'Nahum', ('nah', 'na')),
+    ('habakkuk', 'Habakkuk', ('hab', 'hb')),
+    ('zephaniah', 'Zephaniah', ('zeph', 'zep')),
+    ('haggai', 'Haggai', ('hag', 'hg')),
+    ('zechariah', 'Zechariah', ('zech', 'zec')),
+    ('malachi', 'Malachi', ('mal', 'ml')),
+    ('matthew', 'Matthew', ('matt', 'mat', 'mt')),
+    ('mark', 'Mark', ('mrk', 'mk', 'mr')),
+    ('luke', 'Luke', ('luk', 'lk')),
+    ('john', 'John', ('jhn', 'jn')),
+    ('acts', 'Acts', ('act', 'ac')),
+    ('romans', 'Romans', ('rom', 'ro', 'rm')),
+    ('1-corinthians', '1 Corinthians', ('1cor', '1co')),
+    ('2-corinthians', '2 Corinthians', ('2cor', '2co')),
+    ('galatians', 'Galatians', ('gal', 'ga')),
+    ('ephesians', 'Ephesians', ('eph', 'ephes')),
+    ('philippians', 'Philippians', ('phil', 'php', 'pp')),
+    ('colossians', 'Colossians', ('col', 'co')),
+    ('1-thessalonians', '1 Thessalonians', ('1thess', '1thes', '1th')),
+    ('2-thessalonians', '2 Thessalonians', ('2thess', '2thes', '2th')),
+    ('1-timothy', '1 Timothy', ('1tim', '1ti')),
+    ('2-timothy', '2 Timothy', ('2tim', '2ti')),
+    ('titus', 'Titus', ('tit', 'ti')),
+    ('philemon', 'Philemon', ('philem', 'phm', 'pm')),
+    ('hebrews', 'Hebrews', ('heb',)),
+    ('james', 'James', ('jas', 'jm')),
+    ('1-peter', '1 Peter', ('1pet', '1pe', '1pt')),
+    ('2-peter', '2 Peter', ('2pet', '2pe', '2pt')),
+    ('1-john', '1 John', ('1jn', '1jo', '1jhn')),
+    ('2-john', '2 John', ('2jn', '2jo', '2jhn')),
+    ('3-john', '3 John', ('3jn', '3jo', '3jhn')),
+    ('jude', 'Jude', ('jud', 'jd')),
+    ('revelation', 'Revelation', ('rev', 're', 'revelations')),
+)
+
+# Books with one chapter, where "Jude 3" means verse 3
+SINGLE_CHAPTER_BOOKS = {'obadiah', 'philemon', '2-john', '3-john', 'jude'}
+
+BOOK_NAMES = {slug: name for slug, name, _ in BOOKS}
+BOOK_ORDER = {slug: position for position, (slug, _, _) in enumerate(BOOKS)}
+
+
+def _key(text):
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+_ALIASES = {}
+for _slug, _name, _abbreviations in BOOKS:
+    for _alias in (_slug, _name) + _abbreviations:
+        _ALIASES[_key(_alias)] = _slug
+
+ORDINALS = {'i': '1', 'ii': '2', 'iii': '3', 'first': '1', 'second': '2', 'third': '3', '1st': '1', '2nd': '2', '3rd': '3'}
+
+# An optional book name, then chapter/verse text up to the next book or ';'
+SEGMENT_RE = re.compile(
+    r'(?P<book>(?:(?:[123]|i{1,3}|first|second|third|1st|2nd|3rd)\s*)?[a-z][a-z .]*?)?\s*'
+    r'(?P<numbers>\d[\d\s:.,\-–—abc]*)',
+    re.IGNORECASE
+)
+RANGE_RE = re.compile(r'^(\d+)(?:[:.](\d+))?[abc]?(?:\s*[-–—]\s*(\d+)(?:[:.](\d+))?[abc]?)?$')
+
+
+def book_slug(name):
+    """Canonical slug for a book name or abbreviation, or None."""
+    words = name.lower().replace('.', ' ').split()
+    if words and words[0] in ORDINALS:
+        words[0] = ORDINALS[words[0]]
+    return _ALIASES.get(_key(''.join(words)))
+
+
+def _chapter_range(book, first, last):
+    last = min(last, first + MAX_PASSAGES - 1)
+    return [Passage(book, chapter, 1, WHOLE_CHAPTER_END) for chapter in range(first, last + 1)]
+
+
+def _parse_numbers(book, text, chapter):
+    """Passages for "3:16-18, 20" style text; `chapter` carries over between parts."""
+    passages = []
+    single = book in SINGLE_CHAPTER_BOOKS
+    for part in text.split(','):
+        match = RANGE_RE.match(part.strip().rstrip('.'))
+        if not match:
+            continue
+        a, b, c, d = (int(group) if group else None for group in match.groups())
+        if b is None and single:
+            # "Jude 3-5": verses of chapter 1
+            chapter = 1
+            passages.append(Passage(book, 1, a, c or a))
+        elif b is None and chapter is None:
+            # "23" or "1-3": whole chapters
+            passages.extend(_chapter_range(book, a, c or a))
+        elif b is None:
+            # A bare number after "3:16," is another verse of that chapter
+            passages.append(Passage(book, chapter, a, c or a))
+        elif d is not None:
+            # "1:1-2:3" crosses chapters
+            if c < a or (c == a and d < b):
+                continue
+            if c == a:
+                passages.append(Passage(book, a, b, d))
+            else:
+                passages.append(Passage(book, a, b, WHOLE_CHAPTER_END))
+                passages.extend(_chapter_range(book, a + 1, c - 1))
+                passages.append(Passage(book, c, 1, d))
+            chapter = c
+        else:
+            chapter = a
+            if c is not None and c < b:
+                continue
+            passages.append(Passage(book, a, b, c or b))
+    return passages, chapter
+
+
+def parse_reference(reference):
+    """Return the distinct passages in a free-text reference, in reading order."""
+    passages = []
+    book = None
+    for section in (reference or '').split(';'):
+        chapter = None
+        for match in SEGMENT_RE.finditer(section):
+            name = (match.group('book') or '').strip(' .')
+            if name:
+                slug = book_slug(name)
+                if slug is None:
+                    # Unknown book name: skip its numbers rather than misfile them
+                    book = None
+                    continue
+                if slug != book:
+                    book, chapter = slug, None
+            if book is None:
+                continue
+            found, chapter = _parse_numbers(book, match.group('numbers'), chapter)
+            passages.extend(found)
+    return list(dict.fromkeys(passages))[:MAX_PASSAGES]
+
+
+def format_passage(book, chapter, verse_start=None, verse_end=None):
+    """Human-readable form, e.g. "John 3:16-18" or "Psalms 23"."""
+    text = f'{BOOK_NAMES.get(book, book)} {chapter}'
+    if verse_start and verse_start != 1 or verse_end and verse_end != WHOLE_CHAPTER_END:
+        text += f':{verse_start}'
+        if verse_end and verse_end != verse_start:
+            text += f'-{verse_end}'
+    return text
+
+
+def overlaps(first, second):
+    """Whether two passages share a verse."""
+    return (
+        first.book == second.book and first.chapter == second.chapter
+        and first.verse_start <= second.verse_end and second.verse_start <= first.verse_end
+    )
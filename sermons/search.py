@@ -0,0 +1,322 @@
+"""
+Full-text search over published sermons.
+
+Each published sermon has one document in the `sermons_search` table,
+built from its title, scripture reference, speaker, series, topics,
+description and notes (HTML stripped). The table is created by migration
+0003 and depends on the database:
+
+- SQLite: an FTS5 virtual table (porter stemming), ranked with bm25() and
+  highlighted with snippet().
+- PostgreSQL: a weighted tsvector column with a GIN index, ranked with
+  ts_rank_cd() and highlighted with ts_headline().
+
+On other databases `get_backend()` returns None and search falls back to
+icontains filters.
+
+Documents are refreshed incrementally from the signals in sermons.signals
+whenever a sermon, or a speaker, series or topic it uses, changes.
+`manage.py rebuild_search_index` rebuilds the whole table.
+"""
+
+import html
+import re
+
+from django.db import connection as default_connection
+from django.db.models import IntegerField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+# Relevance-ordered searches return at most this many sermons
+SEARCH_MAX_RESULTS = 500
+INDEX_BATCH_SIZE = 500
+MAX_TERMS = 10
+
+# Highlight markers; private-use characters never occur in sermon text
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def parse_terms(query):
+    """Split a visitor's query into plain word terms (no operators survive)."""
+    return TERM_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+def _text(value):
+    return html.unescape(strip_tags(value or ''))
+
+
+def build_document(sermon):
+    """Return the searchable text of a sermon, grouped by field weight."""
+    series = sermon.series
+    return {
+        'title': sermon.title,
+        'scripture': sermon.scripture_reference,
+        'speaker': sermon.speaker.name if sermon.speaker else '',
+        'series': f'{series.title} {series.description}' if series else '',
+        'topics': ' '.join(topic.name for topic in sermon.topics.all()),
+        'description': sermon.description,
+        'notes': _text(sermon.notes),
+    }
+
+
+class SqliteSearchBackend:
+    table = 'sermons_search'
+    columns = ('title', 'scripture', 'speaker', 'series', 'topics', 'description', 'notes')
+    # bm25() weights, one per column above
+    weights = (10.0, 6.0, 5.0, 4.0, 4.0, 2.0, 1.0)
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            f"{', '.join(self.columns)}, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+
+    def remove(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', list(ids))
+
+    def insert(self, cursor, documents):
+        placeholders = ', '.join(['%s'] * (len(self.columns) + 1))
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) VALUES ({placeholders})",
+            [[sermon_id] + [doc[column] for column in self.columns] for sermon_id, doc in documents]
+        )
+
+    def match(self, terms):
+        # Quoted terms are literals to FTS5; the last one also matches as a prefix
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def matching_sql(self, terms):
+        return f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [self.match(terms)]
+
+    def ranked_ids(self, cursor, terms, limit, within):
+        weights = ', '.join(str(weight) for weight in self.weights)
+        within_sql, within_params = within
+        cursor.execute(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s AND rowid IN ({within_sql}) '
+            f'ORDER BY bm25({self.table}, {weights}) LIMIT %s',
+            [self.match(terms), *within_params, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def order_by_rank(self, ids):
+        # Position of the id in ",id1,id2,...," is a sort key in rank order
+        return RawSQL(
+            """instr(%s, ',' || "sermons_sermon"."id" || ',')""",
+            [f",{','.join(str(pk) for pk in ids)},"],
+            output_field=IntegerField()
+        )
+
+    def snippets(self, cursor, terms, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(
+            f"SELECT rowid, snippet({self.table}, -1, %s, %s, '…', 24) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid IN ({placeholders})",
+            [MARK_START, MARK_END, self.match(terms)] + list(ids)
+        )
+        return dict(cursor.fetchall())
+
+
+class PostgresSearchBackend:
+    table = 'sermons_search'
+    config = 'english'
+    # Document parts and their tsvector weights
+    parts = (
+        ('A', ('title',)),
+        ('B', ('scripture', 'speaker', 'series', 'topics')),
+        ('C', ('description',)),
+        ('D', ('notes',)),
+    )
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            f'sermon_id bigint PRIMARY KEY, document tsvector NOT NULL, body text NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {self.table}_document_idx ON {self.table} USING GIN (document)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {self.table}')
+
+    def remove(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {self.table} WHERE sermon_id = ANY(%s)', [list(ids)])
+
+    def insert(self, cursor, documents):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{weight}')" for weight, _ in self.parts
+        )
+        rows = []
+        for sermon_id, doc in documents:
+            texts = [' '.join(doc[field] for field in fields) for _, fields in self.parts]
+            rows.append([sermon_id] + texts + [f"{doc['description']}\n{doc['notes']}"])
+        cursor.executemany(
+            f'INSERT INTO {self.table} (sermon_id, document, body) VALUES (%s, {vector}, %s)',
+            rows
+        )
+
+    def match(self, terms):
+        return ' & '.join(terms) + ':*'
+
+    def matching_sql(self, terms):
+        return (
+            f"SELECT sermon_id FROM {self.table} WHERE document @@ to_tsquery('{self.config}', %s)",
+            [self.match(terms)]
+        )
+
+    def ranked_ids(self, cursor, terms, limit, within):
+        within_sql, within_params = within
+        cursor.execute(
+            f"SELECT sermon_id FROM {self.table}, to_tsquery('{self.config}', %s) query "
+            f"WHERE document @@ query AND sermon_id IN ({within_sql}) "
+            f"ORDER BY ts_rank_cd(document, query) DESC LIMIT %s",
+            [self.match(terms), *within_params, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def order_by_rank(self, ids):
+        return RawSQL(
+            'array_position(%s::bigint[], "sermons_sermon"."id")',
+            [list(ids)],
+            output_field=IntegerField()
+        )
+
+    def snippets(self, cursor, terms, ids):
+        cursor.execute(
+            f"SELECT sermon_id, ts_headline('{self.config}', body, to_tsquery('{self.config}', %s), %s) "
+            f"FROM {self.table} WHERE sermon_id = ANY(%s)",
+            [self.match(terms), f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=30, MinWords=15',
+             list(ids)]
+        )
+        return dict(cursor.fetchall())
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    """Return the search backend for a connection, or None if unsupported."""
+    backend_class = BACKENDS.get((connection or default_connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def index_queryset(queryset, connection=None, remove_ids=()):
+    """
+    Replace the documents of `remove_ids` with documents for every sermon in
+    `queryset`, in batches. Callers pass only sermons that should be searchable.
+    """
+    connection = connection or default_connection
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+    queryset = queryset.select_related('speaker', 'series').prefetch_related('topics').order_by('pk')
+    remove_ids = list(remove_ids)
+    indexed = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(remove_ids), INDEX_BATCH_SIZE):
+            backend.remove(cursor, remove_ids[start:start + INDEX_BATCH_SIZE])
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:INDEX_BATCH_SIZE])
+            if not batch:
+                break
+            backend.insert(cursor, [(sermon.pk, build_document(sermon)) for sermon in batch])
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+    return indexed
+
+
+def index_sermons(sermon_ids):
+    """Refresh the documents of the given sermons (drafts and deleted ones drop out)."""
+    from .models import Sermon
+
+    sermon_ids = {sermon_id for sermon_id in sermon_ids if sermon_id}
+    if not sermon_ids:
+        return 0
+    return index_queryset(
+        Sermon.objects.filter(pk__in=sermon_ids, status='published'),
+        remove_ids=sermon_ids
+    )
+
+
+def rebuild_index():
+    """Rebuild every document from scratch. Returns the number indexed."""
+    from .models import Sermon
+
+    backend = get_backend()
+    if backend is None:
+        return 0
+    with default_connection.cursor() as cursor:
+        backend.clear(cursor)
+    return index_queryset(Sermon.objects.filter(status='published'))
+
+
+def search_sermons(queryset, query, ranked=True):
+    """
+    Narrow a Sermon queryset to matches for `query`. With `ranked`, the best
+    SEARCH_MAX_RESULTS matches within the queryset (so after the caller's
+    filters) are returned in relevance order; otherwise all matches are
+    returned and the caller orders them.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return queryset
+    backend = get_backend()
+    if backend is None:
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(scripture_reference__icontains=query) |
+            Q(speaker__name__icontains=query) |
+            Q(series__title__icontains=query)
+        )
+
+    if not ranked:
+        sql, params = backend.matching_sql(terms)
+        return queryset.filter(pk__in=RawSQL(sql, params))
+
+    within = queryset.order_by().values('pk').query.sql_with_params()
+    with default_connection.cursor() as cursor:
+        ids = backend.ranked_ids(cursor, terms, SEARCH_MAX_RESULTS, within)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(backend.order_by_rank(ids))
+
+
+def highlight(snippet):
+    """Escape a raw snippet and turn the match markers into <mark> tags."""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    )
+
+
+def attach_snippets(sermons, query):
+    """Set `search_snippet` on each sermon to a highlighted excerpt of its match."""
+    terms = parse_terms(query)
+    backend = get_backend()
+    if not sermons or not terms or backend is None:
+        return
+    with default_connection.cursor() as cursor:
+        snippets = backend.snippets(cursor, terms, [sermon.pk for sermon in sermons])
+    for sermon in sermons:
+        if sermon.pk in snippets:
+            sermon.search_snippet = highlight(snippets[sermon.pk])
@@ -0,0 +1,109 @@
+"""
+Keep derived sermon data in step: the full-text search index (sermons.search),
+each sermon's denormalized primary_topic (sermons.listing), the related-sermons
+index (sermons.related), parsed scripture passages (sermons.passages) and the
+files of deleted audio renditions (sermons.audio_jobs).
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import Sermon as Article
+
+from . import search
+from .listing import refresh_primary_topics
+from .models import AudioRendition, RelatedSermon, Series, Sermon, Speaker, Topic
+from .passages import replace_passages
+from .related import schedule_refresh
+
+# Sermon fields the related-sermons scores use (topics are handled separately)
+RELATED_FIELDS = {'status', 'date_preached', 'series', 'speaker', 'scripture_reference'}
+
+
+def _reindex_on_commit(sermon_ids):
+    sermon_ids = list(sermon_ids)
+    if sermon_ids:
+        transaction.on_commit(lambda: search.index_sermons(sermon_ids))
+
+
+def _topics_changed_on_commit(sermon_ids):
+    sermon_ids = list(sermon_ids)
+    if sermon_ids:
+        transaction.on_commit(lambda: refresh_primary_topics(sermon_ids))
+        _reindex_on_commit(sermon_ids)
+        schedule_refresh(sermon_ids)
+
+
+@receiver(post_save, sender=Sermon)
+@receiver(post_delete, sender=Sermon)
+def sermon_changed(sender, instance, update_fields=None, **kwargs):
+    _reindex_on_commit([instance.pk])
+    if update_fields is None or RELATED_FIELDS & set(update_fields):
+        schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Sermon)
+def sermon_reference_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'scripture_reference' in update_fields:
+        replace_passages('sermon', [instance])
+
+
+@receiver(post_save, sender=Article)
+def article_citation_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'scripture_citation' in update_fields:
+        replace_passages('article', [instance])
+
+
+@receiver(pre_delete, sender=Sermon)
+def sermon_deleting(sender, instance, **kwargs):
+    # Their links to this sermon go with it; recompute their lists afterwards
+    schedule_refresh(RelatedSermon.objects.filter(related=instance).values_list('sermon_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Sermon.topics.through)
+def sermon_topics_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _topics_changed_on_commit([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _topics_changed_on_commit(pk_set)
+    elif action == 'pre_clear':
+        # Collected before the links go; refreshed once the clear has committed
+        _topics_changed_on_commit(instance.sermon_set.values_list('pk', flat=True))
+
+
+def _related_sermon_ids(instance):
+    if isinstance(instance, Topic):
+        return Sermon.objects.filter(topics=instance).values_list('pk', flat=True)
+    if isinstance(instance, Series):
+        return Sermon.objects.filter(series=instance).values_list('pk', flat=True)
+    return Sermon.objects.filter(speaker=instance).values_list('pk', flat=True)
+
+
+@receiver(post_save, sender=Speaker)
+@receiver(post_save, sender=Series)
+@receiver(post_save, sender=Topic)
+@receiver(pre_delete, sender=Speaker)
+@receiver(pre_delete, sender=Series)
+@receiver(pre_delete, sender=Topic)
+def related_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    if isinstance(instance, Topic) and kwargs['signal'] is pre_delete:
+        # The topic's links are deleted with it; pick the next topic as primary
+        _topics_changed_on_commit(_related_sermon_ids(instance))
+    elif kwargs['signal'] is pre_delete:
+        # The sermons lose their series or speaker
+        sermon_ids = list(_related_sermon_ids(instance))
+        _reindex_on_commit(sermon_ids)
+        schedule_refresh(sermon_ids)
+    else:
+        _reindex_on_commit(_related_sermon_ids(instance))
+
+
+@receiver(post_delete, sender=AudioRendition)
+def rendition_deleted(sender, instance, **kwargs):
+    if instance.file:
+        storage, name = instance.file.storage, instance.file.name
+        transaction.on_commit(lambda: storage.delete(name))
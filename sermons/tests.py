@@ -1,3 +1,436 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import wave
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import audio_jobs, related, search, transcode
+from .audio import parse_range, serve_audio
+from .listing import LATEST_PER_TOPIC, grouped_topics
+from .passages import sermons_for_passage
+from .models import AudioJob, RelatedSermon, Sermon, Speaker, Topic
+from .scripture import MAX_PASSAGES, WHOLE_CHAPTER_END, Passage, format_passage, overlaps, parse_reference
+
+# Queries for the grouped view: ETag aggregate, paginator count, topics with
+# counts and the latest sermons per topic (window query)
+GROUPED_VIEW_QUERY_BUDGET = 4
+
+
+def count_queries(client, url):
+    """Request `url` twice and return the queries made by the second request."""
+    # The first request warms cached site settings
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200, response.status_code
+    return len(queries)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class GroupedTopicsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_HOST='localhost')
+        self.speaker = Speaker.objects.create(name='Pastor John')
+        self.sermon_count = 0
+
+    def add_topic(self, sermons=6):
+        topic = Topic.objects.create(name=f'Topic {Topic.objects.count()}')
+        for _ in range(sermons):
+            self.sermon_count += 1
+            sermon = Sermon.objects.create(
+                title=f'Sermon {self.sermon_count}',
+                speaker=self.speaker,
+                date_preached=date(2025, 1, 1) + timedelta(days=self.sermon_count),
+                scripture_reference='John 1:1',
+                description='Summary',
+                status='published',
+            )
+            sermon.topics.add(topic)
+        return topic
+
+    def test_latest_sermons_are_limited_per_topic(self):
+        first = self.add_topic(sermons=6)
+        second = self.add_topic(sermons=2)
+        topics = {topic.pk: topic for topic in grouped_topics()}
+
+        latest = topics[first.pk].latest_sermons
+        self.assertEqual(len(latest), LATEST_PER_TOPIC)
+        self.assertEqual(
+            [sermon.pk for sermon in latest],
+            list(first.sermon_set.order_by('-date_preached').values_list('pk', flat=True)[:LATEST_PER_TOPIC])
+        )
+        self.assertEqual(len(topics[second.pk].latest_sermons), 2)
+
+    def test_grouped_view_query_count_does_not_grow_with_topics(self):
+        self.add_topic()
+        few = count_queries(self.client, '/sermons/?sort=all')
+        for _ in range(8):
+            self.add_topic()
+        many = count_queries(self.client, '/sermons/?sort=all')
+
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, GROUPED_VIEW_QUERY_BUDGET)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class SermonListingQueryTests(TestCase):
+    """Listing pages must not issue a query per sermon."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_HOST='localhost')
+        self.topics = [Topic.objects.create(name=name) for name in ('Faith', 'Hope')]
+        self.speaker = Speaker.objects.create(name='Pastor John')
+
+    def add_sermons(self, count):
+        start = Sermon.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(start, start + count):
+                sermon = Sermon.objects.create(
+                    title=f'Sermon {i}',
+                    slug=f'sermon-{i}',
+                    speaker=self.speaker,
+                    date_preached=date(2025, 1, 1) + timedelta(days=i),
+                    scripture_reference='John 1:1',
+                    description='Summary',
+                    status='published',
+                )
+                sermon.topics.add(*self.topics)
+
+    def assert_constant_queries(self, client, url):
+        self.add_sermons(2)
+        few = count_queries(client, url)
+        self.add_sermons(10)
+        self.assertEqual(count_queries(client, url), few)
+
+    def test_primary_topic_follows_topic_changes(self):
+        self.add_sermons(1)
+        sermon = Sermon.objects.get()
+        self.assertEqual(sermon.primary_topic, self.topics[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            sermon.topics.remove(self.topics[0])
+        sermon.refresh_from_db()
+        self.assertEqual(sermon.primary_topic, self.topics[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topics[1].delete()
+        sermon.refresh_from_db()
+        self.assertIsNone(sermon.primary_topic)
+
+    def test_sermon_list(self):
+        self.assert_constant_queries(self.client, '/sermons/?sort=latest')
+
+    def test_home(self):
+        self.assert_constant_queries(self.client, '/')
+
+    def test_dashboard_sermon_list(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        self.client.cookies[settings.TRUSTED_COOKIE_NAME] = 'true'
+        self.assert_constant_queries(self.client, '/dashboard/sermons/')
+
+
+class SermonSearchTests(TestCase):
+    def setUp(self):
+        self.speaker = Speaker.objects.create(name='Pastor John')
+        self.sermon_count = 0
+
+    def add_sermon(self, title, description='Summary', status='published', topic=None):
+        self.sermon_count += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            sermon = Sermon.objects.create(
+                title=title,
+                speaker=self.speaker,
+                date_preached=date(2025, 1, 1) + timedelta(days=self.sermon_count),
+                scripture_reference='John 1:1',
+                description=description,
+                status=status,
+            )
+            if topic:
+                sermon.topics.add(topic)
+        return sermon
+
+    def search(self, query, queryset=None, ranked=True):
+        queryset = Sermon.objects.filter(status='published') if queryset is None else queryset
+        return list(search.search_sermons(queryset, query, ranked=ranked))
+
+    def test_title_match_ranks_first(self):
+        in_description = self.add_sermon('Walking on', description='A word on grace')
+        in_title = self.add_sermon('Grace abounding')
+        self.assertEqual(self.search('grace'), [in_title, in_description])
+
+    def test_last_term_matches_as_prefix(self):
+        sermon = self.add_sermon('Grace abounding')
+        self.assertEqual(self.search('abou'), [sermon])
+
+    def test_drafts_are_not_indexed(self):
+        self.add_sermon('Grace abounding', status='draft')
+        self.assertEqual(self.search('grace', Sermon.objects.all()), [])
+
+    def test_operators_are_plain_terms(self):
+        sermon = self.add_sermon('Grace abounding')
+        self.assertEqual(self.search('grace OR "NEAR(*'), [])
+        self.assertEqual(self.search('"grace" -'), [sermon])
+
+    def test_ranking_limit_applies_after_filters(self):
+        faith = Topic.objects.create(name='Faith')
+        for i in range(3):
+            self.add_sermon(f'Grace {i}')
+        filtered = [self.add_sermon(f'Walking {i}', description='grace', topic=faith) for i in range(2)]
+        with mock.patch.object(search, 'SEARCH_MAX_RESULTS', 2):
+            results = self.search('grace', Sermon.objects.filter(topics=faith))
+        self.assertCountEqual(results, filtered)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_list_view_ranks_within_the_topic(self):
+        faith = Topic.objects.create(name='Faith')
+        for i in range(3):
+            self.add_sermon(f'Grace {i}')
+        filtered = [self.add_sermon(f'Walking {i}', description='grace', topic=faith) for i in range(2)]
+        with mock.patch.object(search, 'SEARCH_MAX_RESULTS', 2):
+            response = Client(HTTP_HOST='localhost').get(reverse('sermon_list'), {'q': 'grace', 'topic': faith.slug})
+        self.assertCountEqual(response.context['sermons'], filtered)
+
+    def test_unranked_search_returns_every_match(self):
+        sermons = [self.add_sermon(f'Grace {i}') for i in range(3)]
+        with mock.patch.object(search, 'SEARCH_MAX_RESULTS', 2):
+            self.assertCountEqual(self.search('grace', ranked=False), sermons)
+
+
+class RelatedSermonRefreshTests(TestCase):
+    def setUp(self):
+        self.speaker = Speaker.objects.create(name='Pastor John')
+
+    def add_sermon(self, day):
+        return Sermon.objects.create(
+            title=f'Sermon {day}',
+            speaker=self.speaker,
+            date_preached=date(2025, 1, day),
+            scripture_reference='John 3:16',
+            status='published',
+        )
+
+    def test_refresh_runs_at_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = self.add_sermon(1), self.add_sermon(2)
+        self.assertEqual(list(RelatedSermon.objects.filter(sermon=first).values_list('related', flat=True)), [second.pk])
+
+    def test_rolled_back_changes_are_not_refreshed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.add_sermon(1)
+        with mock.patch.object(related, 'refresh') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        self.add_sermon(2)
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                first.title = 'Renamed'
+                first.save()
+        refresh.assert_called_once_with([first.pk])
+
+
+class RangeParsingTests(SimpleTestCase):
+    def test_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=100-': (100, 999),
+            'bytes=900-5000': (900, 999),  # Clipped to the file
+            'bytes=-100': (900, 999),  # Suffix: the final 100 bytes
+            'bytes=-5000': (0, 999),
+            ' bytes=5-5 ': (5, 5),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 1000), expected)
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=1000-', 'bytes=1000-1001', 'bytes=10-5', 'bytes=-0'):
+            with self.subTest(header=header):
+                self.assertIs(parse_range(header, 1000), False)
+        self.assertIs(parse_range('bytes=-10', 0), False)
+
+    def test_ignored(self):
+        for header in ('bytes=-', 'bytes=0-1,5-9', 'items=0-1', 'bytes=a-b', 'bytes=١-٢'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 1000))
+
+
+class AudioResponseTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.mp3')
+        with os.fdopen(handle, 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        response = serve_audio(self.factory.get('/audio/', headers=headers), self.path)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_partial_content(self):
+        response, body = self.get(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(body, bytes(range(10, 20)))
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_stale_if_range_sends_everything(self):
+        response, body = self.get(Range='bytes=10-19', If_Range='"stale"')
+        self.assertEqual((response.status_code, len(body)), (200, 1024))
+
+    def test_matching_if_range_and_etag(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(Range='bytes=-4', If_Range=etag)
+        self.assertEqual((response.status_code, body), (206, bytes(range(252, 256))))
+        self.assertEqual(self.get(If_None_Match=etag)[0].status_code, 304)
+
+    def test_stored_hash_versions_the_response(self):
+        digest = hashlib.sha256(b'audio').hexdigest()
+        request = self.factory.get('/audio/', {'v': digest[:16]})
+        response = serve_audio(request, self.path, digest)
+        response.close()
+        self.assertEqual(response['ETag'], f'"{digest[:32]}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        # Without a stored hash the version can't be checked
+        response = serve_audio(request, self.path)
+        response.close()
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+
+class AudioHashTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def wav(self):
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'wb') as f, wave.open(f, 'wb') as output:
+            output.setnchannels(1)
+            output.setsampwidth(2)
+            output.setframerate(8000)
+            output.writeframes(bytes(range(256)) * 64)
+        return path
+
+    def test_worker_stores_the_hash_the_url_and_etag_use(self):
+        source = self.wav()
+        with open(source, 'rb') as f:
+            content = f.read()
+        sermon = Sermon.objects.create(
+            title='Grace', date_preached=date(2025, 1, 1), scripture_reference='John 1:1',
+            description='Summary', status='published',
+        )
+        sermon.audio_file.save('grace.wav', ContentFile(content))
+        audio_jobs.enqueue_transcode(sermon)
+        job = audio_jobs.claim_next_job()
+        result = transcode.process_audio(source, tempfile.gettempdir(), ffmpeg='missing-ffmpeg-binary')
+        with self.assertLogs('sermons.audio_jobs', 'WARNING'):
+            self.assertTrue(audio_jobs.apply_result(job, result))
+
+        sermon.refresh_from_db()
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(sermon.audio_hash, digest)
+        self.assertTrue(sermon.audio_stream_url.endswith(f'?v={digest[:16]}'))
+        response = self.client.get(sermon.audio_stream_url)
+        response.close()
+        self.assertEqual(response['ETag'], f'"{digest[:32]}"')
+
+        # A new upload drops the old hash until the worker has run again
+        audio_jobs.enqueue_transcode(sermon)
+        self.assertEqual(Sermon.objects.get(pk=sermon.pk).audio_hash, '')
+        self.assertEqual(AudioJob.objects.filter(status='pending').count(), 1)
+
+
+class ScriptureReferenceTests(SimpleTestCase):
+    def test_parse_reference(self):
+        whole = WHOLE_CHAPTER_END
+        cases = {
+            'John 3:16-18': [('john', 3, 16, 18)],
+            '1 Cor. 13': [('1-corinthians', 13, 1, whole)],
+            'Romans 8:28; 12:1-2': [('romans', 8, 28, 28), ('romans', 12, 1, 2)],
+            'Genesis 1:1-2:3': [('genesis', 1, 1, whole), ('genesis', 2, 1, 3)],
+            'Matt 5:3-7:29': [('matthew', 5, 3, whole), ('matthew', 6, 1, whole), ('matthew', 7, 1, 29)],
+            'Jude 3-5': [('jude', 1, 3, 5)],
+            'Psalm 23, 91': [('psalms', 23, 1, whole), ('psalms', 91, 1, whole)],
+            'John 3:16, 18': [('john', 3, 16, 16), ('john', 3, 18, 18)],
+            'II Kings 2:11': [('2-kings', 2, 11, 11)],
+            'First John 4:8': [('1-john', 4, 8, 8)],
+            'Romans 8:28a': [('romans', 8, 28, 28)],
+            'Gen 1:1–3': [('genesis', 1, 1, 3)],
+            # Unknown books and backwards ranges are skipped
+            'Ezekiel 37:1-10; Hezekiah 3:1': [('ezekiel', 37, 1, 10)],
+            'John 3:18-16': [],
+            '': [],
+        }
+        for reference, expected in cases.items():
+            with self.subTest(reference=reference):
+                self.assertEqual(parse_reference(reference), [Passage(*passage) for passage in expected])
+
+    def test_passages_are_capped(self):
+        self.assertEqual(len(parse_reference('Psalms 1-150')), MAX_PASSAGES)
+
+    def test_format_passage(self):
+        self.assertEqual(format_passage('john', 3, 16, 18), 'John 3:16-18')
+        self.assertEqual(format_passage('psalms', 23, 1, WHOLE_CHAPTER_END), 'Psalms 23')
+        self.assertEqual(format_passage('john', 3, 16, 16), 'John 3:16')
+
+    def test_overlaps(self):
+        passage = Passage('john', 3, 16, 18)
+        self.assertTrue(overlaps(passage, Passage('john', 3, 18, 21)))
+        self.assertFalse(overlaps(passage, Passage('john', 3, 19, 21)))
+        self.assertFalse(overlaps(passage, Passage('john', 4, 16, 18)))
+
+
+class PassageLookupTests(TestCase):
+    def setUp(self):
+        speaker = Speaker.objects.create(name='Pastor John')
+        self.sermons = {}
+        for day, reference, status in (
+            (1, 'John 3:16-18', 'published'),
+            (2, 'John 3', 'published'),
+            (3, 'John 3:1-8; Romans 8:28', 'published'),
+            (4, 'John 3:17', 'draft'),
+        ):
+            self.sermons[reference] = Sermon.objects.create(
+                title=f'Sermon {day}', speaker=speaker, date_preached=date(2025, 1, day),
+                scripture_reference=reference, status=status,
+            )
+
+    def found(self, *passage):
+        return {sermon.scripture_reference for sermon in sermons_for_passage(*passage)}
+
+    def test_verse_range(self):
+        self.assertEqual(self.found('john', 3, 17, 20), {'John 3:16-18', 'John 3'})
+        self.assertEqual(self.found('john', 3, 8), {'John 3', 'John 3:1-8; Romans 8:28'})
+        self.assertEqual(self.found('john', 3, 19, 21), {'John 3'})
+
+    def test_whole_chapter(self):
+        self.assertEqual(self.found('john', 3), {'John 3:16-18', 'John 3', 'John 3:1-8; Romans 8:28'})
+        self.assertEqual(self.found('john', 4), set())
+
+    def test_reference_changes_replace_passages(self):
+        sermon = self.sermons['John 3']
+        sermon.scripture_reference = 'Romans 8'
+        sermon.save()
+        self.assertEqual(self.found('romans', 8, 28), {'Romans 8', 'John 3:1-8; Romans 8:28'})
+        self.assertEqual(self.found('john', 3, 19), set())
@@ -0,0 +1,155 @@
+"""
+Audio analysis and transcoding, run in worker processes by sermons.audio_jobs.
+
+Only the standard library is used here, so pool processes need no Django
+setup. Everything goes through ffmpeg when it is installed. Without it, WAV
+sources are still analysed (duration and peaks) with the `wave` module, but
+no renditions are produced.
+"""
+
+import array
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import wave
+
+# (codec, kbps) renditions produced for every upload
+LADDER = (('opus', 64), ('mp3', 128))
+
+CODECS = {
+    'opus': ('libopus', '.opus'),
+    'mp3': ('libmp3lame', '.mp3'),
+}
+
+# Waveform resolution stored on the sermon
+PEAK_COUNT = 200
+# Analysis decodes to mono 16-bit PCM at this rate
+ANALYSIS_RATE = 8000
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def file_hash(path):
+    """SHA-256 of a file, hex encoded."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _block_peaks(samples, block_samples):
+    return [
+        max(max(block), -min(block))
+        for block in (samples[i:i + block_samples] for i in range(0, len(samples), block_samples))
+        if block
+    ]
+
+
+def _normalise_peaks(block_peaks, count=PEAK_COUNT):
+    """Reduce per-block peaks to `count` values scaled 0-1 (2 decimal places)."""
+    if not block_peaks:
+        return []
+    count = min(count, len(block_peaks))
+    loudest = max(block_peaks) or 1
+    step = len(block_peaks) / count
+    return [
+        round(max(block_peaks[int(i * step):int((i + 1) * step)] or [0]) / loudest, 2)
+        for i in range(count)
+    ]
+
+
+def analyze_with_ffmpeg(source, ffmpeg, timeout):
+    """Return (duration seconds, peaks) by decoding the source to a mono PCM WAV file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        decoded = os.path.join(tmp, 'analysis.wav')
+        try:
+            result = subprocess.run(
+                [ffmpeg, '-v', 'error', '-i', source, '-vn', '-ac', '1', '-ar', str(ANALYSIS_RATE),
+                 '-c:a', 'pcm_s16le', decoded],
+                capture_output=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            raise TranscodeError('ffmpeg analysis timed out')
+        if result.returncode != 0:
+            raise TranscodeError(f'ffmpeg could not decode the file: {result.stderr.decode(errors="replace")[-500:]}')
+        return analyze_wav(decoded)
+
+
+def analyze_wav(source):
+    """Return (duration seconds, peaks) for a 16-bit PCM WAV file without ffmpeg."""
+    try:
+        with wave.open(source, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise TranscodeError('Only 16-bit WAV files can be analysed without ffmpeg')
+            channels = wav.getnchannels()
+            rate = wav.getframerate()
+            frames = wav.getnframes()
+            block_frames = max(rate // 10, 1)
+            block_peaks = []
+            while True:
+                data = wav.readframes(block_frames * 100)
+                if not data:
+                    break
+                samples = array.array('h')
+                samples.frombytes(data)
+                if sys.byteorder == 'big':
+                    samples.byteswap()
+                # First channel only
+                block_peaks.extend(_block_peaks(samples[::channels], block_frames))
+    except (wave.Error, EOFError) as e:
+        raise TranscodeError(f'Unreadable WAV file: {e}')
+    return round(frames / rate), _normalise_peaks(block_peaks)
+
+
+def transcode(source, output_dir, codec, kbps, ffmpeg, timeout):
+    """Encode one mono rendition and return its path."""
+    encoder, extension = CODECS[codec]
+    output = os.path.join(output_dir, f'{codec}-{kbps}{extension}')
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-v', 'error', '-y', '-i', source, '-vn', '-ac', '1',
+             '-c:a', encoder, '-b:a', f'{kbps}k', output],
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f'{codec} {kbps}k encode timed out')
+    if result.returncode != 0:
+        raise TranscodeError(f'{codec} {kbps}k encode failed: {result.stderr.decode(errors="replace")[-500:]}')
+    return output
+
+
+def process_audio(source, output_dir, ladder=LADDER, ffmpeg='ffmpeg', timeout=1800):
+    """
+    Hash and analyse `source` and encode each (codec, kbps) in `ladder`
+    into `output_dir`. Returns a dict with hash, duration, peaks,
+    renditions [(codec, kbps, path, hash)] and warnings.
+    """
+    source_hash = file_hash(source)
+    ffmpeg_path = shutil.which(ffmpeg)
+    if ffmpeg_path is None:
+        if not source.lower().endswith('.wav'):
+            raise TranscodeError(f'{ffmpeg} not found')
+        duration, peaks = analyze_wav(source)
+        return {
+            'hash': source_hash,
+            'duration': duration,
+            'peaks': peaks,
+            'renditions': [],
+            'warnings': [f'{ffmpeg} not found; renditions skipped'],
+        }
+
+    duration, peaks = analyze_with_ffmpeg(source, ffmpeg_path, timeout)
+    renditions = []
+    for codec, kbps in ladder:
+        path = transcode(source, output_dir, codec, kbps, ffmpeg_path, timeout)
+        renditions.append((codec, kbps, path, file_hash(path)))
+    return {'hash': source_hash, 'duration': duration, 'peaks': peaks, 'renditions': renditions, 'warnings': []}
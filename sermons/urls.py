@@ -3,5 +3,11 @@ from . import views
 
 urlpatterns = [
     path('', views.SermonListView.as_view(), name='sermon_list'),
+    path('podcast.xml', views.podcast, name='sermon_podcast'),
+    path('passage/<slug:book>/<int:chapter>/', views.PassageSermonListView.as_view(), name='sermon_passage'),
+    path('passage/<slug:book>/<int:chapter>/<int:verse_start>/', views.PassageSermonListView.as_view(), name='sermon_passage_verses'),
+    path('passage/<slug:book>/<int:chapter>/<int:verse_start>-<int:verse_end>/', views.PassageSermonListView.as_view(), name='sermon_passage_verses'),
     path('<slug:slug>/', views.SermonDetailView.as_view(), name='sermon_detail'),
+    path('<slug:slug>/audio/', views.sermon_audio, name='sermon_audio'),
+    path('<slug:slug>/audio/<slug:codec>-<int:bitrate>/', views.sermon_audio, name='sermon_audio_rendition'),
 ]
@@ -1,7 +1,52 @@
+import os
+
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
-from .models import Sermon, Series, Topic
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_safe
+from core.conditional import aggregate_state, allows_conditional, page_etag, request_memo
+from core.page_cache import public_page_cache
+from . import feeds, search
+from .audio import local_path, serve_audio
+from .listing import grouped_topics
+from .models import AudioRendition, RelatedSermon, Sermon, Series, Speaker, Topic
+from .passages import sermons_for_passage
+from .related import related_sermons
+from .scripture import book_slug, format_passage
+
+def sermon_list_etag(request, *args, **kwargs):
+    if not allows_conditional(request):
+        return None
+    view = SermonListView()
+    view.setup(request, *args, **kwargs)
+    return page_etag(request, *aggregate_state(view.get_queryset()), models=(Series, Speaker, Topic))
+
+
+def _published_updated_at(request, slug):
+    return request_memo(request, ('sermon', slug), lambda: (
+        Sermon.objects.filter(status='published', slug=slug)
+        .values_list('updated_at', flat=True).first()
+    ))
+
 
+def sermon_detail_etag(request, slug):
+    if not allows_conditional(request):
+        return None
+    updated_at = _published_updated_at(request, slug)
+    if updated_at is None:
+        return None
+    return page_etag(request, updated_at, models=(Series, Speaker, Topic, RelatedSermon))
+
+
+def sermon_detail_last_modified(request, slug):
+    if not allows_conditional(request):
+        return None
+    return _published_updated_at(request, slug)
+
+
+@method_decorator(condition(etag_func=sermon_list_etag), name='dispatch')
+@method_decorator(public_page_cache(Sermon, Series, Speaker, Topic), name='dispatch')
 class SermonListView(ListView):
     model = Sermon
     template_name = 'sermons/sermon_list.html'
@@ -9,25 +54,23 @@ class SermonListView(ListView):
     paginate_by = 12
 
     def get_queryset(self):
-        queryset = Sermon.objects.filter(status='published')
+        queryset = Sermon.objects.published().for_listing()
         query = self.request.GET.get('q')
-        sort_by = self.request.GET.get('sort', 'latest') # Default to latest unless overridden
+        # Searches default to relevance, everything else to latest
+        sort_by = self.request.GET.get('sort', 'relevance' if query else 'latest')
 
-        if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(speaker__name__icontains=query) |
-                Q(series__title__icontains=query)
-            )
-
-        # Topic Filtering
+        # Topic Filtering (before searching, which ranks within the filtered sermons)
         topic_slug = self.request.GET.get('topic')
         if topic_slug:
             queryset = queryset.filter(topics__slug=topic_slug)
 
+        if query:
+            queryset = search.search_sermons(queryset, query, ranked=(sort_by == 'relevance'))
+
         # Sorting Logic
-        if sort_by == 'oldest':
+        if sort_by == 'relevance' and query:
+            pass # Already in rank order
+        elif sort_by == 'oldest':
             queryset = queryset.order_by('date_preached')
         elif sort_by == 'a-z':
             queryset = queryset.order_by('title')
@@ -44,22 +87,22 @@ class SermonListView(ListView):
         # If filtering by topic OR searching, show list view ('latest'), not 'all' topic groups.
         topic_slug = self.request.GET.get('topic')
         query = self.request.GET.get('q')
-        default_sort = 'latest' if (topic_slug or query) else 'all'
+        default_sort = 'relevance' if query else 'latest' if topic_slug else 'all'
         
         sort_by = self.request.GET.get('sort', default_sort) 
         context['current_sort'] = sort_by
+
+        if query and context.get('page_obj'):
+            # Highlighted excerpts for the sermons on this page only
+            page_sermons = list(context['page_obj'].object_list)
+            search.attach_snippets(page_sermons, query)
+            context['page_obj'].object_list = page_sermons
+            context['sermons'] = page_sermons
         
         # Only fetch topics structure if we are in the 'all' (grouped) view
         if sort_by == 'all':
-            from django.db.models import Prefetch, Count
-            # Fetch ALL topics, but still prefetch latest sermons if any
-            context['grouped_topics'] = Topic.objects.annotate(
-                published_count=Count('sermon', filter=Q(sermon__status='published'))
-            ).prefetch_related(
-                Prefetch('sermon_set', 
-                         queryset=Sermon.objects.filter(status='published').order_by('-date_preached')[:4],
-                         to_attr='latest_sermons')
-            )
+            # Fetch ALL topics with their latest sermons in a fixed number of queries
+            context['grouped_topics'] = grouped_topics()
             
         topic_slug = self.request.GET.get('topic')
         if topic_slug:
@@ -70,10 +113,115 @@ class SermonListView(ListView):
             
         return context
 
+@method_decorator(condition(etag_func=sermon_detail_etag, last_modified_func=sermon_detail_last_modified), name='dispatch')
+@method_decorator(public_page_cache(Sermon, Series, Speaker, Topic, RelatedSermon), name='dispatch')
 class SermonDetailView(DetailView):
     model = Sermon
     template_name = 'sermons/sermon_detail.html'
     context_object_name = 'sermon'
 
     def get_queryset(self):
-        return Sermon.objects.filter(status='published')
+        return Sermon.objects.published().for_listing().prefetch_related('audio_renditions')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['related_sermons'] = related_sermons(self.object)
+        # One link per chapter the reference touches
+        chapters = {(p.book, p.chapter): p for p in self.object.passages.all()}
+        context['passages'] = list(chapters.values())
+        return context
+
+def passage_etag(request, book, chapter, verse_start=None, verse_end=None):
+    if not allows_conditional(request):
+        return None
+    sermons = sermons_for_passage(book, chapter, verse_start, verse_end)
+    return page_etag(request, *aggregate_state(sermons), models=(Series, Speaker, Topic))
+
+
+@method_decorator(condition(etag_func=passage_etag), name='dispatch')
+@method_decorator(public_page_cache(Sermon, Series, Speaker, Topic), name='dispatch')
+class PassageSermonListView(ListView):
+    """Sermons on a chapter or verse range, e.g. /sermons/passage/john/3/16-18/."""
+    template_name = 'sermons/passage_list.html'
+    context_object_name = 'sermons'
+    paginate_by = 12
+
+    def get(self, request, *args, **kwargs):
+        book = book_slug(kwargs['book'].replace('-', ' '))
+        verse_start, verse_end = kwargs.get('verse_start'), kwargs.get('verse_end')
+        if book is None or kwargs['chapter'] < 1 or verse_start == 0 or (verse_end and verse_end < verse_start):
+            raise Http404("Unknown passage")
+        if book != kwargs['book']:
+            # Abbreviations ("jn", "1-cor") redirect to the canonical URL
+            url_name = 'sermon_passage_verses' if verse_start else 'sermon_passage'
+            return redirect(url_name, permanent=True, **{**kwargs, 'book': book})
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return sermons_for_passage(
+            self.kwargs['book'], self.kwargs['chapter'],
+            self.kwargs.get('verse_start'), self.kwargs.get('verse_end'),
+            queryset=Sermon.objects.published().for_listing(),
+        ).order_by('-date_preached')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['passage'] = format_passage(
+            self.kwargs['book'], self.kwargs['chapter'],
+            self.kwargs.get('verse_start'), self.kwargs.get('verse_end') or self.kwargs.get('verse_start')
+        )
+        context['chapter_passage'] = format_passage(self.kwargs['book'], self.kwargs['chapter'])
+        return context
+
+@require_safe
+def sermon_audio(request, slug, codec=None, bitrate=None):
+    sermon = get_object_or_404(Sermon.objects.published(), slug=slug)
+    if codec:
+        rendition = get_object_or_404(AudioRendition, sermon=sermon, codec=codec, bitrate=bitrate)
+        field_file, digest = rendition.file, rendition.file_hash
+    else:
+        field_file, digest = sermon.audio_file, sermon.audio_hash
+    if not field_file:
+        raise Http404("No audio for this sermon")
+    path = local_path(field_file)
+    if path is None:
+        # Remote storage serves ranges itself
+        return redirect(field_file.url)
+    if not os.path.exists(path):
+        raise Http404("Audio file missing")
+    return serve_audio(request, path, digest)
+
+
+FEED_MAX_AGE = 15 * 60  # Seconds
+
+def _feed_state(request):
+    return request_memo(request, 'feeds', feeds.current_state)
+
+def feed_etag(request, *args, **kwargs):
+    # Feeds carry no per-user content, so every request may be validated
+    return page_etag(request, request.get_host(), _feed_state(request))
+
+def _serve_feed(request, feed, filename, content_type):
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    directory = feeds.ensure(feed, base_url, _feed_state(request))
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        raise Http404("No such feed")
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = f'public, max-age={FEED_MAX_AGE}'
+    return response
+
+@require_safe
+@condition(etag_func=feed_etag)
+def sitemap(request):
+    return _serve_feed(request, 'sitemap', 'sitemap.xml', 'application/xml; charset=utf-8')
+
+@require_safe
+@condition(etag_func=feed_etag)
+def sitemap_part(request, number):
+    return _serve_feed(request, 'sitemap', f'sitemap-{number}.xml', 'application/xml; charset=utf-8')
+
+@require_safe
+@condition(etag_func=feed_etag)
+def podcast(request):
+    return _serve_feed(request, 'podcast', 'podcast.xml', 'application/rss+xml; charset=utf-8')